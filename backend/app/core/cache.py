@@ -0,0 +1,327 @@
+"""
+Two-tier cache for Blinderfit Backend
+A size-bounded in-process LRU answers repeat reads without a network hop; behind it a
+shared backend (Redis, or an in-memory stand-in when CACHE_URL is memory://) keeps the
+uvicorn workers consistent. Keys are namespaced, values are JSON and every entry has a TTL.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_BACKEND_ERRORS, CACHE_LOAD_SECONDS, CACHE_LOOKUPS
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # only needed for a redis:// CACHE_URL
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "blinderfit:"
+# Deletes are broadcast here so every worker drops its local copy, not just the one that deleted
+INVALIDATION_CHANNEL = "blinderfit:cache:invalidate"
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """In-process tier: encoded values by key, least recently used evicted first, each with its own expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ──────────────────────────────────────────────
+# Shared backends
+# ──────────────────────────────────────────────
+
+class CacheBackend:
+    """Shared tier: bytes by key with a TTL in seconds"""
+
+    # Whether other processes see this backend (and so need invalidation broadcasts)
+    shared = False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def publish_invalidation(self, keys: List[str]) -> None:
+        pass
+
+    async def listen_for_invalidations(self, on_keys: Callable[[List[str]], None]) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Stand-in for Redis with the same expiry semantics, for tests, benchmarks and single-process runs"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.monotonic()
+        if len(self._data) > 10000:
+            for expired in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+                del self._data[expired]
+        self._data[key] = (now + ttl, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    shared = True
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_URL points at Redis but the redis package is not installed")
+        self.client = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.set(key, value, px=max(int(ttl * 1000), 1))
+
+    async def delete(self, *keys: str) -> None:
+        await self.client.delete(*keys)
+
+    async def publish_invalidation(self, keys: List[str]) -> None:
+        await self.client.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+    async def listen_for_invalidations(self, on_keys: Callable[[List[str]], None]) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    on_keys(json.loads(message["data"]))
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_backend(url: str) -> CacheBackend:
+    scheme = url.split("://", 1)[0]
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    if scheme == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unsupported CACHE_URL {url!r}; use redis://, rediss:// or memory://")
+
+
+_backend: CacheBackend = MemoryBackend()
+_caches: "weakref.WeakSet[Cache]" = weakref.WeakSet()
+_invalidation_task: Optional[asyncio.Task] = None
+
+
+def _drop_local(keys: Iterable[str]) -> None:
+    keys = list(keys)
+    for cache in list(_caches):
+        cache.local.discard(*keys)
+
+
+def _drop_all_local() -> None:
+    for cache in list(_caches):
+        cache.local.clear()
+
+
+def use_backend(backend: CacheBackend) -> None:
+    """Swap the shared backend (tests and benchmarks); local tiers are cleared so nothing outlives it"""
+    global _backend
+    _backend = backend
+    _drop_all_local()
+
+
+async def _listen_for_invalidations() -> None:
+    while True:
+        try:
+            await _backend.listen_for_invalidations(_drop_local)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels("subscribe").inc()
+            logger.warning(f"Cache invalidation subscription lost, retrying: {e}")
+            # Anything published meanwhile was missed; the local tier is short-lived, but start clean
+            _drop_all_local()
+            await asyncio.sleep(1)
+
+
+async def init_cache(url: Optional[str] = None) -> None:
+    global _invalidation_task
+    backend = create_backend(url or settings.CACHE_URL)
+    use_backend(backend)
+    if backend.shared:
+        _invalidation_task = asyncio.create_task(_listen_for_invalidations())
+    logger.info(f"Cache initialized ({type(backend).__name__})")
+
+
+async def close_cache() -> None:
+    global _invalidation_task
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        try:
+            await _invalidation_task
+        except asyncio.CancelledError:
+            pass
+        _invalidation_task = None
+    await _backend.close()
+    use_backend(MemoryBackend())
+
+
+# ──────────────────────────────────────────────
+# Namespaced caches
+# ──────────────────────────────────────────────
+
+class Cache:
+    """
+    One namespace of the two-tier cache. Values must be JSON-serializable; each read
+    decodes a fresh copy, so callers may mutate what they get back.
+    Shared-backend failures are logged and counted, and behave as misses.
+    """
+
+    def __init__(self, namespace: str, ttl: float, local_max_entries: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalLRU(local_max_entries)
+        # full key -> monotonic time of its last delete; a value loaded before it is not stored
+        self._deleted_at: Dict[str, float] = {}
+        _caches.add(self)
+
+    def key(self, key: str) -> str:
+        return f"{KEY_PREFIX}{self.namespace}:{key}"
+
+    def _local_ttl(self, ttl: float) -> float:
+        # Other workers' local copies only learn of deletes by broadcast, so they are kept briefly
+        return min(ttl, settings.CACHE_LOCAL_TTL_SECONDS) if _backend.shared else ttl
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        full_key = self.key(key)
+        encoded = self.local.get(full_key)
+        if encoded is not None:
+            CACHE_LOOKUPS.labels(self.namespace, "local_hit").inc()
+            return json.loads(encoded)
+        try:
+            encoded = await _backend.get(full_key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels("get").inc()
+            logger.warning(f"Cache get failed for {full_key}: {e}")
+            encoded = None
+        if encoded is None:
+            CACHE_LOOKUPS.labels(self.namespace, "miss").inc()
+            return default
+        CACHE_LOOKUPS.labels(self.namespace, "shared_hit").inc()
+        self.local.set(full_key, encoded, self._local_ttl(self.ttl))
+        return json.loads(encoded)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        full_key = self.key(key)
+        encoded = json.dumps(value, default=str).encode()
+        self.local.set(full_key, encoded, self._local_ttl(ttl))
+        try:
+            await _backend.set(full_key, encoded, ttl)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels("set").inc()
+            logger.warning(f"Cache set failed for {full_key}: {e}")
+
+    async def delete(self, *keys: str) -> None:
+        """Remove keys from both tiers here and from every other worker's local tier"""
+        full_keys = [self.key(key) for key in keys]
+        now = time.monotonic()
+        if len(self._deleted_at) > self.local.max_entries:
+            horizon = now - 60
+            for old in [k for k, at in self._deleted_at.items() if at < horizon]:
+                del self._deleted_at[old]
+        for full_key in full_keys:
+            self._deleted_at[full_key] = now
+        self.local.discard(*full_keys)
+        try:
+            await _backend.delete(*full_keys)
+            if _backend.shared:
+                await _backend.publish_invalidation(full_keys)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels("delete").inc()
+            logger.warning(f"Cache delete failed for {full_keys}: {e}")
+
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        cache_if: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        The cached value, or `await loader()` stored for `ttl` seconds (the namespace default
+        when None; 0 disables caching). Values rejected by `cache_if`, and values whose load
+        overlapped a delete of the key in this process, are returned but not stored.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return await loader()
+        value = await self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        started = time.monotonic()
+        value = await loader()
+        CACHE_LOAD_SECONDS.labels(self.namespace).observe(time.monotonic() - started)
+        if (cache_if is None or cache_if(value)) and self._deleted_at.get(self.key(key), float("-inf")) < started:
+            await self.set(key, value, ttl)
+        return value
@@ -31,6 +31,23 @@ class Settings(BaseSettings):
 
     # Database (Neon PostgreSQL)
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
+    # Read replicas for get_*/query_* calls (JSON list); writes always use DATABASE_URL
+    DATABASE_REPLICA_URLS: List[str] = Field(default=[], env="DATABASE_REPLICA_URLS")
+    # After a user's write, their reads stay on the primary this long to hide replication lag.
+    # The pin lives in the shared cache, so it spans workers when CACHE_URL points at Redis
+    DATABASE_REPLICA_PIN_SECONDS: float = Field(default=5.0, env="DATABASE_REPLICA_PIN_SECONDS")
+    DATABASE_REPLICA_HEALTH_INTERVAL: int = Field(default=15, env="DATABASE_REPLICA_HEALTH_INTERVAL")
+    # Connection pool of each worker process (and of each replica): `uvicorn --workers N` may open
+    # N * (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW) connections. Size it from the db_pool_* metrics.
+    # DATABASE_POOL_SIZE=0 disables the application pool, leaving pooling to PgBouncer.
+    DATABASE_POOL_SIZE: int = Field(default=10, env="DATABASE_POOL_SIZE")
+    DATABASE_MAX_OVERFLOW: int = Field(default=20, env="DATABASE_MAX_OVERFLOW")
+    DATABASE_POOL_TIMEOUT: float = Field(default=30.0, env="DATABASE_POOL_TIMEOUT")
+    DATABASE_POOL_RECYCLE: int = Field(default=300, env="DATABASE_POOL_RECYCLE")
+    # Ping on every checkout (one extra round trip) to catch connections dropped while idle
+    DATABASE_POOL_PRE_PING: bool = Field(default=True, env="DATABASE_POOL_PRE_PING")
+    # DATABASE_URL points at PgBouncer (or Neon's -pooler endpoint) in transaction pooling mode
+    DATABASE_PGBOUNCER: bool = Field(default=False, env="DATABASE_PGBOUNCER")
 
     # Clerk Authentication
     CLERK_SECRET_KEY: str = Field(..., env="CLERK_SECRET_KEY")
@@ -41,6 +58,35 @@ class Settings(BaseSettings):
     # Google AI (Gemini) settings
     GOOGLE_AI_API_KEY: str = Field(..., env="GOOGLE_AI_API_KEY")
     GEMINI_MODEL: str = Field(default="gemini-2.5-flash", env="GEMINI_MODEL")
+    # Answers to identical low-temperature analysis prompts (calls made with cache=True)
+    # are reused for this long; 0 disables. MAX_ENTRIES bounds each worker's in-memory copy
+    GEMINI_CACHE_TTL_SECONDS: float = Field(default=86400.0, env="GEMINI_CACHE_TTL_SECONDS")
+    GEMINI_CACHE_MAX_ENTRIES: int = Field(default=512, env="GEMINI_CACHE_MAX_ENTRIES")
+
+    # Stored food and exercise lookups older than this are still served, and refreshed in the background
+    KNOWLEDGE_REFRESH_DAYS: float = Field(default=30.0, env="KNOWLEDGE_REFRESH_DAYS")
+
+    # Health news and research feeds are searched again this often (each worker checks whether
+    # another already did) and keep this many items; requests are served from the stored items
+    FEED_REFRESH_INTERVAL_SECONDS: float = Field(default=10800.0, env="FEED_REFRESH_INTERVAL_SECONDS")
+    FEED_MAX_ITEMS: int = Field(default=20, env="FEED_MAX_ITEMS")
+    # Research topics are requested freely, so each worker refreshes only this many of the most
+    # recently requested ones; any other topic is searched again only when requested once stale
+    FEED_MAX_TOPICS: int = Field(default=20, env="FEED_MAX_TOPICS")
+
+    # Chat context snapshots at least this large (canonical JSON bytes) are stored
+    # zstd-compressed when the zstandard package is installed; 0 disables compression
+    CHAT_CONTEXT_COMPRESS_MIN_BYTES: int = Field(default=16384, env="CHAT_CONTEXT_COMPRESS_MIN_BYTES")
+    # FitMentor reuses a user's context for this long between messages unless a write to the
+    # profile, tracking, plans or insights evicts it; 0 disables. With CACHE_URL=memory:// each
+    # worker caches separately, and writes handled by other workers wait out the TTL
+    USER_CONTEXT_CACHE_TTL_SECONDS: float = Field(default=60.0, env="USER_CONTEXT_CACHE_TTL_SECONDS")
+
+    # Shared cache: redis://host:6379/0 for Redis, memory:// for a per-process stand-in
+    CACHE_URL: str = Field(default="memory://", env="CACHE_URL")
+    # With Redis, each worker also keeps entries in memory for at most this long
+    # (deletes are broadcast to all workers; this bounds the rest)
+    CACHE_LOCAL_TTL_SECONDS: float = Field(default=5.0, env="CACHE_LOCAL_TTL_SECONDS")
 
     # API settings
     API_V1_PREFIX: str = "/api/v1"
@@ -49,6 +95,11 @@ class Settings(BaseSettings):
     RATE_LIMIT_REQUESTS: int = Field(default=100, env="RATE_LIMIT_REQUESTS")
     RATE_LIMIT_WINDOW: int = Field(default=60, env="RATE_LIMIT_WINDOW")
 
+    # SQL statements per request before a warning is logged, and repeats of one
+    # statement flagged as a likely N+1 loop
+    QUERY_BUDGET_PER_REQUEST: int = Field(default=25, env="QUERY_BUDGET_PER_REQUEST")
+    QUERY_REPEAT_THRESHOLD: int = Field(default=5, env="QUERY_REPEAT_THRESHOLD")
+
     class Config:
         env_file = ".env"
         case_sensitive = True
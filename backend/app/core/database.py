@@ -3,21 +3,40 @@ PostgreSQL (Neon) database initialization and service layer
 Replaces Firebase Firestore with PostgreSQL + SQLAlchemy
 """
 
+import asyncio
+import base64
+import itertools
+import json
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import operator
+from contextlib import asynccontextmanager
+from contextvars import Context, ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import functools
 import uuid
 
-from sqlalchemy import create_engine, text, Column, String, DateTime
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import sessionmaker, Session, declarative_base
+from sqlalchemy import (
+    text, select, delete, update, and_, case, cast, column, func, literal, literal_column, or_, tuple_,
+    Column, String, Text, Date, DateTime, Float, Integer, Index, Numeric,
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from app.core.cache import Cache
 from app.core.config import settings
+from app.core.metrics import MeasuredNullPool, MeasuredQueuePool, instrument_pool
 
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 engine = None
 SessionLocal = None
+replicas: List["_Replica"] = []
+_replica_monitor: Optional[asyncio.Task] = None
 
 
 # ──────────────────────────────────────────────
@@ -38,17 +57,49 @@ class UserRow(Base):
 
 class UserDocument(Base):
     __tablename__ = "user_documents"
-    id = Column(String, primary_key=True)
-    user_id = Column(String, nullable=False, index=True)
-    collection_name = Column(String, nullable=False, index=True)
-    doc_id = Column(String, nullable=False, index=True)
+    # One partition per collection (see COLLECTION_PARTITIONS), created by init_database
+    __table_args__ = {"postgresql_partition_by": "LIST (collection_name)"}
+    id = Column(String, nullable=False)
+    # The primary key is the conflict target for the single-statement upserts in DatabaseService;
+    # it includes both partition keys, as PostgreSQL requires of unique constraints on partitioned tables
+    # No single-column indexes: the primary key leads with user_id, and partition pruning stands in
+    # for one on collection_name
+    user_id = Column(String, primary_key=True)
+    collection_name = Column(String, primary_key=True)
+    # Byte order, whatever the database collation: doc_id ranges such as a plan's
+    # "{plan_id}:" .. "{plan_id};" days rely on punctuation sorting by code point
+    doc_id = Column(String(collation="C"), primary_key=True)
     data = Column(JSONB, default={})
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class DailyTrackingRow(Base):
+    """One user's day of health tracking: the `tracking` collection of DatabaseService"""
+    __tablename__ = "daily_tracking"
+    user_id = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    weight_kg = Column(Float, nullable=True)
+    water_intake_ml = Column(Integer, nullable=True)
+    steps_count = Column(Integer, nullable=True)
+    sleep_hours = Column(Float, nullable=True)
+    mood_rating = Column(Integer, nullable=True)
+    energy_level = Column(Integer, nullable=True)
+    compliance_score = Column(Float, nullable=True)
+    notes = Column(Text, nullable=True)
+    meals = Column(JSONB, nullable=True)
+    exercises = Column(JSONB, nullable=True)
+    # Document keys without a column of their own (id, created_at, ...)
+    extra = Column(JSONB, default={})
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class GlobalDocument(Base):
     __tablename__ = "global_documents"
+    __table_args__ = (
+        Index("uq_global_documents_collection_doc", "collection_name", "doc_id", unique=True),
+    )
     id = Column(String, primary_key=True)
     collection_name = Column(String, nullable=False, index=True)
     doc_id = Column(String, nullable=False, index=True)
@@ -57,49 +108,1361 @@ class GlobalDocument(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# ──────────────────────────────────────────────
+# Daily tracking documents
+# ──────────────────────────────────────────────
+
+# Collection served by daily_tracking instead of user_documents; doc ids are ISO dates
+TRACKING_COLLECTION = "tracking"
+
+# Document keys stored in typed daily_tracking columns; values of another type are kept in `extra`
+TRACKING_SCALAR_COLUMNS: Dict[str, type] = {
+    "weight_kg": float,
+    "water_intake_ml": int,
+    "steps_count": int,
+    "sleep_hours": float,
+    "mood_rating": int,
+    "energy_level": int,
+    "compliance_score": float,
+    "notes": str,
+}
+TRACKING_ARRAY_COLUMNS = ("meals", "exercises")
+# Document keys that come from the primary key
+TRACKING_KEY_FIELDS = ("user_id", "date")
+_TRACKING_COLUMNS = (*TRACKING_SCALAR_COLUMNS, *TRACKING_ARRAY_COLUMNS)
+
+_INT32_RANGE = range(-2 ** 31, 2 ** 31)
+
+
+def _tracking_day(doc_id: str) -> date:
+    try:
+        return date.fromisoformat(doc_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Tracking documents are keyed by ISO date, got {doc_id!r}") from e
+
+
+def _tracking_column_value(key: str, value: Any) -> Tuple[bool, Any]:
+    """(fits, value) for storing `value` in the column for `key`"""
+    if value is None:
+        return True, None
+    if key in TRACKING_ARRAY_COLUMNS:
+        return isinstance(value, list), value
+    kind = TRACKING_SCALAR_COLUMNS[key]
+    if isinstance(value, bool):
+        return False, value
+    if kind is float and isinstance(value, (int, float)):
+        return True, float(value)
+    if kind is int and isinstance(value, (int, float)) and value == int(value) and int(value) in _INT32_RANGE:
+        return True, int(value)
+    if kind is str and isinstance(value, str):
+        return True, value
+    return False, value
+
+
+def _tracking_values(data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Split a tracking document into (typed column values, extra keys)"""
+    columns, extra = {}, {}
+    for key, value in data.items():
+        if key in TRACKING_KEY_FIELDS:
+            continue
+        if key in _TRACKING_COLUMNS:
+            fits, value = _tracking_column_value(key, value)
+            if fits:
+                columns[key] = value
+                continue
+        extra[key] = value
+    return columns, extra
+
+
+def _tracking_doc(row) -> Dict[str, Any]:
+    """A daily_tracking row (or a subset of its columns) as a tracking document"""
+    values = row._mapping
+    result = dict(values.get("extra") or {})
+    for key in _TRACKING_COLUMNS:
+        if values.get(key) is not None:
+            result[key] = values[key]
+    result["user_id"] = row.user_id
+    result["date"] = result["_id"] = row.date.isoformat()
+    return result
+
+
+# ──────────────────────────────────────────────
+# user_documents partitions
+# ──────────────────────────────────────────────
+
+# LIST partition of user_documents per collection, each split into this many HASH (user_id)
+# partitions (1 = not sub-partitioned). Collections without an entry land in
+# user_documents_default. Each collection gets its own heap, indexes and vacuum schedule, and
+# retention can detach or drop a whole partition. Adding a collection moves its rows out of the
+# default partition at the next startup; changing a modulus means repartitioning by hand.
+COLLECTION_PARTITIONS: Dict[str, int] = {
+    "chats": 4,
+    "chat_contexts": 4,
+    "notifications": 4,
+    "plans": 1,
+    "plan_days": 4,
+    "ml_insights": 1,
+    "onboarding": 1,
+    "wearable_data": 4,
+    "integrations": 1,
+}
+
+DEFAULT_PARTITION = "user_documents_default"
+
+
+def partition_name(collection: str) -> str:
+    return f"user_documents_{collection}"
+
+
+# ──────────────────────────────────────────────
+# JSONB index registry
+# ──────────────────────────────────────────────
+
+# JSONB keys each collection filters on (equality keys first) and orders by
+# (last key) in query_user_docs. Each entry becomes one (user_id, (data->>'key'), ..., doc_id)
+# expression index on that collection's partition only, created by init_database, so writes to
+# other collections do not maintain it; the trailing doc_id serves keyset pagination. Every
+# collection listed here needs a COLLECTION_PARTITIONS entry. Keep this in step with the
+# query_user_docs calls in app/routes and app/services; uncovered query shapes are logged at runtime.
+# The tracking collection lives in daily_tracking, whose (user_id, date) key covers its queries.
+COLLECTION_INDEXES: Dict[str, List[Tuple[str, ...]]] = {
+    "plans": [("is_active",), ("created_at",)],
+    "chats": [("created_at",)],
+    "ml_insights": [("generated_at",), ("insight_type", "generated_at")],
+    "notifications": [("created_at",), ("scheduled_at",), ("read_at", "created_at")],
+    "integrations": [("created_at",), ("type", "created_at")],
+}
+
+
+def _json_text(key: str):
+    """data->>'key' with the key rendered inline so the planner can match expression indexes"""
+    return UserDocument.data[literal(key, literal_execute=True)].astext
+
+
+def _json_filters(filters: Optional[Dict[str, Any]]) -> List[Any]:
+    """Equality predicates on data->>'key'; JSON booleans compare as 'true'/'false', None matches a missing or null key"""
+    clauses = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            clauses.append(_json_text(key).is_(None))
+        elif isinstance(value, bool):
+            clauses.append(_json_text(key) == str(value).lower())
+        else:
+            clauses.append(_json_text(key) == str(value))
+    return clauses
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that was not produced by query_user_docs_page"""
+
+
+# Routes whose response is a bare list return the next page's cursor in this header, when there is one
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_cursor(sort_key: Optional[str], doc_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_key, doc_id]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[str], str]:
+    try:
+        sort_key, doc_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(doc_id, str) or not isinstance(sort_key, (str, type(None))):
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    return sort_key, doc_id
+
+
+def _after_cursor(sort_key, tiebreak, position: Any, tie: Any, ascending: bool, nulls_first: bool):
+    """
+    Rows after (position, tie) in ORDER BY sort_key, tiebreak, both ascending or both descending.
+    Rows without a sort key sit together first or last (`nulls_first`, the dialect's placement
+    for this direction), ordered by tiebreak alone. A row comparison with NULL is NULL, so they
+    get an explicit branch: a plain comparison would end pagination at the first of them.
+    """
+    later = operator.gt if ascending else operator.lt
+    if position is None:
+        in_null_group = and_(sort_key.is_(None), later(tiebreak, tie))
+        return or_(in_null_group, sort_key.is_not(None)) if nulls_first else in_null_group
+    after = later(tuple_(sort_key, tiebreak), tuple_(position, tie))
+    # With the NULLs already behind, the plain row comparison stays an index range scan
+    return after if nulls_first else or_(after, sort_key.is_(None))
+
+
+def collection_index_name(collection: str, keys: Tuple[str, ...]) -> str:
+    return f"ix_{partition_name(collection)}_{'_'.join(keys)}"
+
+
+def _collection_index_ddl(collection: str, keys: Tuple[str, ...]) -> str:
+    # Same expressions as _json_text renders, so the planner matches them
+    expressions = ", ".join(f"(data ->> '{key}')" for key in keys)
+    return (
+        f"CREATE INDEX IF NOT EXISTS {collection_index_name(collection, keys)} "
+        f"ON {partition_name(collection)} (user_id, {expressions}, doc_id)"
+    )
+
+
+def is_indexed_query(collection: str, filter_keys: Iterable[str] = (), order_by: Optional[str] = None) -> bool:
+    """Whether COLLECTION_INDEXES has an index serving this filter/order shape"""
+    filter_keys = set(filter_keys)
+    if not filter_keys and not order_by:
+        return True
+    if collection == TRACKING_COLLECTION:
+        return not filter_keys and order_by == "date"
+    for keys in COLLECTION_INDEXES.get(collection, []):
+        if set(keys[:len(filter_keys)]) != filter_keys:
+            continue
+        if order_by is None or keys[len(filter_keys):len(filter_keys) + 1] == (order_by,):
+            return True
+    return False
+
+
+_unindexed_shapes_logged = set()
+
+
+def _check_query_shape(collection: str, filter_keys: Iterable[str], order_by: Optional[str]) -> None:
+    shape = (collection, tuple(sorted(filter_keys)), order_by)
+    if shape in _unindexed_shapes_logged or is_indexed_query(*shape):
+        return
+    _unindexed_shapes_logged.add(shape)
+    logger.warning(
+        f"Query on '{collection}' filters {list(shape[1])} / orders by {order_by!r} "
+        f"without a matching entry in COLLECTION_INDEXES"
+    )
+
+
 # ──────────────────────────────────────────────
 # Database initialization
 # ──────────────────────────────────────────────
 
+def _async_database_url(database_url: str) -> Tuple[str, Dict[str, Any]]:
+    """Point a postgres:// URL at asyncpg and move libpq-only options into connect_args"""
+    url = make_url(database_url)
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        url = url.set(drivername="postgresql+asyncpg")
+
+    connect_args: Dict[str, Any] = {}
+    query = dict(url.query)
+    # asyncpg rejects libpq parameters such as sslmode (Neon URLs always carry it)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    return url.set(query=query).render_as_string(hide_password=False), connect_args
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """create_all skips tables that already exist, so add indexes introduced since"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _lock_schema(sync_conn) -> None:
+    """Serialize schema changes of instances starting together; released when the init transaction ends"""
+    sync_conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('blinderfit_schema'))"))
+
+
+_LEGACY_USER_DOCUMENTS = "user_documents_unpartitioned"
+
+
+class PendingMigrationError(RuntimeError):
+    """The database holds data only `python -m app.core.migrate` moves into place"""
+
+
+def _has_unpartitioned_user_documents(sync_conn) -> bool:
+    kind = sync_conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('user_documents')")).scalar()
+    return kind == "r" or sync_conn.execute(text(f"SELECT to_regclass('{_LEGACY_USER_DOCUMENTS}')")).scalar() is not None
+
+
+def _check_no_pending_migration(sync_conn) -> None:
+    """Refuse to start on documents the partitioned table does not hold yet, rather than serve without them"""
+    if _has_unpartitioned_user_documents(sync_conn):
+        raise PendingMigrationError(
+            "user_documents has not been moved into partitions yet; run `python -m app.core.migrate` first"
+        )
+
+
+def _retire_unpartitioned_user_documents(sync_conn) -> None:
+    """
+    Rename a plain (pre-partitioning) user_documents table and its indexes out of the way,
+    so create_all builds the partitioned table; _move_unpartitioned_user_documents moves the rows
+    """
+    kind = sync_conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('user_documents')")).scalar()
+    if kind != "r":
+        return
+    indexes = sync_conn.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'user_documents'")).scalars().all()
+    for index in indexes:
+        sync_conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+    sync_conn.execute(text(f"ALTER TABLE user_documents RENAME TO {_LEGACY_USER_DOCUMENTS}"))
+    logger.info("Renamed unpartitioned user_documents for migration")
+
+
+def _create_missing_partitions(sync_conn) -> None:
+    """Create the COLLECTION_PARTITIONS partitions of user_documents and the default partition"""
+    existing = set(sync_conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'user_documents'::regclass"
+    )).scalars())
+    if DEFAULT_PARTITION not in existing:
+        sync_conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF user_documents DEFAULT"))
+        existing.add(DEFAULT_PARTITION)
+    for collection, modulus in COLLECTION_PARTITIONS.items():
+        name = partition_name(collection)
+        if name in existing:
+            continue
+        params = {"collection": collection}
+        # A new partition may not overlap rows already in the default partition: park them meanwhile
+        sync_conn.execute(text(
+            f"CREATE TEMPORARY TABLE moving_documents ON COMMIT DROP AS "
+            f"SELECT * FROM {DEFAULT_PARTITION} WHERE collection_name = :collection"
+        ), params)
+        sync_conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE collection_name = :collection"), params)
+        sub_partitioned = " PARTITION BY HASH (user_id)" if modulus > 1 else ""
+        sync_conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF user_documents FOR VALUES IN ('{collection}'){sub_partitioned}"
+        ))
+        for remainder in range(modulus if modulus > 1 else 0):
+            sync_conn.execute(text(
+                f"CREATE TABLE {name}_{remainder} PARTITION OF {name} "
+                f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+            ))
+        sync_conn.execute(text("INSERT INTO user_documents SELECT * FROM moving_documents"))
+        sync_conn.execute(text("DROP TABLE moving_documents"))
+        logger.info(f"Created user_documents partition for '{collection}'")
+
+
+# Indexes earlier versions built on every partition: JSONB ones superseded by the per-collection
+# ones, and single-column ones the primary key and partition pruning make redundant
+_RETIRED_INDEXES_SQL = (
+    "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() "
+    "AND tablename = 'user_documents' AND (indexname LIKE 'ix\\_user\\_documents\\_data\\_%' "
+    "OR indexname IN ('ix_user_documents_user_id', 'ix_user_documents_collection_name', 'ix_user_documents_doc_id'))"
+)
+
+
+def _create_collection_indexes(sync_conn) -> None:
+    """Build the COLLECTION_INDEXES entries on their partitions and drop retired table-wide indexes"""
+    for index in sync_conn.execute(text(_RETIRED_INDEXES_SQL)).scalars().all():
+        sync_conn.execute(text(f'DROP INDEX "{index}"'))
+        logger.info(f"Dropped retired index {index}")
+    for collection, key_tuples in COLLECTION_INDEXES.items():
+        for keys in key_tuples:
+            sync_conn.execute(text(_collection_index_ddl(collection, keys)))
+
+
+def _use_byte_order_doc_ids(sync_conn) -> None:
+    """Give user_documents.doc_id the C collation on tables created before it had one (rebuilds its indexes)"""
+    collation = sync_conn.execute(text(
+        "SELECT c.collname FROM pg_attribute a JOIN pg_collation c ON c.oid = a.attcollation "
+        "WHERE a.attrelid = 'user_documents'::regclass AND a.attname = 'doc_id'"
+    )).scalar()
+    if collation != "C":
+        sync_conn.execute(text('ALTER TABLE user_documents ALTER COLUMN doc_id TYPE VARCHAR COLLATE "C"'))
+        logger.info("Switched user_documents.doc_id to the C collation")
+
+
+def _move_unpartitioned_user_documents(sync_conn, batch_size: int) -> int:
+    """
+    Move up to `batch_size` rows of a retired unpartitioned user_documents table into the
+    partitions and return how many; drops the emptied table. Each batch commits on its own,
+    so an interrupted migration continues where it stopped.
+    """
+    if sync_conn.execute(text(f"SELECT to_regclass('{_LEGACY_USER_DOCUMENTS}')")).scalar() is None:
+        return 0
+    columns = ", ".join(c.name for c in UserDocument.__table__.columns)
+    moved = sync_conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {_LEGACY_USER_DOCUMENTS}
+            WHERE ctid IN (SELECT ctid FROM {_LEGACY_USER_DOCUMENTS} LIMIT :batch_size)
+            RETURNING {columns}
+        ), copied AS (
+            INSERT INTO user_documents ({columns}) SELECT {columns} FROM moved ON CONFLICT DO NOTHING
+        )
+        SELECT count(*) FROM moved
+    """), {"batch_size": batch_size}).scalar()
+    if not moved:
+        sync_conn.execute(text(f"DROP TABLE {_LEGACY_USER_DOCUMENTS}"))
+        logger.info("Dropped the emptied unpartitioned user_documents")
+    return moved
+
+
+def _tracking_migration_column(key: str) -> Tuple[str, str]:
+    """(value, fits) SQL for moving data->key into its daily_tracking column, mirroring _tracking_column_value"""
+    value = f"d.data->'{key}'"
+    kind = TRACKING_SCALAR_COLUMNS.get(key)
+    if kind is float:
+        fits = f"jsonb_typeof({value}) = 'number'"
+        converted = f"({value})::float8"
+    elif kind is int:
+        # CASE rather than AND: PostgreSQL does not promise to test the type before casting
+        number = f"({value})::numeric"
+        fits = (
+            f"CASE WHEN jsonb_typeof({value}) = 'number' THEN {number} = trunc({number}) "
+            f"AND {number} BETWEEN {_INT32_RANGE.start} AND {_INT32_RANGE.stop - 1} ELSE false END"
+        )
+        converted = f"({value})::numeric::integer"
+    elif kind is str:
+        fits = f"jsonb_typeof({value}) = 'string'"
+        converted = f"d.data->>'{key}'"
+    else:
+        fits = f"jsonb_typeof({value}) = 'array'"
+        converted = value
+    return f"CASE WHEN {fits} THEN {converted} END", f"CASE WHEN {fits} OR jsonb_typeof({value}) = 'null' THEN '{key}' END"
+
+
+def _is_date(doc_id: str) -> bool:
+    """A real calendar date spelled YYYY-MM-DD, the only form tracking doc ids take"""
+    try:
+        return date.fromisoformat(doc_id).isoformat() == doc_id
+    except ValueError:
+        return False
+
+
+def migrate_tracking_documents(
+    sync_conn, batch_size: int, after: Tuple[str, str] = ("", "")
+) -> Tuple[int, Optional[Tuple[str, str]]]:
+    """
+    Move the next `batch_size` `tracking` documents after the (user_id, doc_id) position
+    `after` from user_documents into daily_tracking. Returns how many moved and the position to
+    continue from, None once all were seen. Rows already in daily_tracking win over a leftover
+    document; documents whose id is not a real date (2024-02-30) are logged and left in place.
+    """
+    candidates = sync_conn.execute(text(
+        "SELECT d.user_id, d.doc_id FROM user_documents d "
+        "WHERE d.collection_name = :collection AND (d.user_id, d.doc_id) > (:after_user_id, :after_doc_id) "
+        "ORDER BY d.user_id, d.doc_id LIMIT :batch_size"
+    ), {
+        "collection": TRACKING_COLLECTION, "after_user_id": after[0], "after_doc_id": after[1], "batch_size": batch_size,
+    }).all()
+    dated = [(user_id, doc_id) for user_id, doc_id in candidates if _is_date(doc_id)]
+    for user_id, doc_id in candidates:
+        if not _is_date(doc_id):
+            logger.warning(f"Left tracking document {user_id}/{doc_id} in user_documents: its id is not a date")
+    inserted = 0
+    if dated:
+        keys = _TRACKING_COLUMNS
+        values, moved_keys = zip(*(_tracking_migration_column(key) for key in keys))
+        # Only ids checked above reach the ::date cast
+        batch = (
+            "d.collection_name = :collection AND (d.user_id, d.doc_id) IN "
+            "(SELECT * FROM unnest(CAST(:user_ids AS VARCHAR[]), CAST(:doc_ids AS VARCHAR[])))"
+        )
+        user_ids, doc_ids = (list(ids) for ids in zip(*dated))
+        params = {"collection": TRACKING_COLLECTION, "user_ids": user_ids, "doc_ids": doc_ids}
+        inserted = sync_conn.execute(text(f"""
+            INSERT INTO daily_tracking (user_id, date, {", ".join(keys)}, extra, created_at, updated_at)
+            SELECT d.user_id, d.doc_id::date, {", ".join(values)},
+                   d.data - ARRAY['user_id', 'date'] - array_remove(ARRAY[{", ".join(moved_keys)}], NULL),
+                   d.created_at, d.updated_at
+            FROM user_documents d
+            WHERE {batch}
+            ON CONFLICT (user_id, date) DO NOTHING
+        """), params).rowcount
+        sync_conn.execute(text(f"""
+            DELETE FROM user_documents d USING daily_tracking t
+            WHERE {batch} AND t.user_id = d.user_id AND to_char(t.date, 'YYYY-MM-DD') = d.doc_id
+        """), params)
+    if len(candidates) < batch_size:
+        return inserted, None
+    return inserted, tuple(candidates[-1])
+
+
+def create_schema(sync_conn) -> None:
+    """Create missing tables, partitions and indexes; moves no data beyond the default partition's"""
+    Base.metadata.create_all(sync_conn)
+    _create_missing_indexes(sync_conn)
+    _create_missing_partitions(sync_conn)
+    _use_byte_order_doc_ids(sync_conn)
+    _create_collection_indexes(sync_conn)
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def _create_engine(database_url: str, pool_name: str = "primary"):
+    """An engine sized by the DATABASE_POOL_* settings, reporting to the db_pool_* metrics as `pool_name`"""
+    url, connect_args = _async_database_url(database_url)
+    if settings.DATABASE_PGBOUNCER:
+        # Transaction pooling runs each transaction on whichever server connection is free,
+        # so prepared statements can be neither cached nor looked up by a reused name
+        url = make_url(url).update_query_dict({"prepared_statement_cache_size": "0"}).render_as_string(hide_password=False)
+        connect_args.update(statement_cache_size=0, prepared_statement_name_func=_unique_statement_name)
+    if settings.DATABASE_POOL_SIZE > 0:
+        pool_args = {
+            "poolclass": MeasuredQueuePool,
+            "pool_size": settings.DATABASE_POOL_SIZE,
+            "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+            "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+            "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        }
+    else:
+        # Every checkout opens a connection; for use behind an external pooler
+        pool_args = {"poolclass": MeasuredNullPool}
+    new_engine = create_async_engine(
+        url,
+        connect_args=connect_args,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        pool_logging_name=pool_name,
+        **pool_args,
+    )
+    instrument_pool(new_engine.sync_engine, pool_name)
+    return new_engine
+
+
+class _Replica:
+    """A read replica's engine and whether it is currently serving reads"""
+
+    def __init__(self, database_url: str, pool_name: str = "replica"):
+        self.engine = _create_engine(database_url, pool_name)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.name = make_url(database_url).render_as_string(hide_password=True)
+        self.healthy = True
+
+
+_replica_turn = itertools.count()
+
+
+def _pick_replica() -> Optional[_Replica]:
+    """Round-robin over the healthy replicas; None sends the read to the primary"""
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_replica_turn) % len(healthy)]
+
+
+def _is_connection_error(error: Exception) -> bool:
+    if isinstance(error, (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def _mark_replica(replica: _Replica, healthy: bool, reason: str = "") -> None:
+    if replica.healthy != healthy:
+        if healthy:
+            logger.info(f"Read replica {replica.name} is back in rotation")
+        else:
+            logger.warning(f"Read replica {replica.name} taken out of rotation: {reason}")
+    replica.healthy = healthy
+
+
+async def _check_replicas() -> None:
+    for replica in replicas:
+        try:
+            async with replica.engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=5)
+        except Exception as e:
+            _mark_replica(replica, False, repr(e))
+        else:
+            _mark_replica(replica, True)
+
+
+async def _monitor_replicas() -> None:
+    while True:
+        await asyncio.sleep(settings.DATABASE_REPLICA_HEALTH_INTERVAL)
+        await _check_replicas()
+
+
 async def init_database():
     """Initialize PostgreSQL connection and create tables"""
-    global engine, SessionLocal
+    global engine, SessionLocal, replicas, _replica_monitor
     try:
-        engine = create_engine(
-            settings.DATABASE_URL,
-            pool_pre_ping=True,
-            pool_recycle=300,
-            pool_size=10,
-            max_overflow=20,
-        )
-        SessionLocal = sessionmaker(bind=engine)
-        Base.metadata.create_all(bind=engine)
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        if make_url(settings.DATABASE_URL).get_backend_name() == "sqlite":
+            # Embedded backend for development and benchmarks; only it needs aiosqlite
+            from app.core.sqlite_backend import SQLiteDatabaseService, init_sqlite_database
+            engine = await init_sqlite_database(settings.DATABASE_URL)
+            SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+            db_service.use(SQLiteDatabaseService())
+            return
+        engine = _create_engine(settings.DATABASE_URL)
+        SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(_lock_schema)
+            await conn.run_sync(_check_no_pending_migration)
+            await conn.run_sync(create_schema)
+            await conn.execute(text("SELECT 1"))
+        replicas = [_Replica(url, f"replica{i}") for i, url in enumerate(settings.DATABASE_REPLICA_URLS)]
+        if replicas:
+            await _check_replicas()
+            _replica_monitor = asyncio.create_task(_monitor_replicas())
+            logger.info(f"Routing reads to {sum(r.healthy for r in replicas)}/{len(replicas)} healthy read replicas")
         logger.info("PostgreSQL (Neon) database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
 
-def get_db() -> Session:
+async def close_database():
+    """Dispose of the connection pools"""
+    global _replica_monitor
+    if _replica_monitor is not None:
+        _replica_monitor.cancel()
+        _replica_monitor = None
+    for replica in replicas:
+        await replica.engine.dispose()
+    if engine is not None:
+        await engine.dispose()
+
+
+def get_db() -> AsyncSession:
     """Get a database session"""
     return SessionLocal()
 
 
+class _UnitOfWork:
+    """Sessions shared by the db_service calls of one request or task, opened on first use"""
+
+    def __init__(self):
+        self.session: Optional[AsyncSession] = None
+        # Once the unit has written, its reads must see its own uncommitted changes
+        self.wrote = False
+        self.replica: Optional[_Replica] = None
+        self.replica_session: Optional[AsyncSession] = None
+        # (user_id, collection) pairs written, announced again to write listeners after the commit
+        self.written: Set[Tuple[str, Optional[str]]] = set()
+        # Replica pins this unit has set, and the ones it has looked up: one cache round trip per user
+        self.pinned: Set[str] = set()
+        self.pins_seen: Dict[str, bool] = {}
+
+    async def close_replica_session(self) -> None:
+        if self.replica_session is not None:
+            await self.replica_session.close()
+        self.replica = self.replica_session = None
+
+
+_current_unit: ContextVar[Optional[_UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[None]:
+    """
+    Run every db_service call in the block on one session and transaction,
+    committed once on exit and rolled back if the block raises.
+    Nested blocks join the outer unit of work.
+    """
+    if _current_unit.get() is not None:
+        yield
+        return
+    unit = _UnitOfWork()
+    token = _current_unit.set(unit)
+    try:
+        yield
+        if unit.session is not None:
+            await unit.session.commit()
+        for user_id, collection in unit.written:
+            await _notify_write_listeners(user_id, collection)
+    finally:
+        _current_unit.reset(token)
+        await unit.close_replica_session()
+        if unit.session is not None:
+            await unit.session.close()
+
+
+async def request_unit_of_work() -> AsyncIterator[None]:
+    """FastAPI dependency giving each request a single unit of work"""
+    async with unit_of_work():
+        yield
+
+
+async def release_unit_of_work() -> None:
+    """
+    Commit what the current unit of work has done so far and return its connections to the
+    pool; later db_service calls in the unit start a new transaction. Call it before a slow
+    wait that needs no database (a model round trip), so no connection idles in a transaction.
+    """
+    unit = _current_unit.get()
+    if unit is None:
+        return
+    await unit.close_replica_session()
+    if unit.session is None:
+        return
+    await unit.session.commit()
+    written, unit.written = unit.written, set()
+    for user_id, collection in written:
+        await _notify_write_listeners(user_id, collection)
+
+
+def spawn_detached(coro: Awaitable[Any]) -> "asyncio.Task[Any]":
+    """
+    Run `coro` as a task outside the caller's unit of work. Tasks inherit the caller's
+    contextvars, so a plain create_task inside a request would share its session and
+    transaction; this one gets its own, and its writes commit even if the request rolls back.
+    """
+    return Context().run(asyncio.ensure_future, coro)
+
+
+# user_id -> true while that user's reads stay on the primary. Kept in the shared cache, so a
+# write handled by one worker pins the follow-up requests other workers serve
+_replica_pins = Cache("replica_pin", ttl=settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+async def _pin_to_primary(user_id: str, unit: Optional["_UnitOfWork"]) -> None:
+    if unit is not None:
+        if user_id in unit.pinned:
+            return
+        unit.pinned.add(user_id)
+        unit.pins_seen[user_id] = True
+    await _replica_pins.set(user_id, True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+async def _is_pinned(user_id: Optional[str], unit: Optional["_UnitOfWork"]) -> bool:
+    if user_id is None:
+        return False
+    if unit is None:
+        return await _replica_pins.get(user_id, False)
+    if user_id not in unit.pins_seen:
+        unit.pins_seen[user_id] = await _replica_pins.get(user_id, False)
+    return unit.pins_seen[user_id]
+
+
+# await listener(user_id, collection) runs after db_service writes one of the user's documents;
+# collection is None for the users row (and for delete_user, which removes everything)
+_write_listeners: List[Callable[[str, Optional[str]], Awaitable[None]]] = []
+
+
+def add_write_listener(listener: Callable[[str, Optional[str]], Awaitable[None]]) -> None:
+    """Register a coroutine function called on user writes, e.g. to evict a cache of per-user reads"""
+    _write_listeners.append(listener)
+
+
+async def _notify_write_listeners(user_id: str, collection: Optional[str]) -> None:
+    for listener in _write_listeners:
+        try:
+            await listener(user_id, collection)
+        except Exception as e:
+            logger.error(f"Write listener {listener!r} failed for user {user_id}: {e}")
+
+
+async def _user_written(user_id: str, collection: Optional[str] = None) -> None:
+    """
+    Tell the write listeners now, so the rest of a unit of work reads fresh data, and again
+    after its commit, in case a concurrent request cached the pre-commit state meanwhile
+    """
+    await _notify_write_listeners(user_id, collection)
+    unit = _current_unit.get()
+    if unit is not None:
+        unit.written.add((user_id, collection))
+
+
+def _writes_user_row(method):
+    """Decorates DatabaseService methods taking (user_id, ...) that write the users row"""
+    @functools.wraps(method)
+    async def wrapper(self, user_id: str, *args, **kwargs):
+        result = await method(self, user_id, *args, **kwargs)
+        await _user_written(user_id)
+        return result
+    return wrapper
+
+
+def _writes_user_docs(method):
+    """Decorates DatabaseService methods taking (user_id, collection, ...) that write user documents"""
+    @functools.wraps(method)
+    async def wrapper(self, user_id: str, collection: str, *args, **kwargs):
+        result = await method(self, user_id, collection, *args, **kwargs)
+        await _user_written(user_id, collection)
+        return result
+    return wrapper
+
+
+@asynccontextmanager
+async def _session(*user_ids: str, write: bool = True) -> AsyncIterator[AsyncSession]:
+    """
+    A primary session: the current unit of work's, or a fresh one committed after the call.
+    Writes pin the reads of `user_ids` to the primary for DATABASE_REPLICA_PIN_SECONDS (read-your-writes).
+    """
+    unit = _current_unit.get()
+    wrote_before = unit is not None and unit.wrote
+    if write:
+        if unit is not None:
+            unit.wrote = True
+        if replicas:
+            for user_id in user_ids:
+                await _pin_to_primary(user_id, unit)
+    if unit is not None:
+        if unit.session is None:
+            unit.session = get_db()
+        session = unit.session
+        try:
+            # A failed statement aborts the transaction, and callers may catch the error and carry on.
+            # Once the unit has written, a savepoint keeps those writes; before that, a rollback loses nothing.
+            if wrote_before and session.in_transaction():
+                async with session.begin_nested():
+                    yield session
+            else:
+                try:
+                    yield session
+                except Exception:
+                    await session.rollback()
+                    raise
+        finally:
+            # Results are returned as dicts; keep the identity map from serving stale rows later in the request
+            session.expunge_all()
+        return
+    async with get_db() as session:
+        yield session
+        await session.commit()
+
+
+class _ReplicaReader:
+    """Runs reads on a replica session, retrying on the primary when the replica is unreachable"""
+
+    def __init__(self, replica: _Replica, session: AsyncSession, unit: Optional[_UnitOfWork]):
+        self.replica = replica
+        self.session: Optional[AsyncSession] = session
+        self.unit = unit
+
+    async def _fail_over(self, error: Exception) -> None:
+        if not _is_connection_error(error):
+            raise error
+        _mark_replica(self.replica, False, repr(error))
+        self.session = None
+        if self.unit is not None:
+            await self.unit.close_replica_session()
+
+    async def execute(self, statement):
+        if self.session is not None:
+            try:
+                return await self.session.execute(statement)
+            except Exception as e:
+                await self._fail_over(e)
+        async with _session(write=False) as db:
+            return await db.execute(statement)
+
+    async def stream(self, statement) -> AsyncIterator[Any]:
+        """Rows from a server-side cursor; only a replica failing before the first row is retried on the primary"""
+        if self.session is not None:
+            try:
+                result = await self.session.stream(statement)
+            except Exception as e:
+                await self._fail_over(e)
+            else:
+                async for row in _consume(result):
+                    yield row
+                return
+        async with _session(write=False) as db:
+            async for row in _stream_rows(db, statement):
+                yield row
+
+
+async def _consume(result) -> AsyncIterator[Any]:
+    try:
+        async for row in result:
+            yield row
+    finally:
+        await result.close()
+
+
+async def _stream_rows(db, statement) -> AsyncIterator[Any]:
+    """
+    Rows of `statement` on what _read_session yielded, fetched `yield_per` at a time from a
+    server-side cursor. The cursor stays open until the iteration ends, so consumers that
+    stop early should aclose() the generator rather than abandon it.
+    """
+    if isinstance(db, _ReplicaReader):
+        async for row in db.stream(statement):
+            yield row
+        return
+    async for row in _consume(await db.stream(statement)):
+        yield row
+
+
+@asynccontextmanager
+async def _read_session(user_id: Optional[str] = None) -> AsyncIterator[Any]:
+    """
+    Something to execute a read on: a healthy replica, or the primary when there is none,
+    when `user_id` wrote recently, or when the current unit of work has already written
+    """
+    unit = _current_unit.get()
+    replica = None
+    if replicas and not (unit is not None and unit.wrote) and not await _is_pinned(user_id, unit):
+        if unit is not None and unit.replica is not None and unit.replica.healthy:
+            replica = unit.replica
+        else:
+            replica = _pick_replica()
+    if replica is None:
+        async with _session(write=False) as db:
+            yield db
+        return
+    if unit is None:
+        async with replica.sessions() as session:
+            yield _ReplicaReader(replica, session, None)
+        return
+    if unit.replica is not replica:
+        await unit.close_replica_session()
+        unit.replica, unit.replica_session = replica, replica.sessions()
+    reader = _ReplicaReader(replica, unit.replica_session, unit)
+    try:
+        yield reader
+    except Exception:
+        # Reads only: rolling back leaves the replica session usable for the rest of the unit
+        if unit.replica_session is not None:
+            await unit.replica_session.rollback()
+        raise
+    finally:
+        if unit.replica_session is not None:
+            unit.replica_session.expunge_all()
+
+
 # ──────────────────────────────────────────────
 # Database Service
 # ──────────────────────────────────────────────
 
+# Columns on `users` that mirror keys of the profile dict
+USER_PROFILE_COLUMNS = ("email", "display_name", "photo_url", "phone_number")
+
+# Rows per multi-row INSERT; 7 bind parameters each keeps statements well under asyncpg's 32767 limit
+BULK_WRITE_CHUNK_SIZE = 1000
+
+# Rows per server-side cursor fetch in stream_user_docs
+STREAM_BATCH_SIZE = 500
+
+# RETURNING value of an INSERT ... ON CONFLICT DO UPDATE: xmax is 0 only for freshly inserted rows
+_ROW_EXISTED = literal_column("xmax <> 0")
+
+
+def _jsonb_merge(stored, patch):
+    """Top-level JSONB merge evaluated by PostgreSQL, so partial updates never round-trip the document"""
+    return func.coalesce(stored, literal({}, JSONB)).op("||", return_type=JSONB)(patch)
+
+
+def _jsonb_number(value):
+    """A JSONB value as numeric, or NULL when it is not a JSON number"""
+    return case((func.jsonb_typeof(value) == "number", value.astext.cast(Numeric)))
+
+
+def _jsonb_array(value):
+    """A JSONB value if it is an array, else '[]', so array functions never raise on stray data"""
+    return case((func.jsonb_typeof(value) == "array", value), else_=literal([], JSONB))
+
+
+class _DocumentFields:
+    """Document keys as SQL expressions over user_documents.data"""
+
+    @staticmethod
+    def json(key: str):
+        return UserDocument.data[key]
+
+    @staticmethod
+    def text(key: str):
+        return _json_text(key)
+
+    @staticmethod
+    def number(key: str):
+        return _jsonb_number(UserDocument.data[key])
+
+    @staticmethod
+    def is_null(key: str):
+        return _json_text(key).is_(None)
+
+
+class _TrackingFields:
+    """
+    Document keys as SQL expressions over daily_tracking: the typed column,
+    falling back to `extra` for values that did not fit it
+    """
+
+    @staticmethod
+    def _extra(key: str):
+        # Inline key, as in _json_text, so GROUP BY matches the selected expression
+        return DailyTrackingRow.extra[literal(key, literal_execute=True)]
+
+    @staticmethod
+    def json(key: str):
+        if key in TRACKING_KEY_FIELDS:
+            return func.to_jsonb(getattr(DailyTrackingRow, key), type_=JSONB)
+        if key in _TRACKING_COLUMNS:
+            column_value = func.to_jsonb(getattr(DailyTrackingRow, key), type_=JSONB)
+            return func.coalesce(column_value, _TrackingFields._extra(key), type_=JSONB)
+        return _TrackingFields._extra(key)
+
+    @staticmethod
+    def text(key: str):
+        if key in TRACKING_KEY_FIELDS:
+            return cast(getattr(DailyTrackingRow, key), Text)
+        if key in _TRACKING_COLUMNS:
+            return func.coalesce(cast(getattr(DailyTrackingRow, key), Text), _TrackingFields._extra(key).astext)
+        return _TrackingFields._extra(key).astext
+
+    @staticmethod
+    def number(key: str):
+        if TRACKING_SCALAR_COLUMNS.get(key) in (int, float):
+            return func.coalesce(getattr(DailyTrackingRow, key), _jsonb_number(_TrackingFields._extra(key)))
+        return _jsonb_number(_TrackingFields.json(key))
+
+    @staticmethod
+    def is_null(key: str):
+        return _TrackingFields.text(key).is_(None)
+
+    @staticmethod
+    def equals(key: str, value: Any):
+        if key == "user_id":
+            return DailyTrackingRow.user_id == value
+        if key == "date":
+            return DailyTrackingRow.date == _tracking_day(value)
+        if value is None:
+            return _TrackingFields.is_null(key)
+        if key in TRACKING_SCALAR_COLUMNS and _tracking_column_value(key, value)[0]:
+            return getattr(DailyTrackingRow, key) == value
+        return _TrackingFields.text(key) == (str(value).lower() if isinstance(value, bool) else str(value))
+
+
+def _aggregate_column(name: str, spec: Tuple[str, ...], fields=_DocumentFields):
+    """
+    SQL aggregate for one aggregate_user_docs metric:
+      ("count",)                     documents
+      ("count_null", key)            documents where data->key is missing or null
+      ("sum", key)                   sum of numeric data->key
+      ("sum_len", key)               sum of jsonb_array_length(data->key)
+      ("sum_items", key, item_key)   sum of numeric item_key over the objects in array data->key
+    """
+    op, args = spec[0], spec[1:]
+    if op == "count":
+        aggregate = func.count()
+    elif op == "count_null":
+        aggregate = func.count().filter(fields.is_null(args[0]))
+    elif op == "sum":
+        aggregate = func.coalesce(func.sum(fields.number(args[0])), 0)
+    elif op == "sum_len":
+        aggregate = func.coalesce(func.sum(func.jsonb_array_length(_jsonb_array(fields.json(args[0])))), 0)
+    elif op == "sum_items":
+        items = func.jsonb_array_elements(_jsonb_array(fields.json(args[0]))).table_valued(column("value", JSONB)).alias("item")
+        per_doc = select(func.sum(_jsonb_number(items.c.value[args[1]]))).select_from(items).scalar_subquery()
+        aggregate = func.coalesce(func.sum(per_doc), 0)
+    else:
+        raise ValueError(f"Unknown aggregate {op!r} for metric {name!r}")
+    return aggregate.label(name)
+
+
+def _plain_number(value):
+    """Decimal sums back to int/float for JSON responses"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _jsonb_projection(fields: Iterable[str]):
+    """
+    A JSONB object holding only `fields` of data, built in SQL so the unselected
+    parts of large documents never leave the database
+    """
+    projection = literal({}, JSONB)
+    for field in fields:
+        present = case(
+            (UserDocument.data.has_key(field), func.jsonb_build_object(field, UserDocument.data[field], type_=JSONB)),
+            else_=literal({}, JSONB),
+        )
+        projection = projection.op("||", return_type=JSONB)(present)
+    return projection
+
+
+def _aggregate_statement(metrics: Dict[str, Tuple[str, ...]], where: List[Any], group_by: Optional[str], fields):
+    columns = [_aggregate_column(name, spec, fields) for name, spec in metrics.items()]
+    if group_by:
+        columns.insert(0, fields.text(group_by).label("group_key"))
+    q = select(*columns).where(*where)
+    if group_by:
+        q = q.group_by(fields.text(group_by))
+    return q
+
+
+def _aggregate_results(rows, metrics: Dict[str, Tuple[str, ...]], group_by: Optional[str]) -> Dict[Any, Any]:
+    if not group_by:
+        return {name: _plain_number(rows[0]._mapping[name]) for name in metrics}
+    return {row.group_key: {name: _plain_number(row._mapping[name]) for name in metrics} for row in rows}
+
+
+def _streaks_statement(passed, order: Tuple[Any, ...], where: List[Any]):
+    """Current and longest run of rows, in `order`, for which `passed` holds"""
+    ranked = select(
+        passed.label("passed"),
+        func.row_number().over(order_by=order).label("position"),
+        func.row_number().over(partition_by=passed, order_by=order).label("run_position"),
+        func.count().over().label("total"),
+    ).where(*where).subquery()
+    # Gaps and islands: position - run_position is constant within a run of passing rows
+    runs = (
+        select(
+            func.count().label("length"),
+            (func.max(ranked.c.position) == func.max(ranked.c.total)).label("is_latest"),
+        )
+        .where(ranked.c.passed)
+        .group_by(ranked.c.position - ranked.c.run_position)
+        .subquery()
+    )
+    return select(
+        func.coalesce(func.max(runs.c.length).filter(runs.c.is_latest), 0).label("current"),
+        func.coalesce(func.max(runs.c.length), 0).label("longest"),
+    )
+
+
+_TRACKING_CONFLICT = [DailyTrackingRow.user_id, DailyTrackingRow.date]
+
+
+def _tracking_row(user_id: str, day: date, data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """INSERT values replacing a whole tracking document; every row carries every column"""
+    columns, extra = _tracking_values(data)
+    row = {"user_id": user_id, "date": day, "extra": extra, "created_at": now, "updated_at": now}
+    for key in _TRACKING_COLUMNS:
+        row[key] = columns.get(key)
+    return row
+
+
+def _tracking_patch(stored_extra, updates: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Any]:
+    """
+    (column values, extra patch, merged extra expression) for shallow-merging `updates`:
+    keys with a column are set (NULL when the value went to extra) and dropped from the stored extra
+    """
+    columns, extra = _tracking_values(updates)
+    replaced = {key: columns.get(key) for key in updates if key in _TRACKING_COLUMNS}
+    for key in replaced:
+        stored_extra = stored_extra.op("-", return_type=JSONB)(cast(literal(key), Text))
+    return replaced, extra, stored_extra
+
+
+class _DailyTrackingStore:
+    """The tracking collection of DatabaseService, one typed daily_tracking row per (user, date)"""
+
+    @staticmethod
+    def _where(user_id: str, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        return [DailyTrackingRow.user_id == user_id, *(_TrackingFields.equals(k, v) for k, v in (filters or {}).items())]
+
+    async def get(self, user_id: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        docs = await self.get_many(user_id, [doc_id])
+        return next(iter(docs.values()), None)
+
+    async def get_many(self, user_id: str, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        days = []
+        for doc_id in doc_ids:
+            try:
+                days.append(_tracking_day(doc_id))
+            except ValueError:
+                continue
+        if not days:
+            return {}
+        q = select(DailyTrackingRow.__table__).where(DailyTrackingRow.user_id == user_id, DailyTrackingRow.date.in_(days))
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        docs = {}
+        for row in rows:
+            doc = _tracking_doc(row)
+            docs[doc["_id"]] = doc
+        return docs
+
+    async def get_range(self, user_id: str, start_doc_id: str, end_doc_id: str, order_dir: str) -> List[Dict[str, Any]]:
+        q = select(DailyTrackingRow.__table__).where(
+            DailyTrackingRow.user_id == user_id,
+            DailyTrackingRow.date.between(_tracking_day(start_doc_id), _tracking_day(end_doc_id)),
+        )
+        if order_dir.upper() == "ASC":
+            q = q.order_by(DailyTrackingRow.date.asc())
+        else:
+            q = q.order_by(DailyTrackingRow.date.desc())
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        return [_tracking_doc(row) for row in rows]
+
+    async def set_many(self, docs: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Replace whole (user_id, doc_id, data) documents; the last write for a day wins"""
+        now = datetime.utcnow()
+        rows = {}
+        for user_id, doc_id, data in docs:
+            day = _tracking_day(doc_id)
+            rows[(user_id, day)] = _tracking_row(user_id, day, data, now)
+        values = list(rows.values())
+        async with _session(*{user_id for user_id, _ in rows}) as db:
+            for start in range(0, len(values), BULK_WRITE_CHUNK_SIZE):
+                stmt = pg_insert(DailyTrackingRow).values(values[start:start + BULK_WRITE_CHUNK_SIZE])
+                replaced = {key: stmt.excluded[key] for key in (*_TRACKING_COLUMNS, "extra", "updated_at")}
+                await db.execute(stmt.on_conflict_do_update(index_elements=_TRACKING_CONFLICT, set_=replaced))
+        return len(values)
+
+    async def create(self, user_id: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        stmt = pg_insert(DailyTrackingRow).values(_tracking_row(user_id, _tracking_day(doc_id), data, datetime.utcnow()))
+        stmt = stmt.on_conflict_do_nothing(index_elements=_TRACKING_CONFLICT).returning(literal(True))
+        async with _session(user_id) as db:
+            return bool((await db.execute(stmt)).scalar_one_or_none())
+
+    async def update(self, user_id: str, doc_id: str, updates: Dict[str, Any], upsert: bool) -> bool:
+        day = _tracking_day(doc_id)
+        now = datetime.utcnow()
+        columns, extra, stored = _tracking_patch(DailyTrackingRow.extra, updates)
+        if upsert:
+            stmt = pg_insert(DailyTrackingRow).values(
+                user_id=user_id, date=day, **columns, extra=extra, created_at=now, updated_at=now
+            )
+            merged = {key: stmt.excluded[key] for key in columns}
+            merged["extra"] = _jsonb_merge(stored, stmt.excluded.extra)
+            merged["updated_at"] = stmt.excluded.updated_at
+            stmt = stmt.on_conflict_do_update(index_elements=_TRACKING_CONFLICT, set_=merged).returning(_ROW_EXISTED)
+        else:
+            stmt = (
+                update(DailyTrackingRow)
+                .where(DailyTrackingRow.user_id == user_id, DailyTrackingRow.date == day)
+                .values(**columns, extra=_jsonb_merge(stored, literal(extra, JSONB)), updated_at=now)
+                .returning(literal(True))
+                .execution_options(synchronize_session=False)
+            )
+        async with _session(user_id) as db:
+            matched = (await db.execute(stmt)).scalar_one_or_none()
+        return bool(matched)
+
+    async def update_where(self, user_id: str, updates: Dict[str, Any], filters: Optional[Dict[str, Any]],
+                           exclude_doc_ids: List[str]) -> int:
+        columns, extra, stored = _tracking_patch(DailyTrackingRow.extra, updates)
+        stmt = (
+            update(DailyTrackingRow)
+            .where(*self._where(user_id, filters))
+            .values(**columns, extra=_jsonb_merge(stored, literal(extra, JSONB)), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if exclude_doc_ids:
+            stmt = stmt.where(DailyTrackingRow.date.not_in([_tracking_day(doc_id) for doc_id in exclude_doc_ids]))
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
+
+    async def append(self, user_id: str, doc_id: str, field: str, item: Any,
+                     defaults: Optional[Dict[str, Any]]) -> int:
+        if field not in TRACKING_ARRAY_COLUMNS:
+            raise ValueError(f"Tracking documents have no array column {field!r}")
+        now = datetime.utcnow()
+        columns, extra = _tracking_values(defaults or {})
+        columns[field] = [item]
+        stmt = pg_insert(DailyTrackingRow).values(
+            user_id=user_id, date=_tracking_day(doc_id), **columns, extra=extra, created_at=now, updated_at=now
+        )
+        array = getattr(DailyTrackingRow, field)
+        # Concurrent appends serialize on the row lock, so none of them are lost
+        appended = func.coalesce(array, literal([], JSONB)).op("||", return_type=JSONB)(stmt.excluded[field])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_TRACKING_CONFLICT,
+            set_={field: appended, "updated_at": stmt.excluded.updated_at},
+        ).returning(func.jsonb_array_length(array))
+        async with _session(user_id) as db:
+            length = (await db.execute(stmt)).scalar_one()
+        return length
+
+    async def delete(self, user_id: str, doc_id: str) -> None:
+        try:
+            day = _tracking_day(doc_id)
+        except ValueError:
+            return
+        async with _session(user_id) as db:
+            await db.execute(delete(DailyTrackingRow).where(DailyTrackingRow.user_id == user_id, DailyTrackingRow.date == day))
+
+    async def delete_range(self, user_id: str, start_doc_id: str, end_doc_id: str) -> int:
+        stmt = delete(DailyTrackingRow).where(
+            DailyTrackingRow.user_id == user_id,
+            DailyTrackingRow.date.between(_tracking_day(start_doc_id), _tracking_day(end_doc_id)),
+        )
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
+
+    def _query(
+        self,
+        user_id: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[List[str]],
+        cursor: Optional[str],
+    ):
+        if fields is not None:
+            wanted = [key for key in _TRACKING_COLUMNS if key in fields]
+            columns = [DailyTrackingRow.user_id, DailyTrackingRow.date, *(getattr(DailyTrackingRow, key) for key in wanted)]
+            if any(key not in _TRACKING_COLUMNS and key not in TRACKING_KEY_FIELDS for key in fields):
+                columns.append(DailyTrackingRow.extra)
+        else:
+            columns = [DailyTrackingRow.__table__]
+        sort_key = DailyTrackingRow.date if order_by in (None, "date") else _TrackingFields.text(order_by)
+        q = select(*columns).where(*self._where(user_id, filters))
+        if order_by:
+            q = q.add_columns(_TrackingFields.text(order_by).label("sort_key"))
+        if cursor:
+            if not order_by:
+                raise InvalidCursorError("A cursor needs an order_by key")
+            position, doc_id = _decode_cursor(cursor)
+            try:
+                day = _tracking_day(doc_id)
+                if order_by == "date":
+                    position = day
+            except ValueError as e:
+                raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+            ascending = order_dir.upper() == "ASC"
+            # PostgreSQL sorts NULLs last ascending, first descending
+            q = q.where(_after_cursor(sort_key, DailyTrackingRow.date, position, day, ascending, nulls_first=not ascending))
+        if order_dir.upper() == "ASC" and order_by:
+            q = q.order_by(sort_key.asc(), DailyTrackingRow.date.asc())
+        else:
+            q = q.order_by(sort_key.desc(), DailyTrackingRow.date.desc())
+        if limit_count:
+            q = q.limit(limit_count)
+        return q
+
+    @staticmethod
+    def _row_doc(row, fields: Optional[List[str]]) -> Dict[str, Any]:
+        doc = _tracking_doc(row)
+        if fields is not None:
+            doc = {key: doc[key] for key in (*fields, "_id") if key in doc}
+        return doc
+
+    async def fetch(
+        self,
+        user_id: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[Iterable[str]],
+        cursor: Optional[str],
+    ) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        """_fetch_user_docs for tracking: ordered by date unless `order_by` names another key"""
+        fields = list(fields) if fields is not None else None
+        q = self._query(user_id, filters, order_by, order_dir, limit_count, fields, cursor)
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        return [(self._row_doc(row, fields), row.sort_key if order_by else None) for row in rows]
+
+    async def stream(self, user_id: str, filters: Optional[Dict[str, Any]], order_by: Optional[str], order_dir: str,
+                     fields: Optional[Iterable[str]], batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+        fields = list(fields) if fields is not None else None
+        q = self._query(user_id, filters, order_by, order_dir, None, fields, None).execution_options(yield_per=batch_size)
+        async with _read_session(user_id) as db:
+            async for row in _stream_rows(db, q):
+                yield self._row_doc(row, fields)
+
+    async def aggregate(self, user_id: str, metrics: Dict[str, Tuple[str, ...]], filters: Optional[Dict[str, Any]],
+                        group_by: Optional[str]) -> Dict[Any, Any]:
+        q = _aggregate_statement(metrics, self._where(user_id, filters), group_by, _TrackingFields)
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        return _aggregate_results(rows, metrics, group_by)
+
+    async def streaks(self, user_id: str, order_by: str, key: str, threshold: float) -> Dict[str, int]:
+        order = (DailyTrackingRow.date,) if order_by == "date" else (_TrackingFields.text(order_by), DailyTrackingRow.date)
+        passed = func.coalesce(_TrackingFields.number(key), 0) > threshold
+        async with _read_session(user_id) as db:
+            row = (await db.execute(_streaks_statement(passed, order, self._where(user_id)))).one()
+        return {"current": row.current, "longest": row.longest}
+
+
 class DatabaseService:
-    """Provides Firestore-compatible CRUD on PostgreSQL"""
+    """
+    Provides Firestore-compatible CRUD on PostgreSQL. Its public methods are the storage
+    interface; SQLiteDatabaseService (app/core/sqlite_backend.py) implements them on SQLite.
+    """
+
+    _tracking = _DailyTrackingStore()
 
     # ── User CRUD ──
 
-    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
-        db = get_db()
-        try:
-            row = db.query(UserRow).filter(UserRow.id == user_id).first()
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        async with _read_session(user_id) as db:
+            row = (await db.execute(select(UserRow).where(UserRow.id == user_id))).scalar_one_or_none()
             if not row:
                 return None
             result = dict(row.data or {})
@@ -113,160 +1476,358 @@ class DatabaseService:
                 "updated_at": row.updated_at.isoformat() if row.updated_at else None,
             })
             return result
-        finally:
-            db.close()
 
-    def set_user(self, user_id: str, data: Dict[str, Any]) -> None:
-        db = get_db()
-        try:
-            existing = db.query(UserRow).filter(UserRow.id == user_id).first()
-            now = datetime.utcnow()
-            if existing:
-                existing.email = data.get("email", existing.email)
-                existing.display_name = data.get("display_name", existing.display_name)
-                existing.photo_url = data.get("photo_url", existing.photo_url)
-                existing.phone_number = data.get("phone_number", existing.phone_number)
-                existing.data = data
-                existing.updated_at = now
-            else:
-                row = UserRow(
-                    id=user_id,
-                    email=data.get("email"),
-                    display_name=data.get("display_name"),
-                    photo_url=data.get("photo_url"),
-                    phone_number=data.get("phone_number"),
-                    data=data,
-                    created_at=now,
-                    updated_at=now,
-                )
-                db.add(row)
-            db.commit()
-        finally:
-            db.close()
+    @_writes_user_row
+    async def set_user(self, user_id: str, data: Dict[str, Any]) -> None:
+        now = datetime.utcnow()
+        stmt = pg_insert(UserRow).values(
+            id=user_id,
+            email=data.get("email"),
+            display_name=data.get("display_name"),
+            photo_url=data.get("photo_url"),
+            phone_number=data.get("phone_number"),
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+        # Profile columns missing from `data` keep their stored value
+        updates = {"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at}
+        for name in USER_PROFILE_COLUMNS:
+            if name in data:
+                updates[name] = stmt.excluded[name]
+        stmt = stmt.on_conflict_do_update(index_elements=[UserRow.id], set_=updates)
+        async with _session(user_id) as db:
+            await db.execute(stmt)
 
-    def update_user(self, user_id: str, updates: Dict[str, Any]) -> None:
-        db = get_db()
-        try:
-            row = db.query(UserRow).filter(UserRow.id == user_id).first()
-            if not row:
-                self.set_user(user_id, updates)
-                return
-            existing_data = dict(row.data or {})
-            existing_data.update(updates)
-            row.data = existing_data
-            if "email" in updates:
-                row.email = updates["email"]
-            if "display_name" in updates:
-                row.display_name = updates["display_name"]
-            if "photo_url" in updates:
-                row.photo_url = updates["photo_url"]
-            if "phone_number" in updates:
-                row.phone_number = updates["phone_number"]
-            row.updated_at = datetime.utcnow()
-            db.commit()
-        finally:
-            db.close()
+    @_writes_user_row
+    async def update_user(self, user_id: str, updates: Dict[str, Any]) -> bool:
+        """Merge `updates` into the user's data in one statement; returns True if the user already existed"""
+        now = datetime.utcnow()
+        stmt = pg_insert(UserRow).values(
+            id=user_id,
+            email=updates.get("email"),
+            display_name=updates.get("display_name"),
+            photo_url=updates.get("photo_url"),
+            phone_number=updates.get("phone_number"),
+            data=updates,
+            created_at=now,
+            updated_at=now,
+        )
+        merged = {"data": _jsonb_merge(UserRow.data, stmt.excluded.data), "updated_at": stmt.excluded.updated_at}
+        for name in USER_PROFILE_COLUMNS:
+            if name in updates:
+                merged[name] = stmt.excluded[name]
+        stmt = stmt.on_conflict_do_update(index_elements=[UserRow.id], set_=merged).returning(_ROW_EXISTED)
+        async with _session(user_id) as db:
+            existed = (await db.execute(stmt)).scalar_one()
+        return bool(existed)
 
-    def delete_user(self, user_id: str) -> None:
-        db = get_db()
-        try:
-            db.query(UserDocument).filter(UserDocument.user_id == user_id).delete()
-            db.query(UserRow).filter(UserRow.id == user_id).delete()
-            db.commit()
-        finally:
-            db.close()
+    @_writes_user_row
+    async def delete_user(self, user_id: str) -> None:
+        async with _session(user_id) as db:
+            await db.execute(delete(UserDocument).where(UserDocument.user_id == user_id))
+            await db.execute(delete(DailyTrackingRow).where(DailyTrackingRow.user_id == user_id))
+            await db.execute(delete(UserRow).where(UserRow.id == user_id))
 
     # ── User Subcollection CRUD ──
 
-    def get_user_doc(self, user_id: str, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
-        db = get_db()
-        try:
-            row = (
-                db.query(UserDocument)
-                .filter(
-                    UserDocument.user_id == user_id,
-                    UserDocument.collection_name == collection,
-                    UserDocument.doc_id == doc_id,
-                )
-                .first()
-            )
+    @staticmethod
+    def _user_doc_query(user_id: str, collection: str, doc_id: str):
+        return select(UserDocument).where(
+            UserDocument.user_id == user_id,
+            UserDocument.collection_name == collection,
+            UserDocument.doc_id == doc_id,
+        )
+
+    async def get_user_doc(self, user_id: str, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.get(user_id, doc_id)
+        async with _read_session(user_id) as db:
+            row = (await db.execute(self._user_doc_query(user_id, collection, doc_id))).scalar_one_or_none()
             if not row:
                 return None
             result = dict(row.data or {})
             result["_id"] = row.doc_id
             return result
-        finally:
-            db.close()
 
-    def set_user_doc(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
-        db = get_db()
-        try:
-            row_id = f"{user_id}:{collection}:{doc_id}"
-            existing = (
-                db.query(UserDocument)
-                .filter(
+    async def get_user_docs(self, user_id: str, collection: str, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch several documents in one statement, keyed by doc_id; missing ids are left out"""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.get_many(user_id, doc_ids)
+        async with _read_session(user_id) as db:
+            rows = (
+                await db.execute(
+                    select(UserDocument).where(
+                        UserDocument.user_id == user_id,
+                        UserDocument.collection_name == collection,
+                        UserDocument.doc_id.in_(doc_ids),
+                    )
+                )
+            ).scalars().all()
+            results = {}
+            for row in rows:
+                data = dict(row.data or {})
+                data["_id"] = row.doc_id
+                results[row.doc_id] = data
+            return results
+
+    async def get_user_docs_range(
+        self,
+        user_id: str,
+        collection: str,
+        start_doc_id: str,
+        end_doc_id: str,
+        order_dir: str = "ASC",
+    ) -> List[Dict[str, Any]]:
+        """Documents with start_doc_id <= doc_id <= end_doc_id, ordered by doc_id.
+
+        Date-keyed collections such as tracking use ISO dates as doc ids, so a
+        date window is a single range scan on the (user_id, date) primary key of daily_tracking.
+        """
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.get_range(user_id, start_doc_id, end_doc_id, order_dir)
+        async with _read_session(user_id) as db:
+            q = select(UserDocument).where(
+                UserDocument.user_id == user_id,
+                UserDocument.collection_name == collection,
+                # Not BETWEEN: its bounds cannot carry the doc_id column's COLLATE "C"
+                UserDocument.doc_id >= start_doc_id,
+                UserDocument.doc_id <= end_doc_id,
+            )
+            if order_dir.upper() == "ASC":
+                q = q.order_by(UserDocument.doc_id.asc())
+            else:
+                q = q.order_by(UserDocument.doc_id.desc())
+            rows = (await db.execute(q)).scalars().all()
+            results = []
+            for row in rows:
+                data = dict(row.data or {})
+                data["_id"] = row.doc_id
+                results.append(data)
+            return results
+
+    @_writes_user_docs
+    async def set_user_doc(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
+        if collection == TRACKING_COLLECTION:
+            await self._tracking.set_many([(user_id, doc_id, data)])
+            return doc_id
+        now = datetime.utcnow()
+        stmt = pg_insert(UserDocument).values(
+            id=f"{user_id}:{collection}:{doc_id}",
+            user_id=user_id,
+            collection_name=collection,
+            doc_id=doc_id,
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDocument.user_id, UserDocument.collection_name, UserDocument.doc_id],
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+        async with _session(user_id) as db:
+            await db.execute(stmt)
+        return doc_id
+
+    @_writes_user_docs
+    async def create_user_doc(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        """Insert a document unless doc_id already exists (left untouched); returns True if it was inserted"""
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.create(user_id, doc_id, data)
+        now = datetime.utcnow()
+        stmt = pg_insert(UserDocument).values(
+            id=f"{user_id}:{collection}:{doc_id}",
+            user_id=user_id,
+            collection_name=collection,
+            doc_id=doc_id,
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[UserDocument.user_id, UserDocument.collection_name, UserDocument.doc_id],
+        ).returning(literal(True))
+        async with _session(user_id) as db:
+            inserted = (await db.execute(stmt)).scalar_one_or_none()
+        return bool(inserted)
+
+    @_writes_user_docs
+    async def update_user_doc(self, user_id: str, collection: str, doc_id: str, updates: Dict[str, Any],
+                              upsert: bool = True) -> bool:
+        """
+        Shallow-merge `updates` into a document server-side (`data || patch`).
+        Returns True if the document already existed. With upsert=False a missing
+        document is left alone instead of being created from `updates`.
+        """
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.update(user_id, doc_id, updates, upsert)
+        now = datetime.utcnow()
+        if upsert:
+            stmt = pg_insert(UserDocument).values(
+                id=f"{user_id}:{collection}:{doc_id}",
+                user_id=user_id,
+                collection_name=collection,
+                doc_id=doc_id,
+                data=updates,
+                created_at=now,
+                updated_at=now,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserDocument.user_id, UserDocument.collection_name, UserDocument.doc_id],
+                set_={"data": _jsonb_merge(UserDocument.data, stmt.excluded.data), "updated_at": stmt.excluded.updated_at},
+            # Partitioned tables cannot return xmax; a stored row keeps its own created_at
+            ).returning(UserDocument.created_at.is_distinct_from(now))
+        else:
+            stmt = (
+                update(UserDocument)
+                .where(
                     UserDocument.user_id == user_id,
                     UserDocument.collection_name == collection,
                     UserDocument.doc_id == doc_id,
                 )
-                .first()
+                .values(data=_jsonb_merge(UserDocument.data, literal(updates, JSONB)), updated_at=now)
+                .returning(literal(True))
+                .execution_options(synchronize_session=False)
             )
-            now = datetime.utcnow()
-            if existing:
-                existing.data = data
-                existing.updated_at = now
-            else:
-                row = UserDocument(
-                    id=row_id,
-                    user_id=user_id,
-                    collection_name=collection,
-                    doc_id=doc_id,
-                    data=data,
-                    created_at=now,
-                    updated_at=now,
-                )
-                db.add(row)
-            db.commit()
-            return doc_id
-        finally:
-            db.close()
+        async with _session(user_id) as db:
+            matched = (await db.execute(stmt)).scalar_one_or_none()
+        return bool(matched)
 
-    def update_user_doc(self, user_id: str, collection: str, doc_id: str, updates: Dict[str, Any]) -> None:
-        db = get_db()
-        try:
-            existing = (
-                db.query(UserDocument)
-                .filter(
+    @_writes_user_docs
+    async def append_to_user_doc_array(self, user_id: str, collection: str, doc_id: str, field: str, item: Any,
+                                       defaults: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Append `item` to the array at data[field] in one statement, creating the document
+        from `defaults` if it does not exist. Returns the array length after the append.
+        """
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.append(user_id, doc_id, field, item, defaults)
+        now = datetime.utcnow()
+        stmt = pg_insert(UserDocument).values(
+            id=f"{user_id}:{collection}:{doc_id}",
+            user_id=user_id,
+            collection_name=collection,
+            doc_id=doc_id,
+            data={**(defaults or {}), field: [item]},
+            created_at=now,
+            updated_at=now,
+        )
+        # Concurrent appends serialize on the row lock, so none of them are lost
+        appended = func.coalesce(UserDocument.data[field], literal([], JSONB)).op("||", return_type=JSONB)(
+            stmt.excluded.data[field]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDocument.user_id, UserDocument.collection_name, UserDocument.doc_id],
+            set_={
+                "data": _jsonb_merge(UserDocument.data, func.jsonb_build_object(field, appended, type_=JSONB)),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(func.jsonb_array_length(UserDocument.data[field]))
+        async with _session(user_id) as db:
+            length = (await db.execute(stmt)).scalar_one()
+        return length
+
+    @_writes_user_docs
+    async def delete_user_doc(self, user_id: str, collection: str, doc_id: str) -> None:
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.delete(user_id, doc_id)
+        async with _session(user_id) as db:
+            await db.execute(
+                delete(UserDocument).where(
                     UserDocument.user_id == user_id,
                     UserDocument.collection_name == collection,
                     UserDocument.doc_id == doc_id,
                 )
-                .first()
             )
-            if existing:
-                data = dict(existing.data or {})
-                data.update(updates)
-                existing.data = data
-                existing.updated_at = datetime.utcnow()
-                db.commit()
+
+    @_writes_user_docs
+    async def delete_user_docs_range(self, user_id: str, collection: str, start_doc_id: str, end_doc_id: str) -> int:
+        """Delete the documents with start_doc_id <= doc_id <= end_doc_id in one statement; returns the count"""
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.delete_range(user_id, start_doc_id, end_doc_id)
+        stmt = delete(UserDocument).where(
+            UserDocument.user_id == user_id,
+            UserDocument.collection_name == collection,
+            UserDocument.doc_id >= start_doc_id,
+            UserDocument.doc_id <= end_doc_id,
+        )
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
+
+    @staticmethod
+    def _user_docs_query(
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[Iterable[str]],
+        cursor: Optional[str],
+    ):
+        if cursor and not order_by:
+            raise InvalidCursorError("A cursor needs an order_by key")
+        if fields is not None:
+            columns = [UserDocument.doc_id, _jsonb_projection(fields).label("data")]
+        else:
+            columns = [UserDocument.doc_id, UserDocument.data]
+        if order_by:
+            columns.append(_json_text(order_by).label("sort_key"))
+        ascending = order_dir.upper() == "ASC"
+        q = select(*columns).where(
+            UserDocument.user_id == user_id,
+            UserDocument.collection_name == collection,
+            *_json_filters(filters),
+        )
+        if order_by:
+            # Text ordering matches the expression indexes; sort keys are ISO timestamps.
+            # doc_id breaks ties so keyset pages neither skip nor repeat documents.
+            sort_key = _json_text(order_by)
+            if cursor:
+                # PostgreSQL sorts NULLs (documents without the key) last ascending, first descending
+                position, doc_id = _decode_cursor(cursor)
+                q = q.where(_after_cursor(sort_key, UserDocument.doc_id, position, doc_id, ascending, nulls_first=not ascending))
+            if ascending:
+                q = q.order_by(sort_key.asc(), UserDocument.doc_id.asc())
             else:
-                self.set_user_doc(user_id, collection, doc_id, updates)
-        finally:
-            db.close()
+                q = q.order_by(sort_key.desc(), UserDocument.doc_id.desc())
+        else:
+            q = q.order_by(UserDocument.created_at.desc())
+        if limit_count:
+            q = q.limit(limit_count)
+        return q
 
-    def delete_user_doc(self, user_id: str, collection: str, doc_id: str) -> None:
-        db = get_db()
-        try:
-            db.query(UserDocument).filter(
-                UserDocument.user_id == user_id,
-                UserDocument.collection_name == collection,
-                UserDocument.doc_id == doc_id,
-            ).delete()
-            db.commit()
-        finally:
-            db.close()
+    @staticmethod
+    def _row_doc(row) -> Dict[str, Any]:
+        data = dict(row.data or {})
+        data["_id"] = row.doc_id
+        return data
+
+    async def _fetch_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[Iterable[str]],
+        cursor: Optional[str],
+    ) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        """(document, sort key text) pairs for query_user_docs and query_user_docs_page"""
+        _check_query_shape(collection, (filters or {}).keys(), order_by)
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.fetch(user_id, filters, order_by, order_dir, limit_count, fields, cursor)
+        q = self._user_docs_query(user_id, collection, filters, order_by, order_dir, limit_count, fields, cursor)
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        return [(self._row_doc(row), row.sort_key if order_by else None) for row in rows]
 
-    def query_user_docs(
+    async def query_user_docs(
         self,
         user_id: str,
         collection: str,
@@ -274,92 +1835,226 @@ class DatabaseService:
         order_by: Optional[str] = None,
         order_dir: str = "DESC",
         limit_count: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None,
+        cursor: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        db = get_db()
-        try:
-            q = db.query(UserDocument).filter(
+        """
+        Documents of a collection matching `filters`. With `fields`, only those
+        top-level keys are read from the JSONB; keys a document lacks stay absent.
+        `cursor` continues after a position returned by query_user_docs_page.
+        """
+        rows = await self._fetch_user_docs(user_id, collection, filters, order_by, order_dir, limit_count, fields, cursor)
+        return [doc for doc, _ in rows]
+
+    async def query_user_docs_page(
+        self,
+        user_id: str,
+        collection: str,
+        order_by: str,
+        limit_count: int,
+        filters: Optional[Dict[str, Any]] = None,
+        order_dir: str = "DESC",
+        fields: Optional[Iterable[str]] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of query_user_docs plus the cursor for the next page (None on the last page).
+        Pages continue from the last (sort key, doc_id) seen, so each one is an index range scan.
+        """
+        rows = await self._fetch_user_docs(
+            user_id, collection, filters, order_by, order_dir, limit_count + 1, fields, cursor
+        )
+        page = rows[:limit_count]
+        next_cursor = None
+        if len(rows) > limit_count:
+            last_doc, last_sort_key = page[-1]
+            next_cursor = _encode_cursor(last_sort_key, last_doc["_id"])
+        return [doc for doc, _ in page], next_cursor
+
+    async def stream_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        order_dir: str = "DESC",
+        fields: Optional[Iterable[str]] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        The documents query_user_docs would return, read `batch_size` rows at a time from a
+        server-side cursor, so full-history scans hold one batch in memory instead of every row.
+        """
+        _check_query_shape(collection, (filters or {}).keys(), order_by)
+        if collection == TRACKING_COLLECTION:
+            async for doc in self._tracking.stream(user_id, filters, order_by, order_dir, fields, batch_size):
+                yield doc
+            return
+        q = self._user_docs_query(user_id, collection, filters, order_by, order_dir, None, fields, None)
+        async with _read_session(user_id) as db:
+            async for row in _stream_rows(db, q.execution_options(yield_per=batch_size)):
+                yield self._row_doc(row)
+
+    async def add_user_doc(self, user_id: str, collection: str, data: Dict[str, Any]) -> str:
+        doc_id = str(uuid.uuid4())
+        await self.set_user_doc(user_id, collection, doc_id, data)
+        return doc_id
+
+    async def set_user_docs_many(self, docs: Iterable[Tuple[str, str, str, Dict[str, Any]]]) -> int:
+        """
+        Upsert many (user_id, collection, doc_id, data) documents with multi-row
+        INSERT ... ON CONFLICT statements in one transaction. Returns the number written.
+        """
+        now = datetime.utcnow()
+        # One statement cannot touch the same row twice; the last write for a key wins
+        rows = {}
+        tracking = []
+        touched = set()
+        for user_id, collection, doc_id, data in docs:
+            touched.add((user_id, collection))
+            if collection == TRACKING_COLLECTION:
+                tracking.append((user_id, doc_id, data))
+                continue
+            rows[(user_id, collection, doc_id)] = {
+                "id": f"{user_id}:{collection}:{doc_id}",
+                "user_id": user_id,
+                "collection_name": collection,
+                "doc_id": doc_id,
+                "data": data,
+                "created_at": now,
+                "updated_at": now,
+            }
+        values = list(rows.values())
+        written = await self._tracking.set_many(tracking) if tracking else 0
+        if values:
+            async with _session(*{user_id for user_id, _, _ in rows}) as db:
+                for start in range(0, len(values), BULK_WRITE_CHUNK_SIZE):
+                    stmt = pg_insert(UserDocument).values(values[start:start + BULK_WRITE_CHUNK_SIZE])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[UserDocument.user_id, UserDocument.collection_name, UserDocument.doc_id],
+                        set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+                    )
+                    await db.execute(stmt)
+        for user_id, collection in touched:
+            await _user_written(user_id, collection)
+        return written + len(values)
+
+    @_writes_user_docs
+    async def update_user_docs_where(
+        self,
+        user_id: str,
+        collection: str,
+        updates: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None,
+        exclude_doc_ids: Iterable[str] = (),
+    ) -> int:
+        """Merge `updates` into every document matching `filters` with one UPDATE; returns the row count"""
+        _check_query_shape(collection, (filters or {}).keys(), None)
+        exclude_doc_ids = list(exclude_doc_ids)
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.update_where(user_id, updates, filters, exclude_doc_ids)
+        stmt = (
+            update(UserDocument)
+            .where(
                 UserDocument.user_id == user_id,
                 UserDocument.collection_name == collection,
+                *_json_filters(filters),
             )
-            if filters:
-                for key, value in filters.items():
-                    if isinstance(value, bool):
-                        q = q.filter(UserDocument.data[key].astext == str(value).lower())
-                    else:
-                        q = q.filter(UserDocument.data[key].astext == str(value))
-            if order_by:
-                if order_dir.upper() == "ASC":
-                    q = q.order_by(UserDocument.data[order_by].asc())
-                else:
-                    q = q.order_by(UserDocument.data[order_by].desc())
-            else:
-                q = q.order_by(UserDocument.created_at.desc())
-            if limit_count:
-                q = q.limit(limit_count)
-            rows = q.all()
-            results = []
-            for row in rows:
-                data = dict(row.data or {})
-                data["_id"] = row.doc_id
-                results.append(data)
-            return results
-        finally:
-            db.close()
+            .values(data=_jsonb_merge(UserDocument.data, literal(updates, JSONB)), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if exclude_doc_ids:
+            stmt = stmt.where(UserDocument.doc_id.not_in(exclude_doc_ids))
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
 
-    def add_user_doc(self, user_id: str, collection: str, data: Dict[str, Any]) -> str:
-        doc_id = str(uuid.uuid4())
-        self.set_user_doc(user_id, collection, doc_id, data)
-        return doc_id
+    async def aggregate_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        metrics: Dict[str, Tuple[str, ...]],
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict[Any, Any]:
+        """
+        Compute `metrics` (see _aggregate_column) over a collection in the database.
+        Returns {metric: value}, or {data->>group_by: {metric: value}} when grouped.
+        """
+        _check_query_shape(collection, (filters or {}).keys(), None)
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.aggregate(user_id, metrics, filters, group_by)
+        where = [UserDocument.user_id == user_id, UserDocument.collection_name == collection, *_json_filters(filters)]
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(_aggregate_statement(metrics, where, group_by, _DocumentFields))).all()
+        return _aggregate_results(rows, metrics, group_by)
+
+    async def user_doc_streaks(self, user_id: str, collection: str, order_by: str, key: str, threshold: float) -> Dict[str, int]:
+        """
+        Runs of consecutive documents (ordered by data->>order_by) whose numeric data->key
+        exceeds `threshold`: the run ending at the latest document and the longest run.
+        """
+        if collection == TRACKING_COLLECTION:
+            return await self._tracking.streaks(user_id, order_by, key, threshold)
+        passed = func.coalesce(_DocumentFields.number(key), 0) > threshold
+        order = (func.coalesce(_json_text(order_by), ""), UserDocument.doc_id)
+        where = [UserDocument.user_id == user_id, UserDocument.collection_name == collection]
+        async with _read_session(user_id) as db:
+            row = (await db.execute(_streaks_statement(passed, order, where))).one()
+        return {"current": row.current, "longest": row.longest}
 
     # ── Global Collection CRUD ──
 
-    def get_global_doc(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
-        db = get_db()
-        try:
-            row = (
-                db.query(GlobalDocument)
-                .filter(GlobalDocument.collection_name == collection, GlobalDocument.doc_id == doc_id)
-                .first()
-            )
+    @staticmethod
+    def _global_doc_query(collection: str, doc_id: str):
+        return select(GlobalDocument).where(
+            GlobalDocument.collection_name == collection,
+            GlobalDocument.doc_id == doc_id,
+        )
+
+    async def get_global_doc(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        async with _read_session() as db:
+            row = (await db.execute(self._global_doc_query(collection, doc_id))).scalar_one_or_none()
             if not row:
                 return None
             return dict(row.data or {})
-        finally:
-            db.close()
 
-    def set_global_doc(self, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
-        db = get_db()
-        try:
-            row_id = f"{collection}:{doc_id}"
-            existing = (
-                db.query(GlobalDocument)
-                .filter(GlobalDocument.collection_name == collection, GlobalDocument.doc_id == doc_id)
-                .first()
-            )
-            now = datetime.utcnow()
-            if existing:
-                existing.data = data
-                existing.updated_at = now
-            else:
-                row = GlobalDocument(
-                    id=row_id,
-                    collection_name=collection,
-                    doc_id=doc_id,
-                    data=data,
-                    created_at=now,
-                    updated_at=now,
-                )
-                db.add(row)
-            db.commit()
-            return doc_id
-        finally:
-            db.close()
+    async def set_global_doc(self, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
+        now = datetime.utcnow()
+        stmt = pg_insert(GlobalDocument).values(
+            id=f"{collection}:{doc_id}",
+            collection_name=collection,
+            doc_id=doc_id,
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GlobalDocument.collection_name, GlobalDocument.doc_id],
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+        async with _session() as db:
+            await db.execute(stmt)
+        return doc_id
 
-    def add_global_doc(self, collection: str, data: Dict[str, Any]) -> str:
+    async def add_global_doc(self, collection: str, data: Dict[str, Any]) -> str:
         doc_id = str(uuid.uuid4())
-        self.set_global_doc(collection, doc_id, data)
+        await self.set_global_doc(collection, doc_id, data)
         return doc_id
 
 
-# Global singleton
-db_service = DatabaseService()
\ No newline at end of file
+class _SelectedBackend:
+    """Forwards to the DatabaseService that init_database chose from the DATABASE_URL scheme"""
+
+    def __init__(self, backend: DatabaseService):
+        self.backend = backend
+
+    def use(self, backend: DatabaseService) -> None:
+        self.backend = backend
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+
+# Global singleton; PostgreSQL unless DATABASE_URL is sqlite://
+db_service = _SelectedBackend(DatabaseService())
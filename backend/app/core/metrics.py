@@ -0,0 +1,105 @@
+"""
+Prometheus metrics for Blinderfit Backend (connection pools and caches)
+Served on /metrics. With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory so every scrape aggregates all workers instead of the one that answered.
+"""
+
+import os
+import time
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+# Gauges are per worker process; "livesum" adds up the workers that are still running
+POOL_SIZE = Gauge("db_pool_size", "Connections kept open by the pool", ["pool"], multiprocess_mode="livesum")
+POOL_CONNECTIONS = Gauge("db_pool_connections", "Open connections (idle + checked out)", ["pool"],
+                         multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["pool"],
+                         multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Open connections beyond the pool size", ["pool"],
+                      multiprocess_mode="livesum")
+POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connection checkouts", ["pool"])
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time to check out a connection: waiting for a free one, opening a new one and the pre-ping",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_PRE_PING_FAILURES = Counter("db_pool_pre_ping_failures", "Checkouts whose pre-ping found a dead connection", ["pool"])
+
+# result: local_hit (in-process LRU), shared_hit (Redis) or miss
+CACHE_LOOKUPS = Counter("cache_lookups", "Cache lookups by namespace and the tier that answered", ["namespace", "result"])
+CACHE_LOAD_SECONDS = Histogram(
+    "cache_load_seconds", "Time spent in get_or_set loaders after a miss", ["namespace"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+CACHE_BACKEND_ERRORS = Counter("cache_backend_errors", "Failed calls to the shared cache backend", ["operation"])
+
+
+class _MeasuredCheckout:
+    """Pool mixin timing Pool.connect(); the label is the engine's pool_logging_name, which survives dispose()"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.logging_name).observe(time.perf_counter() - start)
+
+
+class MeasuredQueuePool(_MeasuredCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class MeasuredNullPool(_MeasuredCheckout, NullPool):
+    pass
+
+
+def instrument_pool(sync_engine, name: str) -> None:
+    """Keep the pool gauges current and count pre-ping failures for an engine created with pool_logging_name=name"""
+
+    def update_gauges(*_):
+        pool = sync_engine.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            POOL_SIZE.labels(name).set(pool.size())
+            POOL_CONNECTIONS.labels(name).set(pool.checkedin() + pool.checkedout())
+            POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+    def count_checkout(*_):
+        POOL_CHECKOUTS.labels(name).inc()
+        POOL_CHECKED_OUT.labels(name).inc()
+        update_gauges()
+
+    def count_checkin(*_):
+        POOL_CHECKED_OUT.labels(name).dec()
+        update_gauges()
+
+    def count_pre_ping_failure(context):
+        if context.is_pre_ping:
+            POOL_PRE_PING_FAILURES.labels(name).inc()
+
+    event.listen(sync_engine, "checkout", count_checkout)
+    event.listen(sync_engine, "checkin", count_checkin)
+    event.listen(sync_engine, "close", update_gauges)
+    event.listen(sync_engine, "handle_error", count_pre_ping_failure)
+    POOL_CHECKED_OUT.labels(name).set(0)
+    update_gauges()
+
+
+def metrics_response() -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_worker_stopped() -> None:
+    """Drop this worker's live gauges from the multiprocess totals"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
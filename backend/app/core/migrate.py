@@ -0,0 +1,58 @@
+"""
+One-shot data migrations for Blinderfit Backend
+Moves existing rows into the layout the current schema expects. Startup only creates the
+schema, so run this once after deploying a version that needs it:
+
+    python -m app.core.migrate
+
+It moves the rows of a pre-partitioning user_documents table into the partitions and
+date-keyed tracking documents into daily_tracking, in batches that each commit on their own;
+running it again continues where an interrupted run stopped.
+"""
+
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.database import (
+    _create_engine, _lock_schema, _move_unpartitioned_user_documents, _retire_unpartitioned_user_documents,
+    create_schema, migrate_tracking_documents,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 5000
+
+
+async def migrate(batch_size: int = MIGRATION_BATCH_SIZE) -> None:
+    engine = _create_engine(settings.DATABASE_URL, "migrate")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(_lock_schema)
+            await conn.run_sync(_retire_unpartitioned_user_documents)
+            await conn.run_sync(create_schema)
+
+        total = 0
+        while True:
+            async with engine.begin() as conn:
+                moved = await conn.run_sync(_move_unpartitioned_user_documents, batch_size)
+            if not moved:
+                break
+            total += moved
+            logger.info(f"Moved {total} documents into partitioned user_documents so far")
+
+        total, after = 0, ("", "")
+        while after is not None:
+            async with engine.begin() as conn:
+                moved, after = await conn.run_sync(migrate_tracking_documents, batch_size, after)
+            total += moved
+            if moved:
+                logger.info(f"Moved {total} tracking documents into daily_tracking so far")
+        logger.info("Migration complete")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(migrate())
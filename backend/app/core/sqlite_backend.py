@@ -0,0 +1,620 @@
+"""
+Embedded SQLite storage backend for local development, load tests and benchmarks
+Selected by a sqlite:// DATABASE_URL; documents are JSON text queried with SQLite's JSON1 functions
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    case, cast, delete, event, func, literal, literal_column, select, update,
+    Column, String, Text, DateTime, Index, JSON,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import (
+    BULK_WRITE_CHUNK_SIZE, COLLECTION_INDEXES, STREAM_BATCH_SIZE, TRACKING_COLLECTION, USER_PROFILE_COLUMNS,
+    DatabaseService, InvalidCursorError, _after_cursor, _aggregate_results, _check_query_shape, _decode_cursor,
+    _read_session, _session, _stream_rows, _streaks_statement, _user_written, _writes_user_docs, _writes_user_row,
+)
+
+logger = logging.getLogger(__name__)
+
+SQLiteBase = declarative_base()
+
+
+# ──────────────────────────────────────────────
+# Tables (the PostgreSQL schema with JSON in place of JSONB)
+# ──────────────────────────────────────────────
+
+class SQLiteUserRow(SQLiteBase):
+    __tablename__ = "users"
+    id = Column(String, primary_key=True)
+    email = Column(String, nullable=True)
+    display_name = Column(String, nullable=True)
+    photo_url = Column(String, nullable=True)
+    phone_number = Column(String, nullable=True)
+    data = Column(JSON, default={})
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SQLiteUserDocument(SQLiteBase):
+    """Every collection, tracking included: daily_tracking is a PostgreSQL-only layout"""
+    __tablename__ = "user_documents"
+    id = Column(String, nullable=False)
+    user_id = Column(String, primary_key=True)
+    collection_name = Column(String, primary_key=True)
+    doc_id = Column(String, primary_key=True)
+    data = Column(JSON, default={})
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SQLiteGlobalDocument(SQLiteBase):
+    __tablename__ = "global_documents"
+    id = Column(String, nullable=False)
+    collection_name = Column(String, primary_key=True)
+    doc_id = Column(String, primary_key=True)
+    data = Column(JSON, default={})
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+_DOC_KEY = [SQLiteUserDocument.user_id, SQLiteUserDocument.collection_name, SQLiteUserDocument.doc_id]
+
+
+# ──────────────────────────────────────────────
+# JSON1 expressions
+# ──────────────────────────────────────────────
+
+def _path(key: str):
+    """JSON path of a top-level key, inline so queries match the expression indexes"""
+    quoted = '$."{}"'.format(key.replace('"', '\\"'))
+    return literal_column("'{}'".format(quoted.replace("'", "''")))
+
+
+def _const(value: str):
+    return literal_column(f"'{value}'")
+
+
+def _json_value(document, key: str):
+    """The JSON1 equivalent of data->>'key': SQL text, with JSON booleans as 'true'/'false'"""
+    kind = func.json_type(document, _path(key))
+    return case(
+        (kind == _const("true"), _const("true")),
+        (kind == _const("false"), _const("false")),
+        else_=cast(func.json_extract(document, _path(key)), Text),
+    )
+
+
+def _json_text(key: str):
+    return _json_value(SQLiteUserDocument.data, key)
+
+
+def _json_number(document, key: str):
+    """A JSON value as a number, or NULL when it is not a JSON number"""
+    kind = func.json_type(document, _path(key))
+    return case((kind.in_([_const("integer"), _const("real")]), func.json_extract(document, _path(key))))
+
+
+def _json_filters(filters: Optional[Dict[str, Any]]) -> List[Any]:
+    """Equality predicates with the text semantics of the PostgreSQL backend"""
+    clauses = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            clauses.append(_SQLiteFields.is_null(key))
+        elif isinstance(value, bool):
+            clauses.append(_json_text(key) == str(value).lower())
+        else:
+            clauses.append(_json_text(key) == str(value))
+    return clauses
+
+
+def _json_merge(stored, patch: Dict[str, Any]):
+    """Top-level merge like JSONB `||`: json_set replaces each patched key whole, where json_patch would recurse"""
+    merged = func.coalesce(stored, _const("{}"))
+    if not patch:
+        return merged
+    arguments = []
+    for key, value in patch.items():
+        arguments += [_path(key), func.json(literal(json.dumps(value), Text))]
+    return func.json_set(merged, *arguments)
+
+
+class _SQLiteFields:
+    """Document keys as SQL expressions over user_documents.data (see _DocumentFields)"""
+
+    @staticmethod
+    def text(key: str):
+        return _json_text(key)
+
+    @staticmethod
+    def number(key: str):
+        return _json_number(SQLiteUserDocument.data, key)
+
+    @staticmethod
+    def is_null(key: str):
+        return func.json_extract(SQLiteUserDocument.data, _path(key)).is_(None)
+
+
+def _aggregate_column(name: str, spec: Tuple[str, ...]):
+    """JSON1 version of database._aggregate_column; same metric specs"""
+    data = SQLiteUserDocument.data
+    op, args = spec[0], spec[1:]
+    if op == "count":
+        aggregate = func.count()
+    elif op == "count_null":
+        aggregate = func.count().filter(_SQLiteFields.is_null(args[0]))
+    elif op == "sum":
+        aggregate = func.coalesce(func.sum(_SQLiteFields.number(args[0])), 0)
+    elif op == "sum_len":
+        is_array = func.json_type(data, _path(args[0])) == _const("array")
+        aggregate = func.coalesce(func.sum(case((is_array, func.json_array_length(data, _path(args[0]))))), 0)
+    elif op == "sum_items":
+        items = func.json_each(data, _path(args[0])).table_valued("value", "type").alias("item")
+        per_doc = (
+            select(func.sum(_json_number(items.c.value, args[1])))
+            .select_from(items)
+            .where(func.json_type(data, _path(args[0])) == _const("array"), items.c.type == _const("object"))
+            .scalar_subquery()
+        )
+        aggregate = func.coalesce(func.sum(per_doc), 0)
+    else:
+        raise ValueError(f"Unknown aggregate {op!r} for metric {name!r}")
+    return aggregate.label(name)
+
+
+# Tracking documents stay in user_documents here, so its date ordering needs an index of its own
+SQLITE_COLLECTION_INDEXES: Dict[str, List[Tuple[str, ...]]] = {**COLLECTION_INDEXES, TRACKING_COLLECTION: [("date",)]}
+
+
+def _register_json_indexes() -> None:
+    seen = set()
+    for key_tuples in SQLITE_COLLECTION_INDEXES.values():
+        for keys in key_tuples:
+            if keys in seen:
+                continue
+            seen.add(keys)
+            Index(
+                f"ix_user_documents_data_{'_'.join(keys)}",
+                SQLiteUserDocument.user_id,
+                SQLiteUserDocument.collection_name,
+                *(_json_text(key) for key in keys),
+                SQLiteUserDocument.doc_id,
+            )
+
+
+_register_json_indexes()
+
+
+# ──────────────────────────────────────────────
+# Engine
+# ──────────────────────────────────────────────
+
+def _configure_connection(dbapi_connection, connection_record) -> None:
+    # WAL lets benchmark readers run alongside the writer; busy_timeout queues competing writers
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def create_sqlite_engine(database_url: str):
+    """An aiosqlite engine for a sqlite:// URL; :memory: databases share one connection"""
+    url = make_url(database_url).set(drivername="sqlite+aiosqlite")
+    if url.database in (None, "", ":memory:"):
+        engine = create_async_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_async_engine(url)
+    event.listen(engine.sync_engine, "connect", _configure_connection)
+    return engine
+
+
+async def init_sqlite_database(database_url: str):
+    """Create the engine and any missing tables and indexes"""
+    engine = create_sqlite_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLiteBase.metadata.create_all)
+    logger.info(f"SQLite database {make_url(database_url).database or ':memory:'} initialized")
+    return engine
+
+
+# ──────────────────────────────────────────────
+# Service
+# ──────────────────────────────────────────────
+
+def _doc(row) -> Dict[str, Any]:
+    result = dict(row.data or {})
+    result["_id"] = row.doc_id
+    return result
+
+
+class SQLiteDatabaseService(DatabaseService):
+    """DatabaseService on SQLite: same methods, filters, ordering and limits, without partitions or replicas"""
+
+    # ── User CRUD ──
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        async with _read_session(user_id) as db:
+            row = (await db.execute(select(SQLiteUserRow).where(SQLiteUserRow.id == user_id))).scalar_one_or_none()
+            if not row:
+                return None
+            result = dict(row.data or {})
+            result.update({
+                "uid": row.id,
+                "email": row.email,
+                "display_name": row.display_name,
+                "photo_url": row.photo_url,
+                "phone_number": row.phone_number,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            })
+            return result
+
+    @staticmethod
+    def _user_insert(user_id: str, data: Dict[str, Any], now: datetime):
+        return sqlite_insert(SQLiteUserRow).values(
+            id=user_id,
+            email=data.get("email"),
+            display_name=data.get("display_name"),
+            photo_url=data.get("photo_url"),
+            phone_number=data.get("phone_number"),
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+
+    @_writes_user_row
+    async def set_user(self, user_id: str, data: Dict[str, Any]) -> None:
+        stmt = self._user_insert(user_id, data, datetime.utcnow())
+        updates = {"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at}
+        for column in USER_PROFILE_COLUMNS:
+            if column in data:
+                updates[column] = stmt.excluded[column]
+        stmt = stmt.on_conflict_do_update(index_elements=[SQLiteUserRow.id], set_=updates)
+        async with _session(user_id) as db:
+            await db.execute(stmt)
+
+    @_writes_user_row
+    async def update_user(self, user_id: str, updates: Dict[str, Any]) -> bool:
+        now = datetime.utcnow()
+        stmt = self._user_insert(user_id, updates, now)
+        merged = {"data": _json_merge(SQLiteUserRow.data, updates), "updated_at": stmt.excluded.updated_at}
+        for column in USER_PROFILE_COLUMNS:
+            if column in updates:
+                merged[column] = stmt.excluded[column]
+        stmt = stmt.on_conflict_do_update(index_elements=[SQLiteUserRow.id], set_=merged).returning(
+            SQLiteUserRow.created_at.is_distinct_from(now)
+        )
+        async with _session(user_id) as db:
+            existed = (await db.execute(stmt)).scalar_one()
+        return bool(existed)
+
+    @_writes_user_row
+    async def delete_user(self, user_id: str) -> None:
+        async with _session(user_id) as db:
+            await db.execute(delete(SQLiteUserDocument).where(SQLiteUserDocument.user_id == user_id))
+            await db.execute(delete(SQLiteUserRow).where(SQLiteUserRow.id == user_id))
+
+    # ── User Subcollection CRUD ──
+
+    @staticmethod
+    def _where(user_id: str, collection: str, *clauses) -> List[Any]:
+        return [SQLiteUserDocument.user_id == user_id, SQLiteUserDocument.collection_name == collection, *clauses]
+
+    @staticmethod
+    def _doc_insert(user_id: str, collection: str, doc_id: str, data: Dict[str, Any], now: datetime):
+        return sqlite_insert(SQLiteUserDocument).values(
+            id=f"{user_id}:{collection}:{doc_id}",
+            user_id=user_id,
+            collection_name=collection,
+            doc_id=doc_id,
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+
+    async def get_user_doc(self, user_id: str, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        q = select(SQLiteUserDocument).where(*self._where(user_id, collection, SQLiteUserDocument.doc_id == doc_id))
+        async with _read_session(user_id) as db:
+            row = (await db.execute(q)).scalar_one_or_none()
+            return _doc(row) if row else None
+
+    async def get_user_docs(self, user_id: str, collection: str, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        q = select(SQLiteUserDocument).where(*self._where(user_id, collection, SQLiteUserDocument.doc_id.in_(doc_ids)))
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).scalars().all()
+            return {row.doc_id: _doc(row) for row in rows}
+
+    async def get_user_docs_range(
+        self,
+        user_id: str,
+        collection: str,
+        start_doc_id: str,
+        end_doc_id: str,
+        order_dir: str = "ASC",
+    ) -> List[Dict[str, Any]]:
+        q = select(SQLiteUserDocument).where(
+            *self._where(user_id, collection, SQLiteUserDocument.doc_id.between(start_doc_id, end_doc_id))
+        )
+        if order_dir.upper() == "ASC":
+            q = q.order_by(SQLiteUserDocument.doc_id.asc())
+        else:
+            q = q.order_by(SQLiteUserDocument.doc_id.desc())
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).scalars().all()
+            return [_doc(row) for row in rows]
+
+    @_writes_user_docs
+    async def set_user_doc(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
+        stmt = self._doc_insert(user_id, collection, doc_id, data, datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_DOC_KEY,
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+        async with _session(user_id) as db:
+            await db.execute(stmt)
+        return doc_id
+
+    @_writes_user_docs
+    async def create_user_doc(self, user_id: str, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        stmt = self._doc_insert(user_id, collection, doc_id, data, datetime.utcnow())
+        stmt = stmt.on_conflict_do_nothing(index_elements=_DOC_KEY).returning(literal(True))
+        async with _session(user_id) as db:
+            inserted = (await db.execute(stmt)).scalar_one_or_none()
+        return bool(inserted)
+
+    @_writes_user_docs
+    async def update_user_doc(self, user_id: str, collection: str, doc_id: str, updates: Dict[str, Any],
+                              upsert: bool = True) -> bool:
+        now = datetime.utcnow()
+        if upsert:
+            stmt = self._doc_insert(user_id, collection, doc_id, updates, now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=_DOC_KEY,
+                set_={"data": _json_merge(SQLiteUserDocument.data, updates), "updated_at": stmt.excluded.updated_at},
+            ).returning(SQLiteUserDocument.created_at.is_distinct_from(now))
+        else:
+            stmt = (
+                update(SQLiteUserDocument)
+                .where(*self._where(user_id, collection, SQLiteUserDocument.doc_id == doc_id))
+                .values(data=_json_merge(SQLiteUserDocument.data, updates), updated_at=now)
+                .returning(literal(True))
+                .execution_options(synchronize_session=False)
+            )
+        async with _session(user_id) as db:
+            matched = (await db.execute(stmt)).scalar_one_or_none()
+        return bool(matched)
+
+    @_writes_user_docs
+    async def append_to_user_doc_array(self, user_id: str, collection: str, doc_id: str, field: str, item: Any,
+                                       defaults: Optional[Dict[str, Any]] = None) -> int:
+        now = datetime.utcnow()
+        data = SQLiteUserDocument.data
+        stmt = self._doc_insert(user_id, collection, doc_id, {**(defaults or {}), field: [item]}, now)
+        # SQLite runs one writer at a time, so concurrent appends cannot overwrite each other
+        array = case(
+            (func.json_type(data, _path(field)) == _const("array"), func.json_extract(data, _path(field))),
+            else_=_const("[]"),
+        )
+        appended = func.json_insert(array, _const("$[#]"), func.json(literal(json.dumps(item), Text)))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=_DOC_KEY,
+            set_={
+                "data": func.json_set(func.coalesce(data, _const("{}")), _path(field), appended),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(func.json_array_length(data, _path(field)))
+        async with _session(user_id) as db:
+            length = (await db.execute(stmt)).scalar_one()
+        return length
+
+    @_writes_user_docs
+    async def delete_user_doc(self, user_id: str, collection: str, doc_id: str) -> None:
+        async with _session(user_id) as db:
+            await db.execute(
+                delete(SQLiteUserDocument).where(*self._where(user_id, collection, SQLiteUserDocument.doc_id == doc_id))
+            )
+
+    @_writes_user_docs
+    async def delete_user_docs_range(self, user_id: str, collection: str, start_doc_id: str, end_doc_id: str) -> int:
+        stmt = delete(SQLiteUserDocument).where(
+            *self._where(user_id, collection, SQLiteUserDocument.doc_id.between(start_doc_id, end_doc_id))
+        )
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
+
+    @classmethod
+    def _user_docs_query(
+        cls,
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[Iterable[str]],
+        cursor: Optional[str],
+    ):
+        if cursor and not order_by:
+            raise InvalidCursorError("A cursor needs an order_by key")
+        columns = [SQLiteUserDocument.doc_id, SQLiteUserDocument.data]
+        if order_by:
+            columns.append(_json_text(order_by).label("sort_key"))
+        ascending = order_dir.upper() == "ASC"
+        q = select(*columns).where(*cls._where(user_id, collection, *_json_filters(filters)))
+        if order_by:
+            sort_key = _json_text(order_by)
+            if cursor:
+                # SQLite sorts NULLs first ascending, last descending
+                position, doc_id = _decode_cursor(cursor)
+                q = q.where(_after_cursor(sort_key, SQLiteUserDocument.doc_id, position, doc_id, ascending, nulls_first=ascending))
+            if ascending:
+                q = q.order_by(sort_key.asc(), SQLiteUserDocument.doc_id.asc())
+            else:
+                q = q.order_by(sort_key.desc(), SQLiteUserDocument.doc_id.desc())
+        else:
+            q = q.order_by(SQLiteUserDocument.created_at.desc())
+        if limit_count:
+            q = q.limit(limit_count)
+        return q
+
+    @staticmethod
+    def _projected_doc(row, fields: Optional[List[str]]) -> Dict[str, Any]:
+        data = row.data or {}
+        if fields is not None:
+            data = {key: data[key] for key in fields if key in data}
+        data = dict(data)
+        data["_id"] = row.doc_id
+        return data
+
+    async def _fetch_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]],
+        order_by: Optional[str],
+        order_dir: str,
+        limit_count: Optional[int],
+        fields: Optional[Iterable[str]],
+        cursor: Optional[str],
+    ) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        _check_query_shape(collection, (filters or {}).keys(), order_by)
+        q = self._user_docs_query(user_id, collection, filters, order_by, order_dir, limit_count, None, cursor)
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        fields = list(fields) if fields is not None else None
+        return [(self._projected_doc(row, fields), row.sort_key if order_by else None) for row in rows]
+
+    async def stream_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        order_dir: str = "DESC",
+        fields: Optional[Iterable[str]] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        _check_query_shape(collection, (filters or {}).keys(), order_by)
+        q = self._user_docs_query(user_id, collection, filters, order_by, order_dir, None, None, None)
+        fields = list(fields) if fields is not None else None
+        async with _read_session(user_id) as db:
+            async for row in _stream_rows(db, q.execution_options(yield_per=batch_size)):
+                yield self._projected_doc(row, fields)
+
+    async def set_user_docs_many(self, docs: Iterable[Tuple[str, str, str, Dict[str, Any]]]) -> int:
+        now = datetime.utcnow()
+        rows = {}
+        for user_id, collection, doc_id, data in docs:
+            rows[(user_id, collection, doc_id)] = {
+                "id": f"{user_id}:{collection}:{doc_id}",
+                "user_id": user_id,
+                "collection_name": collection,
+                "doc_id": doc_id,
+                "data": data,
+                "created_at": now,
+                "updated_at": now,
+            }
+        values = list(rows.values())
+        if not values:
+            return 0
+        async with _session(*{user_id for user_id, _, _ in rows}) as db:
+            for start in range(0, len(values), BULK_WRITE_CHUNK_SIZE):
+                stmt = sqlite_insert(SQLiteUserDocument).values(values[start:start + BULK_WRITE_CHUNK_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=_DOC_KEY,
+                    set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+                )
+                await db.execute(stmt)
+        for user_id, collection in {(user_id, collection) for user_id, collection, _ in rows}:
+            await _user_written(user_id, collection)
+        return len(values)
+
+    @_writes_user_docs
+    async def update_user_docs_where(
+        self,
+        user_id: str,
+        collection: str,
+        updates: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None,
+        exclude_doc_ids: Iterable[str] = (),
+    ) -> int:
+        _check_query_shape(collection, (filters or {}).keys(), None)
+        exclude_doc_ids = list(exclude_doc_ids)
+        stmt = (
+            update(SQLiteUserDocument)
+            .where(*self._where(user_id, collection, *_json_filters(filters)))
+            .values(data=_json_merge(SQLiteUserDocument.data, updates), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if exclude_doc_ids:
+            stmt = stmt.where(SQLiteUserDocument.doc_id.not_in(exclude_doc_ids))
+        async with _session(user_id) as db:
+            result = await db.execute(stmt)
+        return result.rowcount
+
+    async def aggregate_user_docs(
+        self,
+        user_id: str,
+        collection: str,
+        metrics: Dict[str, Tuple[str, ...]],
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict[Any, Any]:
+        _check_query_shape(collection, (filters or {}).keys(), None)
+        columns = [_aggregate_column(name, spec) for name, spec in metrics.items()]
+        q = select(*columns).where(*self._where(user_id, collection, *_json_filters(filters)))
+        if group_by:
+            q = q.add_columns(_json_text(group_by).label("group_key")).group_by(_json_text(group_by))
+        async with _read_session(user_id) as db:
+            rows = (await db.execute(q)).all()
+        return _aggregate_results(rows, metrics, group_by)
+
+    async def user_doc_streaks(self, user_id: str, collection: str, order_by: str, key: str, threshold: float) -> Dict[str, int]:
+        passed = func.coalesce(_SQLiteFields.number(key), 0) > threshold
+        order = (func.coalesce(_json_text(order_by), ""), SQLiteUserDocument.doc_id)
+        async with _read_session(user_id) as db:
+            row = (await db.execute(_streaks_statement(passed, order, self._where(user_id, collection)))).one()
+        return {"current": row.current, "longest": row.longest}
+
+    # ── Global Collection CRUD ──
+
+    async def get_global_doc(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        q = select(SQLiteGlobalDocument).where(
+            SQLiteGlobalDocument.collection_name == collection,
+            SQLiteGlobalDocument.doc_id == doc_id,
+        )
+        async with _read_session() as db:
+            row = (await db.execute(q)).scalar_one_or_none()
+            return dict(row.data or {}) if row else None
+
+    async def set_global_doc(self, collection: str, doc_id: str, data: Dict[str, Any]) -> str:
+        now = datetime.utcnow()
+        stmt = sqlite_insert(SQLiteGlobalDocument).values(
+            id=f"{collection}:{doc_id}",
+            collection_name=collection,
+            doc_id=doc_id,
+            data=data,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SQLiteGlobalDocument.collection_name, SQLiteGlobalDocument.doc_id],
+            set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+        )
+        async with _session() as db:
+            await db.execute(stmt)
+        return doc_id
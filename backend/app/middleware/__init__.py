@@ -12,6 +12,7 @@ from .security_middleware import (
     RequestLoggingMiddleware,
     IPFilterMiddleware
 )
+from .query_stats_middleware import QueryStatsMiddleware, track_queries
 
 __all__ = [
     "auth_middleware",
@@ -25,5 +26,7 @@ __all__ = [
     "ip_filter_middleware",
     "SecurityHeadersMiddleware",
     "RequestLoggingMiddleware",
-    "IPFilterMiddleware"
+    "IPFilterMiddleware",
+    "QueryStatsMiddleware",
+    "track_queries"
 ]
\ No newline at end of file
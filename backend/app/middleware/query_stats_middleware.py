@@ -0,0 +1,93 @@
+"""
+Per-request SQL statement counting for Blinderfit Backend
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+import logging
+import time
+from typing import Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements executed and time spent in the database during one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement] += 1
+
+    def most_repeated(self) -> Tuple[Optional[str], int]:
+        """The statement text executed most often and its count (N+1 loops repeat one shape)"""
+        if not self.shapes:
+            return None, 0
+        return self.shapes.most_common(1)[0]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the statements executed by the current task (and tasks it starts) inside the block"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+# Listening on Engine covers the primary, read replicas and any engine created later.
+# SQLAlchemy runs async drivers' cursor calls in a greenlet that shares the caller's context.
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info["query_start_time"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    start_time = conn.info.pop("query_start_time", None)
+    if stats is not None and start_time is not None:
+        stats.record(statement, time.perf_counter() - start_time)
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Report each request's statement count and database time in a Server-Timing header,
+    and log requests over QUERY_BUDGET_PER_REQUEST or repeating one statement
+    QUERY_REPEAT_THRESHOLD times or more (a likely N+1 loop)
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        with track_queries() as stats:
+            response = await call_next(request)
+
+        response.headers["Server-Timing"] = f'db;desc="{stats.count} queries";dur={stats.duration * 1000:.1f}'
+        endpoint = f"{request.method} {request.url.path}"
+        if stats.count > settings.QUERY_BUDGET_PER_REQUEST:
+            logger.warning(
+                f"{endpoint} ran {stats.count} SQL statements "
+                f"({stats.duration * 1000:.1f}ms), over the budget of {settings.QUERY_BUDGET_PER_REQUEST}"
+            )
+        statement, repeats = stats.most_repeated()
+        if repeats >= settings.QUERY_REPEAT_THRESHOLD:
+            response.headers["X-DB-Repeated-Statements"] = str(repeats)
+            logger.warning(f"Possible N+1 in {endpoint}: same statement ran {repeats} times: {statement[:200]}")
+        return response
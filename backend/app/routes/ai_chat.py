@@ -10,7 +10,7 @@ from typing import List, Dict, Any, Optional
 import json
 import uuid
 
-from app.core.database import db_service
+from app.core.database import db_service, InvalidCursorError
 from app.models import (
     ChatRequest,
     ChatMessage,
@@ -19,6 +19,8 @@ from app.models import (
 )
 from app.routes.auth import get_current_user
 from app.services.gemini_service import gemini_service
+from app.services.chat_context_service import chat_context_service, user_context_cache
+from app.services.plan_service import plan_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -55,10 +57,11 @@ async def chat_with_fitmentor(
             "user_id": user_id,
             "session_id": session_id,
             "messages": [user_message.dict(), ai_message.dict()],
-            "context": user_context,
+            # A reference to the deduplicated snapshot instead of the context itself
+            **await chat_context_service.save(user_id, user_context),
             "created_at": datetime.utcnow().isoformat(),
         }
-        db_service.set_user_doc(user_id, "chats", session_id, chat_data)
+        await db_service.set_user_doc(user_id, "chats", session_id, chat_data)
 
         return APIResponse(
             success=True,
@@ -130,10 +133,13 @@ async def upload_chat_attachment(
         raise HTTPException(status_code=500, detail="Attachment upload failed")
 
 @router.get("/history", response_model=APIResponse)
-async def get_chat_history(limit: int = 10, user_id: str = Depends(get_current_user)):
+async def get_chat_history(limit: int = 10, cursor: Optional[str] = None, user_id: str = Depends(get_current_user)):
     """Get user's chat history"""
     try:
-        chats = db_service.query_user_docs(user_id, "chats", order_by="created_at", order_dir="DESC", limit_count=limit)
+        chats, next_cursor = await db_service.query_user_docs_page(
+            user_id, "chats", order_by="created_at", order_dir="DESC", limit_count=limit, cursor=cursor,
+            fields=["session_id", "messages", "created_at", "summary"]
+        )
         chat_history = [{
             "session_id": c.get("session_id", c.get("_id")),
             "messages": c.get("messages", []),
@@ -141,7 +147,9 @@ async def get_chat_history(limit: int = 10, user_id: str = Depends(get_current_u
             "summary": c.get("summary")
         } for c in chats]
 
-        return APIResponse(success=True, message="Chat history retrieved", data={"chats": chat_history, "total": len(chat_history)})
+        return APIResponse(success=True, message="Chat history retrieved", data={"chats": chat_history, "total": len(chat_history), "next_cursor": next_cursor})
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting chat history: {e}")
         raise HTTPException(status_code=500, detail="Failed to get chat history")
@@ -150,9 +158,10 @@ async def get_chat_history(limit: int = 10, user_id: str = Depends(get_current_u
 async def get_chat_session(session_id: str, user_id: str = Depends(get_current_user)):
     """Get specific chat session"""
     try:
-        chat_data = db_service.get_user_doc(user_id, "chats", session_id)
+        chat_data = await db_service.get_user_doc(user_id, "chats", session_id)
         if not chat_data:
             raise HTTPException(status_code=404, detail="Chat session not found")
+        chat_data["context"] = await chat_context_service.load(user_id, chat_data)
         return APIResponse(success=True, message="Chat session retrieved", data=chat_data)
     except HTTPException:
         raise
@@ -164,20 +173,23 @@ async def get_chat_session(session_id: str, user_id: str = Depends(get_current_u
 async def delete_chat_session(session_id: str, user_id: str = Depends(get_current_user)):
     """Delete a chat session"""
     try:
-        db_service.delete_user_doc(user_id, "chats", session_id)
+        await db_service.delete_user_doc(user_id, "chats", session_id)
         return APIResponse(success=True, message="Chat session deleted")
     except Exception as e:
         logger.error(f"Error deleting chat session: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete chat session")
 
 async def get_user_context(user_id: str) -> Dict[str, Any]:
-    """Get user's context for personalized AI responses"""
+    """Get user's context for personalized AI responses, cached until its sources change"""
+    return await user_context_cache.get_or_build(user_id, lambda: load_user_context(user_id))
+
+async def load_user_context(user_id: str) -> Dict[str, Any]:
+    """Read the user's context from the database"""
     try:
-        user_data = db_service.get_user(user_id) or {}
-        tracking_data = db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=7)
-        plans = db_service.query_user_docs(user_id, "plans", filters={"is_active": True}, limit_count=1)
-        plan_data = plans[0] if plans else None
-        insights_data = db_service.query_user_docs(user_id, "ml_insights", order_by="generated_at", order_dir="DESC", limit_count=5)
+        user_data = await db_service.get_user(user_id) or {}
+        tracking_data = await db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=7)
+        plan_data = await plan_service.get_active_plan(user_id)
+        insights_data = await db_service.query_user_docs(user_id, "ml_insights", order_by="generated_at", order_dir="DESC", limit_count=5)
 
         return {
             "user_profile": user_data,
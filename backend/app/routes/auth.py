@@ -9,8 +9,10 @@ from datetime import datetime
 import jwt
 import httpx
 import logging
-from typing import Optional, Dict, Any
+import time
+from typing import Dict, Any
 
+from app.core.cache import Cache
 from app.core.config import settings
 from app.core.database import db_service
 from app.models import (
@@ -22,19 +24,17 @@ router = APIRouter()
 security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
-# Cache for JWKS keys
-_jwks_cache: Dict[str, Any] = {}
-_jwks_cache_time: Optional[datetime] = None
+# JWKS keys, shared by all workers: refreshed after an hour, but a stale copy
+# is kept for a day to fall back on while Clerk is unreachable
+JWKS_REFRESH_SECONDS = 3600
+_jwks_cache = Cache("clerk_jwks", ttl=24 * 3600)
 
 
-async def _get_clerk_jwks() -> Dict[str, Any]:
+async def _get_clerk_jwks(force_refresh: bool = False) -> Dict[str, Any]:
     """Fetch Clerk's JWKS for token verification"""
-    global _jwks_cache, _jwks_cache_time
-    from datetime import timedelta
-
-    # Cache JWKS for 1 hour
-    if _jwks_cache and _jwks_cache_time and (datetime.utcnow() - _jwks_cache_time) < timedelta(hours=1):
-        return _jwks_cache
+    cached = await _jwks_cache.get("jwks")
+    if cached and not force_refresh and time.time() - cached["fetched_at"] < JWKS_REFRESH_SECONDS:
+        return cached["jwks"]
 
     try:
         async with httpx.AsyncClient() as client:
@@ -43,13 +43,13 @@ async def _get_clerk_jwks() -> Dict[str, Any]:
                 headers={"Authorization": f"Bearer {settings.CLERK_SECRET_KEY}"},
             )
             resp.raise_for_status()
-            _jwks_cache = resp.json()
-            _jwks_cache_time = datetime.utcnow()
-            return _jwks_cache
+            jwks = resp.json()
+            await _jwks_cache.set("jwks", {"jwks": jwks, "fetched_at": time.time()})
+            return jwks
     except Exception as e:
         logger.error(f"Failed to fetch Clerk JWKS: {e}")
-        if _jwks_cache:
-            return _jwks_cache
+        if cached:
+            return cached["jwks"]
         raise HTTPException(status_code=500, detail="Authentication service unavailable")
 
 
@@ -80,10 +80,8 @@ async def verify_clerk_token(token: str) -> str:
             jwks = await _get_clerk_jwks()
             public_key = _get_public_key_from_jwks(jwks, kid)
             if not public_key:
-                # Force refresh JWKS
-                global _jwks_cache_time
-                _jwks_cache_time = None
-                jwks = await _get_clerk_jwks()
+                # Keys may have rotated since the cached copy was fetched
+                jwks = await _get_clerk_jwks(force_refresh=True)
                 public_key = _get_public_key_from_jwks(jwks, kid)
                 if not public_key:
                     raise HTTPException(status_code=401, detail="Unknown signing key")
@@ -138,7 +136,7 @@ async def register_user(request: Request):
             "email_verified": True,
             "created_at": datetime.utcnow().isoformat(),
         }
-        db_service.set_user(user_id, user_data)
+        await db_service.set_user(user_id, user_data)
 
         return APIResponse(
             success=True,
@@ -156,10 +154,10 @@ async def register_user(request: Request):
 async def verify_user_token(user_id: str = Depends(get_current_user)):
     """Verify if the provided token is valid"""
     try:
-        user_data = db_service.get_user(user_id)
+        user_data = await db_service.get_user(user_id)
         if not user_data:
             # Auto-create user profile on first verify
-            db_service.set_user(user_id, {"uid": user_id, "created_at": datetime.utcnow().isoformat()})
+            await db_service.set_user(user_id, {"uid": user_id, "created_at": datetime.utcnow().isoformat()})
             user_data = {"uid": user_id}
 
         return APIResponse(
@@ -180,7 +178,7 @@ async def verify_user_token(user_id: str = Depends(get_current_user)):
 async def delete_user_account(user_id: str = Depends(get_current_user)):
     """Delete user account and all associated data"""
     try:
-        db_service.delete_user(user_id)
+        await db_service.delete_user(user_id)
         return APIResponse(success=True, message="Account deleted successfully")
     except Exception as e:
         logger.error(f"Account deletion error: {e}")
@@ -191,11 +189,11 @@ async def delete_user_account(user_id: str = Depends(get_current_user)):
 async def get_user_profile(user_id: str = Depends(get_current_user)):
     """Get current user profile"""
     try:
-        user_data = db_service.get_user(user_id)
+        user_data = await db_service.get_user(user_id)
         if not user_data:
             # Auto-create minimal profile
-            db_service.set_user(user_id, {"uid": user_id, "created_at": datetime.utcnow().isoformat()})
-            user_data = db_service.get_user(user_id)
+            await db_service.set_user(user_id, {"uid": user_id, "created_at": datetime.utcnow().isoformat()})
+            user_data = await db_service.get_user(user_id)
 
         return APIResponse(success=True, message="Profile retrieved", data=user_data)
     except Exception as e:
@@ -213,7 +211,7 @@ async def update_user_profile(updates: dict, user_id: str = Depends(get_current_
             raise HTTPException(status_code=400, detail="No valid fields to update")
 
         filtered["updated_at"] = datetime.utcnow().isoformat()
-        db_service.update_user(user_id, filtered)
+        await db_service.update_user(user_id, filtered)
         return APIResponse(success=True, message="Profile updated successfully")
     except HTTPException:
         raise
@@ -20,6 +20,7 @@ from app.models import (
 )
 from app.routes.auth import get_current_user
 from app.services.gemini_service import gemini_service
+from app.services.plan_service import plan_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -123,19 +124,20 @@ async def get_personalized_recommendations(user_id: str = Depends(get_current_us
 async def get_user_stats(user_id: str) -> Dict[str, Any]:
     """Calculate comprehensive user statistics"""
     try:
-        all_tracking = db_service.query_user_docs(user_id, "tracking")
-        tracking_data = all_tracking
-
-        total_days_tracked = len(tracking_data)
-        current_streak = calculate_current_streak(tracking_data)
-        longest_streak = calculate_longest_streak(tracking_data)
-
-        total_calories_burned = sum(
-            sum(ex.get('calories_burned', 0) for ex in entry.get('exercises', []))
-            for entry in tracking_data
-        )
-        total_meals_logged = sum(len(entry.get('meals', [])) for entry in tracking_data)
-        total_exercises_completed = sum(len(entry.get('exercises', [])) for entry in tracking_data)
+        totals = await db_service.aggregate_user_docs(user_id, "tracking", {
+            "days": ("count",),
+            "meals": ("sum_len", "meals"),
+            "exercises": ("sum_len", "exercises"),
+            "calories_burned": ("sum_items", "exercises", "calories_burned"),
+        })
+        streaks = await db_service.user_doc_streaks(user_id, "tracking", order_by="date", key="compliance_score", threshold=50)
+
+        total_days_tracked = totals["days"]
+        current_streak = streaks["current"]
+        longest_streak = streaks["longest"]
+        total_calories_burned = totals["calories_burned"]
+        total_meals_logged = totals["meals"]
+        total_exercises_completed = totals["exercises"]
 
         level = min(total_days_tracked // 7 + 1, 50)
         experience_points = total_days_tracked * 10 + total_meals_logged * 5 + total_exercises_completed * 15
@@ -165,23 +167,15 @@ async def get_recent_tracking(user_id: str, days: int) -> List[Dict[str, Any]]:
     try:
         end_date = datetime.utcnow().date()
         start_date = end_date - timedelta(days=days-1)
-        tracking_data = []
-        current_date = start_date
-        while current_date <= end_date:
-            doc = db_service.get_user_doc(user_id, "tracking", current_date.isoformat())
-            if doc:
-                tracking_data.append(doc)
-            current_date += timedelta(days=1)
-        return tracking_data
+        return await db_service.get_user_docs_range(user_id, "tracking", start_date.isoformat(), end_date.isoformat())
     except Exception as e:
         logger.error(f"Error getting recent tracking: {e}")
         return []
 
 async def get_current_plan_data(user_id: str) -> Dict[str, Any]:
-    """Get user's current active plan"""
+    """Get user's current active plan header (daily plans are read per day)"""
     try:
-        active_plans = db_service.query_user_docs(user_id, "plans", filters={"is_active": True}, limit_count=1)
-        return active_plans[0] if active_plans else None
+        return await plan_service.get_active_plan(user_id)
     except Exception as e:
         logger.error(f"Error getting current plan: {e}")
         return None
@@ -190,15 +184,10 @@ async def get_upcoming_schedule(user_id: str) -> tuple:
     """Get upcoming meals and exercises"""
     try:
         today = datetime.utcnow().date()
-        current_plan = await get_current_plan_data(user_id)
-        if not current_plan:
+        _, daily_plan = await plan_service.get_active_plan_day(user_id, today)
+        if not daily_plan:
             return [], []
-
-        for weekly_plan in current_plan.get('weekly_plans', []):
-            for daily_plan in weekly_plan.get('daily_plans', []):
-                if daily_plan.get('date') == today.isoformat():
-                    return daily_plan.get('meals', []), daily_plan.get('exercises', [])
-        return [], []
+        return daily_plan.get('meals', []), daily_plan.get('exercises', [])
     except Exception as e:
         logger.error(f"Error getting upcoming schedule: {e}")
         return [], []
@@ -206,7 +195,7 @@ async def get_upcoming_schedule(user_id: str) -> tuple:
 async def get_recent_insights(user_id: str, limit: int = 5) -> List[Dict[str, Any]]:
     """Get recent ML insights"""
     try:
-        return db_service.query_user_docs(user_id, "ml_insights", order_by="generated_at", order_dir="DESC", limit_count=limit)
+        return await db_service.query_user_docs(user_id, "ml_insights", order_by="generated_at", order_dir="DESC", limit_count=limit)
     except Exception as e:
         logger.error(f"Error getting recent insights: {e}")
         return []
@@ -214,7 +203,7 @@ async def get_recent_insights(user_id: str, limit: int = 5) -> List[Dict[str, An
 async def get_recent_notifications(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Get recent notifications"""
     try:
-        return db_service.query_user_docs(user_id, "notifications", order_by="scheduled_at", order_dir="DESC", limit_count=limit)
+        return await db_service.query_user_docs(user_id, "notifications", order_by="scheduled_at", order_dir="DESC", limit_count=limit)
     except Exception as e:
         logger.error(f"Error getting recent notifications: {e}")
         return []
@@ -233,31 +222,6 @@ async def generate_progress_charts(user_id: str, days: int) -> Dict[str, Any]:
         logger.error(f"Error generating progress charts: {e}")
         return {}
 
-def calculate_current_streak(tracking_data: List[Dict[str, Any]]) -> int:
-    if not tracking_data:
-        return 0
-    sorted_data = sorted(tracking_data, key=lambda x: x.get('date', ''), reverse=True)
-    streak = 0
-    for entry in sorted_data:
-        if entry.get('compliance_score', 0) > 50:
-            streak += 1
-        else:
-            break
-    return streak
-
-def calculate_longest_streak(tracking_data: List[Dict[str, Any]]) -> int:
-    if not tracking_data:
-        return 0
-    sorted_data = sorted(tracking_data, key=lambda x: x.get('date', ''))
-    longest, current = 0, 0
-    for entry in sorted_data:
-        if entry.get('compliance_score', 0) > 50:
-            current += 1
-            longest = max(longest, current)
-        else:
-            current = 0
-    return longest
-
 def calculate_achievements(user_stats: Dict[str, Any]) -> List[Dict[str, Any]]:
     achievements = []
     if user_stats.get("current_streak", 0) >= 7:
@@ -281,7 +245,7 @@ def get_next_milestone(user_stats: Dict[str, Any]) -> Dict[str, Any]:
 
 async def get_user_context_for_recommendations(user_id: str) -> Dict[str, Any]:
     try:
-        user_data = db_service.get_user(user_id) or {}
+        user_data = await db_service.get_user(user_id) or {}
         recent_tracking = await get_recent_tracking(user_id, 7)
         current_plan = await get_current_plan_data(user_id)
         stats = await get_user_stats(user_id)
@@ -2,13 +2,13 @@
 Integrations API routes for Blinderfit Backend
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 import json
 
-from app.core.database import db_service
+from app.core.database import db_service, InvalidCursorError, NEXT_CURSOR_HEADER
 from app.routes.auth import get_current_user
 
 router = APIRouter(tags=["integrations"])
@@ -135,19 +135,29 @@ async def get_research_papers(request: ResearchRequest, current_user: str = Depe
 
 
 @router.get("/wearable-history")
-async def get_wearable_history(provider: Optional[str] = Query(None), limit: int = Query(10, ge=1, le=100), current_user: str = Depends(get_current_user)):
+async def get_wearable_history(response: Response, provider: Optional[str] = Query(None), limit: int = Query(10, ge=1, le=100), cursor: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
     try:
         svc = _get_svc()
-        return await svc.get_integration_history(user_id=current_user, integration_type=f"wearable_{provider}" if provider else None, limit=limit)
+        integrations, next_cursor = await svc.get_integration_history_page(user_id=current_user, integration_type=f"wearable_{provider}" if provider else None, limit=limit, cursor=cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return integrations
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/integration-history")
-async def get_integration_history(integration_type: Optional[str] = Query(None), limit: int = Query(10, ge=1, le=100), current_user: str = Depends(get_current_user)):
+async def get_integration_history(response: Response, integration_type: Optional[str] = Query(None), limit: int = Query(10, ge=1, le=100), cursor: Optional[str] = Query(None), current_user: str = Depends(get_current_user)):
     try:
         svc = _get_svc()
-        return await svc.get_integration_history(user_id=current_user, integration_type=integration_type, limit=limit)
+        integrations, next_cursor = await svc.get_integration_history_page(user_id=current_user, integration_type=integration_type, limit=limit, cursor=cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return integrations
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -155,7 +165,7 @@ async def get_integration_history(integration_type: Optional[str] = Query(None),
 @router.post("/meal-suggestions")
 async def get_meal_suggestions(preferences: Dict[str, Any], current_user: str = Depends(get_current_user)):
     try:
-        user_data = db_service.get_user(current_user) or {}
+        user_data = await db_service.get_user(current_user) or {}
         dietary_restrictions = user_data.get('dietary_restrictions', [])
         allergies = user_data.get('allergies', [])
         cuisine_preferences = user_data.get('cuisine_preferences', [])
@@ -177,7 +187,7 @@ async def get_meal_suggestions(preferences: Dict[str, Any], current_user: str =
 @router.post("/workout-plan")
 async def generate_workout_plan(goals: Dict[str, Any], current_user: str = Depends(get_current_user)):
     try:
-        user_data = db_service.get_user(current_user) or {}
+        user_data = await db_service.get_user(current_user) or {}
 
         from app.services.gemini_service import gemini_service
         prompt = f"""Create a personalized workout plan:
@@ -196,8 +206,8 @@ async def generate_workout_plan(goals: Dict[str, Any], current_user: str = Depen
 @router.post("/health-assessment")
 async def comprehensive_health_assessment(current_user: str = Depends(get_current_user)):
     try:
-        user_data = db_service.get_user(current_user) or {}
-        tracking_data = db_service.query_user_docs(current_user, "tracking", order_by="date", order_dir="DESC", limit_count=7)
+        user_data = await db_service.get_user(current_user) or {}
+        tracking_data = await db_service.query_user_docs(current_user, "tracking", order_by="date", order_dir="DESC", limit_count=7)
 
         from app.services.gemini_service import gemini_service
         prompt = f"""Comprehensive health assessment:
@@ -5,11 +5,12 @@ ML Predictions routes for advanced analytics and forecasting
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, List
+from typing import Deque, Dict, Any, List, Optional
+from collections import deque
 import json
 import uuid
 
-from app.core.database import db_service
+from app.core.database import db_service, InvalidCursorError
 from app.models import (
     PredictionRequest,
     MLInsight,
@@ -22,6 +23,9 @@ from app.services.gemini_service import gemini_service
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Tracking days quoted verbatim in pattern-analysis prompts
+RECENT_TRACKING_DAYS = 14
+
 @router.post("/predict", response_model=APIResponse)
 async def generate_prediction(request: PredictionRequest, user_id: str = Depends(get_current_user)):
     """Generate ML-powered health predictions"""
@@ -41,7 +45,7 @@ async def generate_prediction(request: PredictionRequest, user_id: str = Depends
             "generated_at": datetime.utcnow().isoformat()
         }
 
-        db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
+        await db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
 
         return APIResponse(
             success=True, message="Prediction generated successfully",
@@ -52,12 +56,16 @@ async def generate_prediction(request: PredictionRequest, user_id: str = Depends
         raise HTTPException(status_code=500, detail="Prediction generation failed")
 
 @router.get("/insights", response_model=APIResponse)
-async def get_ml_insights(insight_type: str = None, limit: int = 10, user_id: str = Depends(get_current_user)):
+async def get_ml_insights(insight_type: str = None, limit: int = 10, cursor: Optional[str] = None, user_id: str = Depends(get_current_user)):
     """Get user's ML-generated insights"""
     try:
         filters = {"insight_type": insight_type} if insight_type else None
-        insights = db_service.query_user_docs(user_id, "ml_insights", filters=filters, order_by="generated_at", order_dir="DESC", limit_count=limit)
-        return APIResponse(success=True, message="ML insights retrieved successfully", data={"insights": insights, "total": len(insights), "filter": insight_type})
+        insights, next_cursor = await db_service.query_user_docs_page(
+            user_id, "ml_insights", filters=filters, order_by="generated_at", order_dir="DESC", limit_count=limit, cursor=cursor
+        )
+        return APIResponse(success=True, message="ML insights retrieved successfully", data={"insights": insights, "total": len(insights), "filter": insight_type, "next_cursor": next_cursor})
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting ML insights: {e}")
         raise HTTPException(status_code=500, detail="Failed to get ML insights")
@@ -76,7 +84,7 @@ async def generate_personalization(data_slice: Dict[str, Any], user_id: str = De
             "output_data": personalization_result, "confidence_score": personalization_result.get('confidence_score', 0.8),
             "generated_at": datetime.utcnow().isoformat()
         }
-        db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
+        await db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
 
         return APIResponse(
             success=True, message="Personalization generated successfully",
@@ -100,7 +108,7 @@ async def analyze_user_patterns(analysis_type: str = "comprehensive", user_id: s
             "output_data": analysis_result, "confidence_score": analysis_result.get('confidence_score', 0.85),
             "generated_at": datetime.utcnow().isoformat()
         }
-        db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
+        await db_service.set_user_doc(user_id, "ml_insights", insight_id, ml_insight)
 
         return APIResponse(
             success=True, message="Pattern analysis completed successfully",
@@ -130,10 +138,14 @@ async def get_historical_data_for_prediction(user_id: str, timeframe_days: int)
     try:
         end_date = datetime.utcnow().date()
         start_date = end_date - timedelta(days=timeframe_days)
+        tracked = {
+            doc["_id"]: doc
+            for doc in await db_service.get_user_docs_range(user_id, "tracking", start_date.isoformat(), end_date.isoformat())
+        }
         historical_data = []
         current_date = start_date
         while current_date <= end_date:
-            doc = db_service.get_user_doc(user_id, "tracking", current_date.isoformat())
+            doc = tracked.get(current_date.isoformat())
             if doc:
                 doc['date'] = current_date.isoformat()
                 historical_data.append(doc)
@@ -154,7 +166,7 @@ async def generate_ml_prediction(user_id: str, prediction_type: str, historical_
         response = await gemini_service.generate_response(
             prompt=prompt,
             system_prompt="You are a health analytics AI specializing in predictive modeling. Be conservative with predictions.",
-            temperature=0.1, max_tokens=800
+            temperature=0.1, max_tokens=800, cache=True
         )
         return {
             "prediction_type": prediction_type, "timeframe_days": timeframe_days, "prediction": response,
@@ -169,8 +181,8 @@ async def generate_ml_prediction(user_id: str, prediction_type: str, historical_
 
 async def get_user_context_for_personalization(user_id: str) -> Dict[str, Any]:
     try:
-        user_data = db_service.get_user(user_id) or {}
-        onboarding_data = db_service.get_user_doc(user_id, "onboarding", "data") or {}
+        user_data = await db_service.get_user(user_id) or {}
+        onboarding_data = await db_service.get_user_doc(user_id, "onboarding", "data") or {}
         recent_tracking = await get_historical_data_for_prediction(user_id, 14)
         return {"profile": user_data, "preferences": onboarding_data.get('dietary_preferences', {}), "goals": onboarding_data.get('goals', {}), "recent_activity": recent_tracking}
     except Exception as e:
@@ -192,12 +204,22 @@ async def generate_collaborative_filtering(user_context: Dict[str, Any], data_sl
         return {"technique": "collaborative_filtering", "recommendations": "Focus on consistent meal timing and gradual exercise increases.", "confidence_score": 0.6, "generated_at": datetime.utcnow().isoformat()}
 
 async def get_comprehensive_user_data(user_id: str) -> Dict[str, Any]:
+    """Profile, onboarding and plan summaries plus a streamed fold over the whole tracking history"""
     try:
-        user_data = db_service.get_user(user_id) or {}
-        tracking_data = db_service.query_user_docs(user_id, "tracking")
-        onboarding_data = db_service.get_user_doc(user_id, "onboarding", "data") or {}
-        plans_data = db_service.query_user_docs(user_id, "plans")
-        return {"profile": user_data, "tracking_history": tracking_data, "onboarding": onboarding_data, "plans_history": plans_data, "total_data_points": len(tracking_data)}
+        user_data = await db_service.get_user(user_id) or {}
+        # Oldest first, keeping only the last RECENT_TRACKING_DAYS: memory stays flat however long the history is
+        total_days = 0
+        recent_tracking: Deque[Dict[str, Any]] = deque(maxlen=RECENT_TRACKING_DAYS)
+        async for day in db_service.stream_user_docs(user_id, "tracking", order_by="date", order_dir="ASC"):
+            total_days += 1
+            recent_tracking.append(day)
+        onboarding_data = await db_service.get_user_doc(user_id, "onboarding", "data") or {}
+        plans_data = [
+            plan async for plan in db_service.stream_user_docs(
+                user_id, "plans", fields=["plan_name", "created_at", "is_active", "duration_weeks"]
+            )
+        ]
+        return {"profile": user_data, "recent_tracking": list(recent_tracking), "onboarding": onboarding_data, "plans_history": plans_data, "total_data_points": total_days}
     except Exception as e:
         logger.error(f"Error getting comprehensive user data: {e}")
         return {}
@@ -205,13 +227,13 @@ async def get_comprehensive_user_data(user_id: str) -> Dict[str, Any]:
 async def generate_pattern_analysis(user_data: Dict[str, Any], analysis_type: str) -> Dict[str, Any]:
     try:
         prompt = f"""Perform comprehensive pattern analysis:
-        Tracking History: {len(user_data.get('tracking_history', []))} days
-        Recent: {json.dumps(user_data.get('tracking_history', [])[-14:], default=str)}
+        Tracking History: {user_data.get('total_data_points', 0)} days
+        Recent: {json.dumps(user_data.get('recent_tracking', []), default=str)}
         Goals: {json.dumps(user_data.get('onboarding', {}).get('goals', {}), default=str)}
         Analysis Type: {analysis_type}
         Identify: consistency patterns, success factors, challenge areas, correlations, optimal timing"""
 
-        response = await gemini_service.generate_response(prompt=prompt, system_prompt="You are a health data analyst.", temperature=0.2, max_tokens=1000)
+        response = await gemini_service.generate_response(prompt=prompt, system_prompt="You are a health data analyst.", temperature=0.2, max_tokens=1000, cache=True)
         return {"analysis_type": analysis_type, "insights": response, "confidence_score": 0.85, "data_points_analyzed": user_data.get('total_data_points', 0), "patterns_identified": ["Consistency correlations", "Timing optimization", "Success factors"], "generated_at": datetime.utcnow().isoformat()}
     except Exception as e:
         logger.error(f"Error generating pattern analysis: {e}")
@@ -222,19 +244,15 @@ async def get_metric_history(user_id: str, metric: str, period_days: int) -> Lis
         end_date = datetime.utcnow().date()
         start_date = end_date - timedelta(days=period_days)
         metric_data = []
-        current_date = start_date
-        while current_date <= end_date:
-            doc = db_service.get_user_doc(user_id, "tracking", current_date.isoformat())
-            if doc:
-                value = None
-                if metric == "weight": value = doc.get('weight_kg')
-                elif metric == "compliance": value = doc.get('compliance_score')
-                elif metric == "calories": value = sum(m.get('total_calories', 0) for m in doc.get('meals', []))
-                elif metric == "exercise_minutes": value = sum(e.get('duration_minutes', 0) for e in doc.get('exercises', []))
-                elif metric == "water_intake": value = doc.get('water_intake_ml')
-                if value is not None:
-                    metric_data.append({"date": current_date.isoformat(), "value": value})
-            current_date += timedelta(days=1)
+        for doc in await db_service.get_user_docs_range(user_id, "tracking", start_date.isoformat(), end_date.isoformat()):
+            value = None
+            if metric == "weight": value = doc.get('weight_kg')
+            elif metric == "compliance": value = doc.get('compliance_score')
+            elif metric == "calories": value = sum(m.get('total_calories', 0) for m in doc.get('meals', []))
+            elif metric == "exercise_minutes": value = sum(e.get('duration_minutes', 0) for e in doc.get('exercises', []))
+            elif metric == "water_intake": value = doc.get('water_intake_ml')
+            if value is not None:
+                metric_data.append({"date": doc["_id"], "value": value})
         return metric_data
     except Exception as e:
         logger.error(f"Error getting metric history: {e}")
@@ -247,7 +265,7 @@ async def analyze_metric_trends(historical_data: List[Dict[str, Any]], metric: s
         prompt = f"""Analyze trends in this {metric} data:
         Data Points: {json.dumps(historical_data, indent=2)}
         Provide: trend direction, patterns, significant changes, predictions, recommendations"""
-        response = await gemini_service.generate_response(prompt=prompt, system_prompt="You are a data analyst specializing in health metrics.", temperature=0.1, max_tokens=500)
+        response = await gemini_service.generate_response(prompt=prompt, system_prompt="You are a data analyst specializing in health metrics.", temperature=0.1, max_tokens=500, cache=True)
         return {"metric": metric, "trend_analysis": response, "data_points": len(historical_data), "period_covered": f"{historical_data[0]['date']} to {historical_data[-1]['date']}" if historical_data else "N/A", "generated_at": datetime.utcnow().isoformat()}
     except Exception as e:
         logger.error(f"Error analyzing metric trends: {e}")
@@ -2,12 +2,12 @@
 Notifications API routes for Blinderfit Backend
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
-from app.core.database import db_service
+from app.core.database import db_service, unit_of_work, InvalidCursorError, NEXT_CURSOR_HEADER
 from app.routes.auth import get_current_user
 
 router = APIRouter(tags=["notifications"])
@@ -19,6 +19,12 @@ def _get_svc():
     return notification_service
 
 
+async def _schedule_daily_in_background(user_id: str) -> None:
+    """Background tasks run after the request's unit of work has committed, so open their own"""
+    async with unit_of_work():
+        await _get_svc().schedule_daily_notifications(user_id=user_id)
+
+
 class NotificationRequest(BaseModel):
     title: str = Field(..., description="Notification title")
     message: str = Field(..., description="Notification message")
@@ -80,7 +86,7 @@ async def send_exercise_reminder(current_user: str = Depends(get_current_user)):
 @router.post("/motivational")
 async def send_motivational_message(current_user: str = Depends(get_current_user)):
     try:
-        user_data = db_service.get_user(current_user)
+        user_data = await db_service.get_user(current_user)
         streak = user_data.get('current_streak', 0) if user_data else 0
         svc = _get_svc()
         nid = await svc.send_motivational_message(user_id=current_user, streak=streak)
@@ -112,8 +118,7 @@ async def send_insight_notification(insight_data: Dict[str, Any], current_user:
 @router.post("/schedule-daily")
 async def schedule_daily_notifications(background_tasks: BackgroundTasks, current_user: str = Depends(get_current_user)):
     try:
-        svc = _get_svc()
-        background_tasks.add_task(svc.schedule_daily_notifications, user_id=current_user)
+        background_tasks.add_task(_schedule_daily_in_background, user_id=current_user)
         return {"message": "Daily notifications scheduled successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,7 +127,7 @@ async def schedule_daily_notifications(background_tasks: BackgroundTasks, curren
 @router.put("/preferences")
 async def update_notification_preferences(preferences: NotificationPreferences, current_user: str = Depends(get_current_user)):
     try:
-        db_service.update_user(current_user, {
+        await db_service.update_user(current_user, {
             'notification_preferences': preferences.dict(),
             'preferences_updated_at': datetime.utcnow().isoformat()
         })
@@ -139,6 +144,8 @@ async def mark_notification_read(notification_id: str, current_user: str = Depen
         if not success:
             raise HTTPException(status_code=404, detail="Notification not found")
         return {"message": "Notification marked as read"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,9 +160,16 @@ async def get_unread_notifications(current_user: str = Depends(get_current_user)
 
 
 @router.get("/history")
-async def get_notification_history(limit: int = 50, current_user: str = Depends(get_current_user)):
+async def get_notification_history(response: Response, limit: int = 50, cursor: Optional[str] = None, current_user: str = Depends(get_current_user)):
     try:
-        return db_service.query_user_docs(current_user, "notifications", order_by="created_at", order_dir="DESC", limit_count=limit)
+        notifications, next_cursor = await db_service.query_user_docs_page(
+            current_user, "notifications", order_by="created_at", order_dir="DESC", limit_count=limit, cursor=cursor
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return notifications
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -175,7 +189,7 @@ async def send_bulk_notifications(request: BulkNotificationRequest, current_user
 @router.delete("/{notification_id}")
 async def delete_notification(notification_id: str, current_user: str = Depends(get_current_user)):
     try:
-        db_service.delete_user_doc(current_user, "notifications", notification_id)
+        await db_service.delete_user_doc(current_user, "notifications", notification_id)
         return {"message": "Notification deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -184,13 +198,15 @@ async def delete_notification(notification_id: str, current_user: str = Depends(
 @router.get("/stats")
 async def get_notification_stats(current_user: str = Depends(get_current_user)):
     try:
-        all_notifs = db_service.query_user_docs(current_user, "notifications")
-        total = len(all_notifs)
-        unread = sum(1 for n in all_notifs if n.get('read_at') is None)
+        by_type = await db_service.aggregate_user_docs(
+            current_user, "notifications", {"count": ("count",), "unread": ("count_null", "read_at")}, group_by="type"
+        )
+        total = sum(counts["count"] for counts in by_type.values())
+        unread = sum(counts["unread"] for counts in by_type.values())
         types_count = {}
-        for n in all_notifs:
-            t = n.get('type', 'general')
-            types_count[t] = types_count.get(t, 0) + 1
+        for t, counts in by_type.items():
+            t = t or 'general'
+            types_count[t] = types_count.get(t, 0) + counts["count"]
         return {"total_notifications": total, "unread_count": unread, "notifications_by_type": types_count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -36,7 +36,7 @@ async def complete_onboarding(request: OnboardingRequest, user_id: str = Depends
             "completed_at": datetime.utcnow().isoformat()
         }
 
-        db_service.set_user_doc(user_id, "onboarding", "data", onboarding_data)
+        await db_service.set_user_doc(user_id, "onboarding", "data", onboarding_data)
 
         # Update main user document with health data
         user_updates = {
@@ -50,7 +50,7 @@ async def complete_onboarding(request: OnboardingRequest, user_id: str = Depends
             'onboarding_completed': True,
             'updated_at': datetime.utcnow().isoformat()
         }
-        db_service.update_user(user_id, user_updates)
+        await db_service.update_user(user_id, user_updates)
 
         analysis = await generate_health_analysis(user_id, request.health_data.dict() if hasattr(request.health_data, 'dict') else request.health_data)
 
@@ -75,12 +75,12 @@ async def complete_onboarding(request: OnboardingRequest, user_id: str = Depends
 async def get_onboarding_status(user_id: str = Depends(get_current_user)):
     """Get user's onboarding status"""
     try:
-        user_data = db_service.get_user(user_id)
+        user_data = await db_service.get_user(user_id)
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
 
         if user_data.get('onboarding_completed', False):
-            onboarding_data = db_service.get_user_doc(user_id, "onboarding", "data")
+            onboarding_data = await db_service.get_user_doc(user_id, "onboarding", "data")
             if onboarding_data:
                 return APIResponse(success=True, message="Onboarding completed", data={"status": "completed", "onboarding_data": onboarding_data})
 
@@ -98,7 +98,7 @@ async def get_onboarding_status(user_id: str = Depends(get_current_user)):
 async def get_health_analysis(user_id: str = Depends(get_current_user)):
     """Get user's health analysis based on onboarding data"""
     try:
-        user_data = db_service.get_user(user_id)
+        user_data = await db_service.get_user(user_id)
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         if not user_data.get('onboarding_completed'):
@@ -123,14 +123,14 @@ async def update_onboarding_data(updates: Dict[str, Any], user_id: str = Depends
             raise HTTPException(status_code=400, detail="No valid sections to update")
 
         filtered_updates['updated_at'] = datetime.utcnow().isoformat()
-        db_service.update_user_doc(user_id, "onboarding", "data", filtered_updates)
+        await db_service.update_user_doc(user_id, "onboarding", "data", filtered_updates)
 
         if 'health_data' in filtered_updates:
             health_data = filtered_updates['health_data']
             health_updates = {k: health_data[k] for k in ('height_cm', 'weight_kg', 'age', 'gender', 'activity_level') if k in health_data}
             if health_updates:
                 health_updates['updated_at'] = datetime.utcnow().isoformat()
-                db_service.update_user(user_id, health_updates)
+                await db_service.update_user(user_id, health_updates)
 
         return APIResponse(success=True, message="Onboarding data updated successfully")
     except HTTPException:
@@ -5,10 +5,10 @@ Plans routes for generating and managing personalized health plans
 from fastapi import APIRouter, Depends, HTTPException, status
 import logging
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import uuid
 
-from app.core.database import db_service
+from app.core.database import db_service, InvalidCursorError
 from app.models import (
     PersonalizedPlan,
     DailyPlan,
@@ -22,6 +22,7 @@ from app.models import (
 )
 from app.routes.auth import get_current_user
 from app.services.gemini_service import gemini_service
+from app.services.plan_service import plan_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -53,15 +54,13 @@ async def generate_personalized_plan(
             "updated_at": datetime.utcnow().isoformat()
         }
 
-        # Save plan
-        db_service.set_user_doc(user_id, "plans", plan_id, plan_dict)
+        # Save plan header and per-day documents
+        await plan_service.save_plan(user_id, plan_id, plan_dict)
 
         # Deactivate previous active plans
-        previous_plans = db_service.query_user_docs(user_id, "plans", filters={"is_active": True})
-        for plan in previous_plans:
-            pid = plan.get("_id") or plan.get("id")
-            if pid and pid != plan_id:
-                db_service.update_user_doc(user_id, "plans", pid, {"is_active": False})
+        await db_service.update_user_docs_where(
+            user_id, "plans", {"is_active": False}, filters={"is_active": True}, exclude_doc_ids=[plan_id]
+        )
 
         return APIResponse(
             success=True,
@@ -83,19 +82,23 @@ async def generate_personalized_plan(
 async def get_current_plan(user_id: str = Depends(get_current_user)):
     """Get user's current active plan"""
     try:
-        active_plans = db_service.query_user_docs(user_id, "plans", filters={"is_active": True}, limit_count=1)
-        if not active_plans:
+        plan_header = await plan_service.get_active_plan(user_id)
+        if not plan_header:
             return APIResponse(success=True, message="No active plan found", data=None)
-        return APIResponse(success=True, message="Current plan retrieved successfully", data=active_plans[0])
+        plan_data = await plan_service.assemble_plan(user_id, plan_header)
+        return APIResponse(success=True, message="Current plan retrieved successfully", data=plan_data)
     except Exception as e:
         logger.error(f"Error getting current plan: {e}")
         raise HTTPException(status_code=500, detail="Failed to get current plan")
 
 @router.get("/history", response_model=APIResponse)
-async def get_plan_history(limit: int = 5, user_id: str = Depends(get_current_user)):
+async def get_plan_history(limit: int = 5, cursor: Optional[str] = None, user_id: str = Depends(get_current_user)):
     """Get user's plan history"""
     try:
-        plans = db_service.query_user_docs(user_id, "plans", order_by="created_at", order_dir="DESC", limit_count=limit)
+        plans, next_cursor = await db_service.query_user_docs_page(
+            user_id, "plans", order_by="created_at", order_dir="DESC", limit_count=limit, cursor=cursor,
+            fields=["id", "plan_name", "created_at", "is_active", "duration_weeks"]
+        )
         plan_history = [{
             "plan_id": p.get("_id") or p.get("id"),
             "plan_name": p.get("plan_name"),
@@ -104,7 +107,9 @@ async def get_plan_history(limit: int = 5, user_id: str = Depends(get_current_us
             "duration_weeks": p.get("duration_weeks")
         } for p in plans]
 
-        return APIResponse(success=True, message="Plan history retrieved successfully", data={"plans": plan_history, "total": len(plan_history)})
+        return APIResponse(success=True, message="Plan history retrieved successfully", data={"plans": plan_history, "total": len(plan_history), "next_cursor": next_cursor})
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting plan history: {e}")
         raise HTTPException(status_code=500, detail="Failed to get plan history")
@@ -113,7 +118,7 @@ async def get_plan_history(limit: int = 5, user_id: str = Depends(get_current_us
 async def get_plan_details(plan_id: str, user_id: str = Depends(get_current_user)):
     """Get detailed plan information"""
     try:
-        plan_data = db_service.get_user_doc(user_id, "plans", plan_id)
+        plan_data = await plan_service.get_plan(user_id, plan_id)
         if not plan_data:
             raise HTTPException(status_code=404, detail="Plan not found")
         return APIResponse(success=True, message="Plan details retrieved successfully", data=plan_data)
@@ -127,19 +132,16 @@ async def get_plan_details(plan_id: str, user_id: str = Depends(get_current_user
 async def activate_plan(plan_id: str, user_id: str = Depends(get_current_user)):
     """Activate a specific plan"""
     try:
-        plan_data = db_service.get_user_doc(user_id, "plans", plan_id)
-        if not plan_data:
-            raise HTTPException(status_code=404, detail="Plan not found")
-
-        # Deactivate all plans
-        all_plans = db_service.query_user_docs(user_id, "plans")
-        for plan in all_plans:
-            pid = plan.get("_id") or plan.get("id")
-            if pid:
-                db_service.update_user_doc(user_id, "plans", pid, {"is_active": False, "updated_at": datetime.utcnow().isoformat()})
+        now = datetime.utcnow().isoformat()
 
         # Activate selected
-        db_service.update_user_doc(user_id, "plans", plan_id, {"is_active": True, "updated_at": datetime.utcnow().isoformat()})
+        if not await db_service.update_user_doc(user_id, "plans", plan_id, {"is_active": True, "updated_at": now}, upsert=False):
+            raise HTTPException(status_code=404, detail="Plan not found")
+
+        # Deactivate all other plans
+        await db_service.update_user_docs_where(
+            user_id, "plans", {"is_active": False, "updated_at": now}, filters={"is_active": True}, exclude_doc_ids=[plan_id]
+        )
 
         return APIResponse(success=True, message="Plan activated successfully")
     except HTTPException:
@@ -152,10 +154,10 @@ async def activate_plan(plan_id: str, user_id: str = Depends(get_current_user)):
 async def delete_plan(plan_id: str, user_id: str = Depends(get_current_user)):
     """Delete a plan"""
     try:
-        plan_data = db_service.get_user_doc(user_id, "plans", plan_id)
+        plan_data = await db_service.get_user_doc(user_id, "plans", plan_id)
         if plan_data and plan_data.get("is_active"):
             raise HTTPException(status_code=400, detail="Cannot delete active plan")
-        db_service.delete_user_doc(user_id, "plans", plan_id)
+        await plan_service.delete_plan(user_id, plan_id)
         return APIResponse(success=True, message="Plan deleted successfully")
     except HTTPException:
         raise
@@ -167,22 +169,11 @@ async def delete_plan(plan_id: str, user_id: str = Depends(get_current_user)):
 async def get_daily_plan(date: date, user_id: str = Depends(get_current_user)):
     """Get plan for a specific date"""
     try:
-        active_plans = db_service.query_user_docs(user_id, "plans", filters={"is_active": True}, limit_count=1)
-        if not active_plans:
+        # Active plan header, then a point lookup of the day's plan_days document
+        plan_data, target_daily_plan = await plan_service.get_active_plan_day(user_id, date)
+        if not plan_data:
             raise HTTPException(status_code=404, detail="No active plan found")
 
-        plan_data = active_plans[0]
-        weekly_plans = plan_data.get('weekly_plans', [])
-
-        target_daily_plan = None
-        for weekly_plan in weekly_plans:
-            for daily_plan in weekly_plan.get('daily_plans', []):
-                if daily_plan.get('date') == date.isoformat():
-                    target_daily_plan = daily_plan
-                    break
-            if target_daily_plan:
-                break
-
         if not target_daily_plan:
             target_daily_plan = await generate_daily_plan(date, plan_data)
 
@@ -196,9 +187,9 @@ async def get_daily_plan(date: date, user_id: str = Depends(get_current_user)):
 async def get_user_data_for_plan(user_id: str) -> Dict[str, Any]:
     """Get comprehensive user data for plan generation"""
     try:
-        user_data = db_service.get_user(user_id) or {}
-        onboarding_data = db_service.get_user_doc(user_id, "onboarding", "data") or {}
-        tracking_history = db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=30)
+        user_data = await db_service.get_user(user_id) or {}
+        onboarding_data = await db_service.get_user_doc(user_id, "onboarding", "data") or {}
+        tracking_history = await db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=30)
 
         return {
             "profile": user_data,
@@ -50,7 +50,7 @@ async def submit_daily_tracking(
             "updated_at": datetime.utcnow().isoformat()
         }
 
-        db_service.set_user_doc(user_id, "tracking", request.date.isoformat(), tracking_data)
+        await db_service.set_user_doc(user_id, "tracking", request.date.isoformat(), tracking_data)
 
         insights = None
         if compliance_score < 70:
@@ -75,7 +75,7 @@ async def submit_daily_tracking(
 async def get_daily_tracking(date: date, user_id: str = Depends(get_current_user)):
     """Get daily tracking data for a specific date"""
     try:
-        tracking_data = db_service.get_user_doc(user_id, "tracking", date.isoformat())
+        tracking_data = await db_service.get_user_doc(user_id, "tracking", date.isoformat())
         if not tracking_data:
             return APIResponse(success=True, message="No tracking data found for this date", data=None)
         return APIResponse(success=True, message="Daily tracking data retrieved successfully", data=tracking_data)
@@ -90,7 +90,7 @@ async def update_daily_tracking(date: date, updates: Dict[str, Any], user_id: st
         updates['updated_at'] = datetime.utcnow().isoformat()
 
         if any(k in updates for k in ('meals', 'exercises', 'water_intake_ml', 'steps_count')):
-            current_data = db_service.get_user_doc(user_id, "tracking", date.isoformat())
+            current_data = await db_service.get_user_doc(user_id, "tracking", date.isoformat())
             if current_data:
                 for key, value in updates.items():
                     current_data[key] = value
@@ -100,7 +100,7 @@ async def update_daily_tracking(date: date, updates: Dict[str, Any], user_id: st
                 except Exception:
                     pass
 
-        db_service.update_user_doc(user_id, "tracking", date.isoformat(), updates)
+        await db_service.update_user_doc(user_id, "tracking", date.isoformat(), updates)
         return APIResponse(success=True, message="Daily tracking updated successfully")
     except Exception as e:
         logger.error(f"Error updating daily tracking: {e}")
@@ -113,10 +113,15 @@ async def get_tracking_history(days: int = 7, user_id: str = Depends(get_current
         end_date = datetime.utcnow().date()
         start_date = end_date - timedelta(days=days-1)
 
+        tracked = {
+            doc["_id"]: doc
+            for doc in await db_service.get_user_docs_range(user_id, "tracking", start_date.isoformat(), end_date.isoformat())
+        }
+
         tracking_history = []
         current_date = start_date
         while current_date <= end_date:
-            tracking_data = db_service.get_user_doc(user_id, "tracking", current_date.isoformat())
+            tracking_data = tracked.get(current_date.isoformat())
             if tracking_data:
                 tracking_history.append(tracking_data)
             else:
@@ -149,14 +154,7 @@ async def get_tracking_stats(period: str = "week", user_id: str = Depends(get_cu
         days_map = {"week": 6, "month": 29, "quarter": 89}
         start_date = end_date - timedelta(days=days_map.get(period, 6))
 
-        tracking_data = []
-        current_date = start_date
-        while current_date <= end_date:
-            doc = db_service.get_user_doc(user_id, "tracking", current_date.isoformat())
-            if doc:
-                tracking_data.append(doc)
-            current_date += timedelta(days=1)
-
+        tracking_data = await db_service.get_user_docs_range(user_id, "tracking", start_date.isoformat(), end_date.isoformat())
         stats = calculate_tracking_stats(tracking_data)
 
         return APIResponse(
@@ -173,19 +171,12 @@ async def log_meal(meal_log: MealLog, user_id: str = Depends(get_current_user)):
     """Log a meal entry"""
     try:
         today = datetime.utcnow().date()
-        current_data = db_service.get_user_doc(user_id, "tracking", today.isoformat())
-        current_meals = current_data.get('meals', []) if current_data else []
-        current_meals.append(meal_log.dict())
-
-        db_service.set_user_doc(user_id, "tracking", today.isoformat(), {
-            'user_id': user_id,
-            'date': today.isoformat(),
-            'meals': current_meals,
-            'updated_at': datetime.utcnow().isoformat(),
-            **(current_data or {})
-        })
+        total_meals = await db_service.append_to_user_doc_array(
+            user_id, "tracking", today.isoformat(), "meals", meal_log.model_dump(mode="json"),
+            defaults={'user_id': user_id, 'date': today.isoformat(), 'updated_at': datetime.utcnow().isoformat()}
+        )
 
-        return APIResponse(success=True, message="Meal logged successfully", data={"meal_logged": meal_log.dict(), "total_meals_today": len(current_meals)})
+        return APIResponse(success=True, message="Meal logged successfully", data={"meal_logged": meal_log.dict(), "total_meals_today": total_meals})
     except Exception as e:
         logger.error(f"Error logging meal: {e}")
         raise HTTPException(status_code=500, detail="Failed to log meal")
@@ -195,19 +186,12 @@ async def log_exercise(exercise_log: ExerciseLog, user_id: str = Depends(get_cur
     """Log an exercise entry"""
     try:
         today = datetime.utcnow().date()
-        current_data = db_service.get_user_doc(user_id, "tracking", today.isoformat())
-        current_exercises = current_data.get('exercises', []) if current_data else []
-        current_exercises.append(exercise_log.dict())
-
-        db_service.set_user_doc(user_id, "tracking", today.isoformat(), {
-            'user_id': user_id,
-            'date': today.isoformat(),
-            'exercises': current_exercises,
-            'updated_at': datetime.utcnow().isoformat(),
-            **(current_data or {})
-        })
+        total_exercises = await db_service.append_to_user_doc_array(
+            user_id, "tracking", today.isoformat(), "exercises", exercise_log.model_dump(mode="json"),
+            defaults={'user_id': user_id, 'date': today.isoformat(), 'updated_at': datetime.utcnow().isoformat()}
+        )
 
-        return APIResponse(success=True, message="Exercise logged successfully", data={"exercise_logged": exercise_log.dict(), "total_exercises_today": len(current_exercises)})
+        return APIResponse(success=True, message="Exercise logged successfully", data={"exercise_logged": exercise_log.dict(), "total_exercises_today": total_exercises})
     except Exception as e:
         logger.error(f"Error logging exercise: {e}")
         raise HTTPException(status_code=500, detail="Failed to log exercise")
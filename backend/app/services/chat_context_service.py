@@ -0,0 +1,104 @@
+"""
+Chat context snapshots for Blinderfit Backend
+Each distinct user context is stored once in `chat_contexts`, keyed by the SHA-256
+of its canonical JSON; chat rows keep only that reference.
+The contexts themselves are cached per user between chat messages.
+"""
+
+from typing import Awaitable, Callable, Dict, Any, Optional
+import base64
+import hashlib
+import json
+import logging
+
+from app.core.cache import Cache
+from app.core.config import settings
+from app.core.database import add_write_listener, db_service
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CONTEXTS_COLLECTION = "chat_contexts"
+# Changes on every request, so it is kept on the chat row instead of in the snapshot
+VOLATILE_KEYS = ("context_timestamp",)
+
+
+def canonical_json(context: Dict[str, Any]) -> bytes:
+    """Key-sorted, whitespace-free JSON: equal contexts give equal bytes and so equal hashes"""
+    return json.dumps(context, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+class ChatContextService:
+    """Content-addressed storage of the user context attached to chat sessions"""
+
+    @staticmethod
+    def _encode(canonical: bytes) -> Dict[str, Any]:
+        min_bytes = settings.CHAT_CONTEXT_COMPRESS_MIN_BYTES
+        if zstandard is not None and min_bytes and len(canonical) >= min_bytes:
+            blob = zstandard.ZstdCompressor().compress(canonical)
+            return {"encoding": "zstd", "blob": base64.b64encode(blob).decode(), "size": len(canonical)}
+        return {"encoding": "json", "context": json.loads(canonical)}
+
+    @staticmethod
+    def _decode(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        if snapshot.get("encoding") == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Chat context snapshot is zstd-compressed but zstandard is not installed")
+            return json.loads(zstandard.ZstdDecompressor().decompress(base64.b64decode(snapshot["blob"])))
+        return snapshot.get("context", {})
+
+    async def save(self, user_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store the context unless an identical snapshot exists; returns the fields
+        a chat row keeps in place of the context
+        """
+        stable = {key: value for key, value in context.items() if key not in VOLATILE_KEYS}
+        canonical = canonical_json(stable)
+        context_id = hashlib.sha256(canonical).hexdigest()
+        await db_service.create_user_doc(user_id, CONTEXTS_COLLECTION, context_id, self._encode(canonical))
+        return {"context_id": context_id, **{key: context[key] for key in VOLATILE_KEYS if key in context}}
+
+    async def load(self, user_id: str, chat: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The context a chat row refers to (or still embeds, for rows written before snapshots)"""
+        if "context" in chat:
+            return chat["context"]
+        if not chat.get("context_id"):
+            return None
+        snapshot = await db_service.get_user_doc(user_id, CONTEXTS_COLLECTION, chat["context_id"])
+        if not snapshot:
+            logger.warning(f"Chat context {chat['context_id']} of user {user_id} is missing")
+            return None
+        context = self._decode(snapshot)
+        context.update({key: chat[key] for key in VOLATILE_KEYS if key in chat})
+        return context
+
+
+class UserContextCache:
+    """
+    The context FitMentor builds for each user, kept in the shared cache for
+    USER_CONTEXT_CACHE_TTL_SECONDS and evicted when db_service writes one of its sources
+    """
+
+    # What the context is built from; None is the users row
+    SOURCES = (None, "tracking", "plans", "ml_insights")
+
+    def __init__(self):
+        self.cache = Cache("user_context", ttl=settings.USER_CONTEXT_CACHE_TTL_SECONDS)
+
+    async def get_or_build(self, user_id: str, build: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        # An empty context means the build failed
+        return await self.cache.get_or_set(user_id, build, ttl=settings.USER_CONTEXT_CACHE_TTL_SECONDS, cache_if=bool)
+
+    async def invalidate(self, user_id: str, collection: Optional[str] = None) -> None:
+        if collection in self.SOURCES:
+            await self.cache.delete(user_id)
+
+
+# Global instances
+chat_context_service = ChatContextService()
+user_context_cache = UserContextCache()
+add_write_listener(user_context_cache.invalidate)
@@ -0,0 +1,188 @@
+"""
+Shared health news and research feeds for Blinderfit Backend
+Every user gets the same results for these searches, so a background refresher re-runs them
+every FEED_REFRESH_INTERVAL_SECONDS and keeps the latest FEED_MAX_ITEMS items per feed in
+`global_documents` (shared by the workers) and in memory (so a request is a dict lookup).
+Registered feeds are always refreshed; of the feeds requested on demand (research topics),
+only the FEED_MAX_TOPICS most recently requested are, the others when requested again.
+A failed refresh keeps serving the previous items.
+"""
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import db_service, spawn_detached
+
+logger = logging.getLogger(__name__)
+
+FEEDS_COLLECTION = "feeds"
+# Feeds nobody has asked this worker for in this long are no longer refreshed by it
+IDLE_FEED_SECONDS = 7 * 24 * 3600
+
+Fetcher = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class FeedService:
+    """Latest items per feed, refreshed in the background instead of on each request"""
+
+    def __init__(self):
+        # feed -> {"items", "refreshed_at"}: what requests are answered from
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Feeds refreshed whether or not anyone asked for them
+        self._registered: Dict[str, Fetcher] = {}
+        # Feeds requested on demand, least recently requested first; capped at FEED_MAX_TOPICS
+        self._topics: "OrderedDict[str, Fetcher]" = OrderedDict()
+        self._last_requested: Dict[str, float] = {}
+        # feed -> the read of global_documents / the search in flight, which concurrent callers share
+        self._loading: Dict[str, "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+        self._refreshing: Dict[str, "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def register(self, feed: str, fetch: Fetcher) -> None:
+        """Refresh `feed` in the background whether or not it is requested"""
+        self._registered[feed] = fetch
+
+    async def get(self, feed: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        """
+        The feed's latest entry ({"items", "refreshed_at"}), or None when it has never been
+        fetched and fetching fails. A feed not yet known to this worker is loaded from
+        global_documents, or fetched by `fetch` once. `fetch` must depend on `feed` alone:
+        every request for the feed is answered from whichever caller's `fetch` ran.
+        """
+        fetch = self._registered.get(feed) or self._requested(feed, fetch)
+        entry = self._entries.get(feed)
+        if entry is not None:
+            return entry
+        # Shielded: a caller that goes away does not cancel the load the others wait on
+        return await asyncio.shield(self._single_flight(self._loading, feed, lambda: self._load(feed, fetch)))
+
+    def _requested(self, feed: str, fetch: Fetcher) -> Fetcher:
+        """Move an on-demand feed to the front; past FEED_MAX_TOPICS the least recently requested is forgotten"""
+        fetch = self._topics.setdefault(feed, fetch)
+        self._topics.move_to_end(feed)
+        self._last_requested[feed] = time.monotonic()
+        while len(self._topics) > settings.FEED_MAX_TOPICS:
+            self._forget(next(iter(self._topics)))
+        return fetch
+
+    def _forget(self, feed: str) -> None:
+        for registry in (self._topics, self._entries, self._last_requested):
+            registry.pop(feed, None)
+
+    def _keep(self, feed: str, entry: Dict[str, Any]) -> None:
+        # A feed forgotten meanwhile is not held in memory; its next request reads it again
+        if feed in self._registered or feed in self._topics:
+            self._entries[feed] = entry
+
+    @staticmethod
+    def _single_flight(
+        tasks: Dict[str, "asyncio.Task[Optional[Dict[str, Any]]]"],
+        feed: str,
+        run: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+    ) -> "asyncio.Task[Optional[Dict[str, Any]]]":
+        inflight = tasks.get(feed)
+        if inflight is not None:
+            return inflight
+        task = spawn_detached(run())
+        tasks[feed] = task
+        task.add_done_callback(lambda _: tasks.pop(feed, None))
+        return task
+
+    @staticmethod
+    def _is_fresh(entry: Dict[str, Any]) -> bool:
+        try:
+            age = datetime.utcnow() - datetime.fromisoformat(entry["refreshed_at"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return age.total_seconds() < settings.FEED_REFRESH_INTERVAL_SECONDS
+
+    async def _read_stored(self, feed: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await db_service.get_global_doc(FEEDS_COLLECTION, feed)
+        except Exception as e:
+            logger.error(f"Error reading feed {feed}: {e}")
+            return None
+
+    async def _load(self, feed: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        stored = await self._read_stored(feed)
+        if stored and stored.get("items"):
+            self._keep(feed, stored)
+            if not self._is_fresh(stored):
+                # Served stale right away; the search runs in the background
+                self._single_flight(self._refreshing, feed, lambda: self._refresh(feed, fetch))
+            return stored
+        # Nothing to serve yet, so this one request waits for the search
+        return await self._single_flight(self._refreshing, feed, lambda: self._refresh(feed, fetch))
+
+    async def _refresh(self, feed: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        """Fetch the feed again; on failure or no results the previous entry stays in place"""
+        try:
+            items = await fetch()
+        except Exception as e:
+            logger.error(f"Error refreshing feed {feed}: {e}")
+            items = []
+        if not items:
+            logger.warning(f"Feed {feed} refresh returned nothing; serving the previous items")
+            return self._entries.get(feed)
+        entry = {"items": items[:settings.FEED_MAX_ITEMS], "refreshed_at": datetime.utcnow().isoformat()}
+        self._keep(feed, entry)
+        try:
+            await db_service.set_global_doc(FEEDS_COLLECTION, feed, entry)
+        except Exception as e:
+            logger.error(f"Error storing feed {feed}: {e}")
+        return entry
+
+    async def _refresh_if_stale(self, feed: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        # Another worker may have refreshed it already; then its items are adopted instead
+        stored = await self._read_stored(feed)
+        if stored and stored.get("items") and self._is_fresh(stored):
+            self._keep(feed, stored)
+            return stored
+        return await self._refresh(feed, fetch)
+
+    async def refresh_all(self) -> None:
+        """Bring the registered and recently requested feeds up to date, forgetting ones that went idle"""
+        now = time.monotonic()
+        for feed, last_requested in list(self._last_requested.items()):
+            if now - last_requested > IDLE_FEED_SECONDS:
+                self._forget(feed)
+        for feed, fetch in [*self._registered.items(), *self._topics.items()]:
+            await self._single_flight(self._refreshing, feed, lambda: self._refresh_if_stale(feed, fetch))
+
+    async def start_refresh_task(self):
+        """Start the background refresher"""
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self._periodic_refresh())
+
+    async def stop_refresh_task(self):
+        """Stop the background refresher"""
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    async def _periodic_refresh(self):
+        # Only the first run is jittered, so workers started together do not all find the feeds
+        # stale at the same moment. Later runs are exactly one interval apart: a jittered sleep
+        # could land just short of the interval, see a still-fresh entry, skip it and refresh a
+        # whole interval later.
+        await asyncio.sleep(settings.FEED_REFRESH_INTERVAL_SECONDS * random.uniform(0, 0.1))
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Error in feed refresh: {e}")
+            await asyncio.sleep(settings.FEED_REFRESH_INTERVAL_SECONDS)
+
+
+# Global instance
+feed_service = FeedService()
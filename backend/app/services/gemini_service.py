@@ -3,13 +3,26 @@ Gemini AI service for Blinderfit
 """
 
 import google.generativeai as genai
+import hashlib
 import json
 import logging
 from typing import Dict, List, Any, Optional
+from app.core.cache import Cache
 from app.core.config import settings
+from app.core.database import release_unit_of_work
 
 logger = logging.getLogger(__name__)
 
+# What generate_response returns instead of model output when there is none
+EMPTY_RESPONSE_MESSAGE = "I apologize, but I couldn't generate a response at this time."
+ERROR_RESPONSE_MESSAGE = "I apologize, but I'm experiencing technical difficulties. Please try again later."
+
+
+def is_fallback_response(text: str) -> bool:
+    """Whether generate_response/generate_content gave up; such text must not be stored as an answer"""
+    return text in (EMPTY_RESPONSE_MESSAGE, ERROR_RESPONSE_MESSAGE)
+
+
 class GeminiService:
     """Service for interacting with Google Gemini AI"""
 
@@ -27,6 +40,11 @@ class GeminiService:
             logger.warning("Google Search tool not available, initializing without search capability")
             self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
 
+        # Answers to cache=True calls, keyed by a hash of the whole request
+        self.response_cache = Cache(
+            "gemini_responses", ttl=settings.GEMINI_CACHE_TTL_SECONDS, local_max_entries=settings.GEMINI_CACHE_MAX_ENTRIES
+        )
+
         logger.info(f"Gemini service initialized with model: {settings.GEMINI_MODEL}")
 
     async def generate_response(
@@ -36,9 +54,14 @@ class GeminiService:
         context: Optional[Dict[str, Any]] = None,
         temperature: float = 0.7,
         max_tokens: int = 1000,
-        use_search: bool = False
+        use_search: bool = False,
+        cache: bool = False
     ) -> str:
-        """Generate a response from Gemini"""
+        """
+        Generate a response from Gemini. With cache=True (meant for low-temperature,
+        repeatable prompts) an identical earlier request is answered from the response
+        cache for GEMINI_CACHE_TTL_SECONDS; fallback messages are never cached.
+        """
 
         try:
             # Build the full prompt
@@ -54,57 +77,79 @@ class GeminiService:
             full_prompt += f"User: {prompt}"
 
             # Configure generation parameters
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens,
-                top_p=0.9,
-                top_k=40
-            )
-
-            # Create chat session for tool usage
-            chat = self.model.start_chat()
-
-            # Send message with tool access if search is enabled
-            if use_search:
-                response = await chat.send_message_async(
-                    full_prompt,
-                    generation_config=generation_config
+            config = {"temperature": temperature, "max_output_tokens": max_tokens, "top_p": 0.9, "top_k": 40}
+
+            if cache:
+                text = await self.response_cache.get_or_set(
+                    self._response_cache_key(full_prompt, config, use_search),
+                    lambda: self._generate_text(full_prompt, config, use_search),
+                    ttl=settings.GEMINI_CACHE_TTL_SECONDS,
+                    cache_if=bool,
                 )
-
-                # Handle function calls
-                if hasattr(response, 'function_calls') and response.function_calls:
-                    for function_call in response.function_calls:
-                        if function_call.name == 'google_search':
-                            # Execute the search
-                            search_results = await self._execute_google_search(function_call.args)
-
-                            # Send search results back to continue conversation
-                            follow_up_response = await chat.send_message_async(
-                                f"Search results: {json.dumps(search_results)}",
-                                generation_config=generation_config
-                            )
-
-                            if follow_up_response.text:
-                                return follow_up_response.text.strip()
-                else:
-                    if response.text:
-                        return response.text.strip()
             else:
-                # Regular response without search
-                response = await chat.send_message_async(
-                    full_prompt,
-                    generation_config=generation_config
-                )
+                text = await self._generate_text(full_prompt, config, use_search)
 
-                if response.text:
-                    return response.text.strip()
+            if text:
+                return text
 
             logger.warning("Gemini returned empty response")
-            return "I apologize, but I couldn't generate a response at this time."
+            return EMPTY_RESPONSE_MESSAGE
 
         except Exception as e:
             logger.error(f"Error generating Gemini response: {e}")
-            return "I apologize, but I'm experiencing technical difficulties. Please try again later."
+            return ERROR_RESPONSE_MESSAGE
+
+    @staticmethod
+    def _response_cache_key(full_prompt: str, config: Dict[str, Any], use_search: bool) -> str:
+        """SHA-256 over everything that shapes the answer: model, prompt (system prompt and context included) and config"""
+        request = {"model": settings.GEMINI_MODEL, "prompt": full_prompt, "config": config, "use_search": use_search}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    async def _generate_text(self, full_prompt: str, config: Dict[str, Any], use_search: bool) -> str:
+        """The model's answer, or "" when it returned none"""
+        # The request's transaction is committed first, so its connection is not held for the round trip
+        await release_unit_of_work()
+        generation_config = genai.types.GenerationConfig(**config)
+
+        # Create chat session for tool usage
+        chat = self.model.start_chat()
+
+        # Send message with tool access if search is enabled
+        if use_search:
+            response = await chat.send_message_async(
+                full_prompt,
+                generation_config=generation_config
+            )
+
+            # Handle function calls
+            if hasattr(response, 'function_calls') and response.function_calls:
+                for function_call in response.function_calls:
+                    if function_call.name == 'google_search':
+                        # Execute the search
+                        search_results = await self._execute_google_search(function_call.args)
+
+                        # Send search results back to continue conversation
+                        follow_up_response = await chat.send_message_async(
+                            f"Search results: {json.dumps(search_results)}",
+                            generation_config=generation_config
+                        )
+
+                        if follow_up_response.text:
+                            return follow_up_response.text.strip()
+            else:
+                if response.text:
+                    return response.text.strip()
+        else:
+            # Regular response without search
+            response = await chat.send_message_async(
+                full_prompt,
+                generation_config=generation_config
+            )
+
+            if response.text:
+                return response.text.strip()
+
+        return ""
 
     async def _execute_google_search(self, search_args: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Execute Google Search using Gemini's built-in tool"""
@@ -161,8 +206,8 @@ class GeminiService:
             logger.error(f"Error in web search: {e}")
             return []
 
-    async def search_web_with_gemini(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
-        """Search the web using Gemini's Google Search tool"""
+    async def search_web_with_gemini(self, query: str, num_results: int = 5, cache: bool = True) -> List[Dict[str, Any]]:
+        """Search the web using Gemini's Google Search tool; cache=False for searches that must be current"""
         try:
             system_prompt = """
             You are a web search assistant. Use the Google Search tool to find relevant,
@@ -187,7 +232,8 @@ class GeminiService:
                 system_prompt=system_prompt,
                 temperature=0.1,
                 max_tokens=2000,
-                use_search=True
+                use_search=True,
+                cache=cache
             )
 
             # Parse the response into structured results
@@ -235,7 +281,8 @@ class GeminiService:
                 system_prompt=system_prompt,
                 temperature=0.1,
                 max_tokens=2000,
-                use_search=False  # Don't use search tool
+                use_search=False,  # Don't use search tool
+                cache=True
             )
 
             # Parse the response into structured results
@@ -441,7 +488,8 @@ class GeminiService:
             prompt=prompt,
             system_prompt=system_prompt,
             temperature=0.1,
-            max_tokens=1500
+            max_tokens=1500,
+            cache=True
         )
 
         return {
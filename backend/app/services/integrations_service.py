@@ -4,18 +4,24 @@ Handles external integrations like wearables, web search, and third-party APIs.
 Uses PostgreSQL (via db_service) instead of Firestore.
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import functools
 import httpx
 import json
 import logging
 from datetime import datetime, timedelta
 import uuid
 
-from app.core.database import db_service
-from app.services.gemini_service import gemini_service
+from app.core.config import settings
+from app.core.database import db_service, InvalidCursorError
+from app.services.feed_service import feed_service
+from app.services.gemini_service import gemini_service, is_fallback_response
+from app.services.knowledge_service import EXERCISE_COLLECTION, NUTRITION_COLLECTION, knowledge_service, normalize_phrase
 
 logger = logging.getLogger(__name__)
 
+HEALTH_NEWS_FEED = "health_news"
+
 
 class IntegrationsService:
     """Service for handling external integrations"""
@@ -29,40 +35,56 @@ class IntegrationsService:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.http_client.aclose()
 
-    async def search_web(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
+    async def search_web(self, query: str, num_results: int = 5, cache: bool = True) -> List[Dict[str, Any]]:
         try:
-            return await gemini_service.search_web_with_gemini(query, num_results)
+            return await gemini_service.search_web_with_gemini(query, num_results, cache=cache)
         except Exception as e:
             logger.error(f"Error searching web: {e}")
             return []
 
     async def get_nutrition_info(self, food_item: str) -> Dict[str, Any]:
+        """Nutrition per 100g, from the shared knowledge store; only an item's first lookup calls Gemini"""
         try:
-            search_results = await self.search_web(f"nutrition facts for {food_item} per 100g", num_results=3)
-            prompt = f"""Based on search results about {food_item}, extract nutrition per 100g:
-            {json.dumps(search_results, indent=2)}
-            Provide: Calories, Protein, Carbs, Fat, Fiber, Sugar. Format as JSON."""
-            response = await gemini_service.generate_content(prompt)
-            try:
-                nutrition_data = json.loads(response)
-            except json.JSONDecodeError:
-                nutrition_data = {"raw_data": response}
-            return {"food_item": food_item, "nutrition": nutrition_data, "source": "web_search", "timestamp": datetime.utcnow().isoformat()}
+            entry = await knowledge_service.lookup(NUTRITION_COLLECTION, food_item, self._fetch_nutrition_info)
+            if entry is None:
+                return {}
+            return {"food_item": food_item, "nutrition": entry["result"], "source": "web_search", "timestamp": entry["fetched_at"]}
         except Exception as e:
             logger.error(f"Error getting nutrition info: {e}")
             return {}
 
+    async def _fetch_nutrition_info(self, food_item: str) -> Optional[Dict[str, Any]]:
+        search_results = await self.search_web(f"nutrition facts for {food_item} per 100g", num_results=3)
+        prompt = f"""Based on search results about {food_item}, extract nutrition per 100g:
+        {json.dumps(search_results, indent=2)}
+        Provide: Calories, Protein, Carbs, Fat, Fiber, Sugar. Format as JSON."""
+        response = await gemini_service.generate_content(prompt)
+        if is_fallback_response(response):
+            return None
+        try:
+            # The model often wraps JSON in a ```json fence
+            return json.loads(response.strip().removeprefix("```json").strip("`"))
+        except json.JSONDecodeError:
+            return {"raw_data": response}
+
     async def get_exercise_info(self, exercise_name: str) -> Dict[str, Any]:
+        """Form, muscles and variations, from the shared knowledge store; only an exercise's first lookup calls Gemini"""
         try:
-            search_results = await self.search_web(f"how to do {exercise_name} exercise properly", num_results=3)
-            prompt = f"""Based on info about {exercise_name}, provide: form, target muscles, common mistakes, variations, benefits.
-            {json.dumps(search_results, indent=2)}"""
-            response = await gemini_service.generate_content(prompt)
-            return {"exercise": exercise_name, "information": response, "source": "web_search", "timestamp": datetime.utcnow().isoformat()}
+            entry = await knowledge_service.lookup(EXERCISE_COLLECTION, exercise_name, self._fetch_exercise_info)
+            if entry is None:
+                return {}
+            return {"exercise": exercise_name, "information": entry["result"], "source": "web_search", "timestamp": entry["fetched_at"]}
         except Exception as e:
             logger.error(f"Error getting exercise info: {e}")
             return {}
 
+    async def _fetch_exercise_info(self, exercise_name: str) -> Optional[str]:
+        search_results = await self.search_web(f"how to do {exercise_name} exercise properly", num_results=3)
+        prompt = f"""Based on info about {exercise_name}, provide: form, target muscles, common mistakes, variations, benefits.
+        {json.dumps(search_results, indent=2)}"""
+        response = await gemini_service.generate_content(prompt)
+        return None if is_fallback_response(response) else response
+
     async def sync_fitbit_data(self, user_id: str, access_token: str) -> Dict[str, Any]:
         try:
             base_url = "https://api.fitbit.com/1/user/-/"
@@ -93,7 +115,7 @@ class IntegrationsService:
             }
 
             doc_id = str(uuid.uuid4())
-            db_service.set_user_doc(user_id, "wearable_data", doc_id, {"source": "fitbit", "data": processed_data, "date": today, "created_at": datetime.utcnow().isoformat()})
+            await db_service.set_user_doc(user_id, "wearable_data", doc_id, {"source": "fitbit", "data": processed_data, "date": today, "created_at": datetime.utcnow().isoformat()})
             return processed_data
         except Exception as e:
             logger.error(f"Error syncing Fitbit data: {e}")
@@ -117,7 +139,7 @@ class IntegrationsService:
             }
 
             doc_id = str(uuid.uuid4())
-            db_service.set_user_doc(user_id, "wearable_data", doc_id, {"source": "garmin", "data": processed_data, "date": today, "created_at": datetime.utcnow().isoformat()})
+            await db_service.set_user_doc(user_id, "wearable_data", doc_id, {"source": "garmin", "data": processed_data, "date": today, "created_at": datetime.utcnow().isoformat()})
             return processed_data
         except Exception as e:
             logger.error(f"Error syncing Garmin data: {e}")
@@ -147,16 +169,23 @@ class IntegrationsService:
             return {}
 
     async def get_health_news(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """The latest health news from the shared feed the background refresher keeps current"""
         try:
-            results = await self.search_web("latest health and fitness news", num_results=limit)
-            return [{"title": r.get("title", ""), "url": r.get("url", ""), "description": r.get("description", ""), "source": "web_search", "timestamp": datetime.utcnow().isoformat()} for r in results]
+            entry = await feed_service.get(HEALTH_NEWS_FEED, self._fetch_health_news)
+            if entry is None:
+                return []
+            return [{"title": r.get("title", ""), "url": r.get("url", ""), "description": r.get("description", ""), "source": "web_search", "timestamp": entry["refreshed_at"]} for r in entry["items"][:limit]]
         except Exception as e:
             logger.error(f"Error getting health news: {e}")
             return []
 
+    async def _fetch_health_news(self) -> List[Dict[str, Any]]:
+        # Uncached: the refresher runs this to pick up new articles
+        return await self.search_web("latest health and fitness news", num_results=settings.FEED_MAX_ITEMS, cache=False)
+
     async def analyze_trends(self, user_id: str, data_type: str = "weight") -> Dict[str, Any]:
         try:
-            tracking_data = db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=30)
+            tracking_data = await db_service.query_user_docs(user_id, "tracking", order_by="date", order_dir="DESC", limit_count=30)
             data_points = [{"date": d.get("date"), "value": d.get(data_type)} for d in tracking_data if data_type in d]
             if not data_points:
                 return {"error": "No data available for analysis"}
@@ -171,30 +200,50 @@ class IntegrationsService:
             return {"error": str(e)}
 
     async def get_research_papers(self, topic: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """Recent papers on `topic` from its shared feed; a topic's first request starts the feed"""
+        # Feed and search both come from the normalized topic, so each spelling of a topic gets the same papers
+        phrase = normalize_phrase(topic)
+        if not phrase:
+            return []
         try:
-            results = await self.search_web(f"scientific research papers on {topic} health", num_results=limit)
-            return [{"title": r.get("title", ""), "url": r.get("url", ""), "abstract": r.get("description", ""), "topic": topic, "timestamp": datetime.utcnow().isoformat()} for r in results]
+            entry = await feed_service.get(f"research:{phrase}", functools.partial(self._fetch_research_papers, phrase))
+            if entry is None:
+                return []
+            return [{"title": r.get("title", ""), "url": r.get("url", ""), "abstract": r.get("description", ""), "topic": topic, "timestamp": entry["refreshed_at"]} for r in entry["items"][:limit]]
         except Exception as e:
             logger.error(f"Error getting research papers: {e}")
             return []
 
+    async def _fetch_research_papers(self, phrase: str) -> List[Dict[str, Any]]:
+        return await self.search_web(f"scientific research papers on {phrase} health", num_results=settings.FEED_MAX_ITEMS, cache=False)
+
     async def store_integration_data(self, user_id: str, integration_type: str, data: Dict[str, Any]) -> str:
         try:
             doc_id = str(uuid.uuid4())
-            db_service.set_user_doc(user_id, "integrations", doc_id, {"type": integration_type, "data": data, "created_at": datetime.utcnow().isoformat()})
+            await db_service.set_user_doc(user_id, "integrations", doc_id, {"type": integration_type, "data": data, "created_at": datetime.utcnow().isoformat()})
             return doc_id
         except Exception as e:
             logger.error(f"Error storing integration data: {e}")
             return ""
 
     async def get_integration_history(self, user_id: str, integration_type: str = None, limit: int = 10) -> List[Dict[str, Any]]:
+        integrations, _ = await self.get_integration_history_page(user_id, integration_type, limit)
+        return integrations
+
+    async def get_integration_history_page(self, user_id: str, integration_type: str = None, limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of stored integration records, newest first, and the cursor for the next page"""
         try:
             filters = {"type": integration_type} if integration_type else None
-            return db_service.query_user_docs(user_id, "integrations", filters=filters, order_by="created_at", order_dir="DESC", limit_count=limit)
+            return await db_service.query_user_docs_page(
+                user_id, "integrations", filters=filters, order_by="created_at", order_dir="DESC", limit_count=limit, cursor=cursor
+            )
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Error getting integration history: {e}")
-            return []
+            return [], None
 
 
 # Global instance
 integrations_service = IntegrationsService()
+feed_service.register(HEALTH_NEWS_FEED, integrations_service._fetch_health_news)
@@ -0,0 +1,110 @@
+"""
+Shared food and exercise knowledge for Blinderfit Backend
+Lookups whose answer is the same for every user ("banana", "squat") are stored in
+`global_documents` under a normalized key. The first lookup of an item pays for the
+LLM calls; later ones read a single row, and stale entries are refreshed in the background.
+"""
+
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import db_service, spawn_detached
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_COLLECTION = "nutrition_knowledge"
+EXERCISE_COLLECTION = "exercise_knowledge"
+
+# Words whose trailing "s" is not a plural ("hummus", "swiss", "press", "lentils" is)
+_SINGULAR_S_ENDINGS = ("ss", "us", "is")
+
+Fetcher = Callable[[str], Awaitable[Optional[Any]]]
+
+
+def normalize_phrase(name: str) -> str:
+    """Lowercase, punctuation-free and single-spaced, so "HIIT!" and " hiit " read the same"""
+    return " ".join(re.sub(r"[^\w\s]", " ", name.lower()).split())
+
+
+def normalize_key(name: str) -> str:
+    """
+    normalize_phrase, made singular, so "Bananas", " banana " and "banana!" share one entry
+    """
+    words = normalize_phrase(name).split()
+    if words:
+        last = words[-1]
+        if len(last) > 4 and last.endswith("ies"):
+            words[-1] = last[:-3] + "y"
+        elif len(last) > 3 and last.endswith("s") and not last.endswith(_SINGULAR_S_ENDINGS):
+            words[-1] = last[:-1]
+    return " ".join(words)
+
+
+class KnowledgeService:
+    """Read-through store of per-item answers in global_documents, one fetch per item at a time"""
+
+    def __init__(self):
+        # (collection, key) -> the fetch in flight; concurrent misses wait on it instead of fetching again
+        self._inflight: Dict[Tuple[str, str], "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+
+    @staticmethod
+    def _is_stale(entry: Dict[str, Any]) -> bool:
+        try:
+            fetched_at = datetime.fromisoformat(entry["fetched_at"])
+        except (KeyError, TypeError, ValueError):
+            return True
+        return datetime.utcnow() - fetched_at > timedelta(days=settings.KNOWLEDGE_REFRESH_DAYS)
+
+    async def lookup(self, collection: str, name: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        """
+        The stored entry for `name` ({"key", "result", "fetched_at"}), or None when it is
+        not stored and `await fetch(name)` fails. The normalized key only stores and dedups:
+        `fetch` gets `name` as the caller spelled it ("cookies", not the key "cooky") and
+        returns the result to store, or None when there is nothing worth keeping.
+        """
+        key = normalize_key(name)
+        if not key:
+            return None
+        try:
+            entry = await db_service.get_global_doc(collection, key)
+        except Exception as e:
+            logger.error(f"Error reading {collection}/{key}: {e}")
+            entry = None
+        if entry:
+            if self._is_stale(entry):
+                self._start_fetch(collection, key, name, fetch)
+            return entry
+        # Shielded: a caller that goes away does not cancel the fetch the others wait on
+        return await asyncio.shield(self._start_fetch(collection, key, name, fetch))
+
+    def _start_fetch(self, collection: str, key: str, name: str, fetch: Fetcher) -> "asyncio.Task[Optional[Dict[str, Any]]]":
+        inflight = self._inflight.get((collection, key))
+        if inflight is not None:
+            return inflight
+        task = spawn_detached(self._fetch_and_store(collection, key, name, fetch))
+        self._inflight[(collection, key)] = task
+        task.add_done_callback(lambda _: self._inflight.pop((collection, key), None))
+        return task
+
+    async def _fetch_and_store(self, collection: str, key: str, name: str, fetch: Fetcher) -> Optional[Dict[str, Any]]:
+        try:
+            result = await fetch(name)
+        except Exception as e:
+            logger.error(f"Error fetching {collection}/{key}: {e}")
+            return None
+        if result is None:
+            return None
+        entry = {"key": key, "result": result, "fetched_at": datetime.utcnow().isoformat()}
+        try:
+            await db_service.set_global_doc(collection, key, entry)
+        except Exception as e:
+            logger.error(f"Error storing {collection}/{key}: {e}")
+        return entry
+
+
+# Global instance
+knowledge_service = KnowledgeService()
@@ -16,6 +16,29 @@ logger = logging.getLogger(__name__)
 class NotificationService:
     """Service for handling notifications (stored in PostgreSQL)"""
 
+    @staticmethod
+    def _build_notification(
+        user_id: str,
+        title: str,
+        message: str,
+        notification_type: str = "general",
+        data: Optional[Dict[str, Any]] = None,
+        scheduled_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "type": notification_type,
+            "title": title,
+            "message": message,
+            "scheduled_at": (scheduled_at or now).isoformat(),
+            "sent_at": now.isoformat() if not scheduled_at or scheduled_at <= now else None,
+            "read_at": None,
+            "data": data or {},
+            "created_at": now.isoformat()
+        }
+
     async def send_notification(
         self,
         user_id: str,
@@ -27,22 +50,9 @@ class NotificationService:
     ) -> str:
         """Create and store a notification for a user"""
         try:
-            notification_id = str(uuid.uuid4())
-            notification_data = {
-                "id": notification_id,
-                "user_id": user_id,
-                "type": notification_type,
-                "title": title,
-                "message": message,
-                "scheduled_at": (scheduled_at or datetime.utcnow()).isoformat(),
-                "sent_at": datetime.utcnow().isoformat() if not scheduled_at or scheduled_at <= datetime.utcnow() else None,
-                "read_at": None,
-                "data": data or {},
-                "created_at": datetime.utcnow().isoformat()
-            }
-
-            db_service.set_user_doc(user_id, "notifications", notification_id, notification_data)
-            return notification_id
+            notification_data = self._build_notification(user_id, title, message, notification_type, data, scheduled_at)
+            await db_service.set_user_doc(user_id, "notifications", notification_data["id"], notification_data)
+            return notification_data["id"]
 
         except Exception as e:
             logger.error(f"Error sending notification: {e}")
@@ -93,7 +103,7 @@ class NotificationService:
     async def schedule_daily_notifications(self, user_id: str) -> List[str]:
         """Schedule daily notifications for a user"""
         notification_ids = []
-        user_data = db_service.get_user(user_id)
+        user_data = await db_service.get_user(user_id)
         if not user_data:
             return []
 
@@ -133,30 +143,35 @@ class NotificationService:
 
     async def mark_notification_read(self, user_id: str, notification_id: str) -> bool:
         try:
-            db_service.update_user_doc(user_id, "notifications", notification_id, {"read_at": datetime.utcnow().isoformat()})
-            return True
+            return await db_service.update_user_doc(
+                user_id, "notifications", notification_id, {"read_at": datetime.utcnow().isoformat()}, upsert=False
+            )
         except Exception as e:
             logger.error(f"Error marking notification as read: {e}")
             return False
 
     async def get_unread_notifications(self, user_id: str) -> List[Dict[str, Any]]:
         try:
-            all_notifs = db_service.query_user_docs(user_id, "notifications", order_by="created_at", order_dir="DESC")
-            return [n for n in all_notifs if n.get('read_at') is None]
+            return [
+                n async for n in db_service.stream_user_docs(
+                    user_id, "notifications", filters={"read_at": None}, order_by="created_at", order_dir="DESC"
+                )
+            ]
         except Exception as e:
             logger.error(f"Error getting unread notifications: {e}")
             return []
 
     async def send_bulk_notifications(self, user_ids: List[str], title: str, message: str, notification_type: str = "bulk") -> Dict[str, int]:
-        results = {"successful": 0, "failed": 0}
-        for user_id in user_ids:
-            try:
-                await self.send_notification(user_id=user_id, title=title, message=message, notification_type=notification_type)
-                results["successful"] += 1
-            except Exception as e:
-                logger.error(f"Failed to send notification to {user_id}: {e}")
-                results["failed"] += 1
-        return results
+        """Store one notification per user with batched multi-row inserts"""
+        notifications = [self._build_notification(user_id, title, message, notification_type) for user_id in user_ids]
+        try:
+            written = await db_service.set_user_docs_many(
+                (n["user_id"], "notifications", n["id"], n) for n in notifications
+            )
+            return {"successful": written, "failed": 0}
+        except Exception as e:
+            logger.error(f"Failed to send bulk notifications to {len(user_ids)} users: {e}")
+            return {"successful": 0, "failed": len(user_ids)}
 
 
 # Global instance
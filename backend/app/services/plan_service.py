@@ -0,0 +1,139 @@
+"""
+Plan storage service for Blinderfit Backend
+A plan is a header document in `plans` plus one `plan_days` document per day,
+so a single day is a point lookup instead of a scan of the whole plan.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from datetime import date, timedelta
+
+from app.core.database import db_service, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+PLANS_COLLECTION = "plans"
+PLAN_DAYS_COLLECTION = "plan_days"
+# Headers written in the split layout; older plans embed daily_plans and are split when first read
+PLAN_LAYOUT = "plan_days"
+
+# Keys a plan_days document carries besides the daily plan itself
+_DAY_KEYS = ("_id", "plan_id", "week_number")
+
+
+def plan_day_id(plan_id: str, day: str) -> str:
+    """plan_days doc id: `{plan_id}:{ISO date}`, so one plan's days are a contiguous doc_id range"""
+    return f"{plan_id}:{day}"
+
+
+def _plan_day_range(plan_id: str) -> Tuple[str, str]:
+    # ';' sorts right after ':', bounding every `{plan_id}:...` id; user_documents.doc_id
+    # has the C collation so this holds whatever the database collation is
+    return f"{plan_id}:", f"{plan_id};"
+
+
+def _day_date(daily_plan: Dict[str, Any], week: Dict[str, Any], index: int) -> Optional[str]:
+    """A daily plan's ISO date: its own, else its week's start plus its position; None when neither parses"""
+    for value, offset in ((daily_plan.get("date"), 0), (week.get("week_start"), index)):
+        try:
+            return (date.fromisoformat(str(value)[:10]) + timedelta(days=offset)).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+class PlanService:
+    """Reads and writes plans in the header + per-day layout"""
+
+    @staticmethod
+    def split_plan(plan_id: str, plan: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, Dict[str, Any]]]]:
+        """A nested plan as (header without daily_plans, [(plan_days doc id, day document)])"""
+        header = {key: value for key, value in plan.items() if key not in ("weekly_plans", "_id")}
+        header["weekly_plans"] = []
+        header["layout"] = PLAN_LAYOUT
+        days = []
+        for week in plan.get("weekly_plans", []):
+            week_number = week.get("week_number", len(header["weekly_plans"]) + 1)
+            header["weekly_plans"].append(
+                {**{key: value for key, value in week.items() if key != "daily_plans"}, "week_number": week_number}
+            )
+            for index, daily_plan in enumerate(week.get("daily_plans", [])):
+                # Older plans may lack a day's date; they are split lazily on read, so this must not raise
+                day = _day_date(daily_plan, week, index)
+                if day is None:
+                    logger.warning(f"Skipping undated day {index + 1} of week {week_number} in plan {plan_id}")
+                    continue
+                day_doc = {**daily_plan, "plan_id": plan_id, "week_number": week_number}
+                if not daily_plan.get("date"):
+                    day_doc["date"] = day
+                days.append((plan_day_id(plan_id, day), day_doc))
+        return header, days
+
+    @staticmethod
+    def _daily_plan(day_doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in day_doc.items() if key not in _DAY_KEYS}
+
+    async def save_plan(self, user_id: str, plan_id: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Write a nested plan as its header and day documents in one transaction; returns the header"""
+        header, days = self.split_plan(plan_id, plan)
+        await db_service.set_user_docs_many([
+            (user_id, PLANS_COLLECTION, plan_id, header),
+            *((user_id, PLAN_DAYS_COLLECTION, doc_id, day_doc) for doc_id, day_doc in days),
+        ])
+        return header
+
+    async def _upgrade(self, user_id: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Split a plan stored before the per-day layout; returns its header"""
+        plan_id = plan["_id"]
+        logger.info(f"Splitting plan {plan_id} of user {user_id} into per-day documents")
+        header = await self.save_plan(user_id, plan_id, plan)
+        header["_id"] = plan_id
+        return header
+
+    async def get_active_plan(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The active plan's header (weekly metadata, no daily plans), or None"""
+        active_plans = await db_service.query_user_docs(user_id, "plans", filters={"is_active": True}, limit_count=1)
+        if not active_plans:
+            return None
+        plan = active_plans[0]
+        return plan if plan.get("layout") == PLAN_LAYOUT else await self._upgrade(user_id, plan)
+
+    async def get_active_plan_day(self, user_id: str, day: date) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """(active plan header, its daily plan for `day` or None); the header is None without an active plan"""
+        plan = await self.get_active_plan(user_id)
+        if not plan:
+            return None, None
+        day_doc = await db_service.get_user_doc(user_id, PLAN_DAYS_COLLECTION, plan_day_id(plan["_id"], day.isoformat()))
+        return plan, self._daily_plan(day_doc) if day_doc else None
+
+    async def assemble_plan(self, user_id: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """A header with its weeks' daily_plans filled back in from one doc_id range read"""
+        if plan.get("layout") != PLAN_LAYOUT:
+            return plan
+        days = await db_service.get_user_docs_range(user_id, PLAN_DAYS_COLLECTION, *_plan_day_range(plan["_id"]))
+        by_week: Dict[Any, List[Dict[str, Any]]] = {}
+        for day_doc in days:
+            by_week.setdefault(day_doc.get("week_number"), []).append(self._daily_plan(day_doc))
+        weekly_plans = [
+            {**week, "daily_plans": by_week.get(week.get("week_number"), [])} for week in plan.get("weekly_plans", [])
+        ]
+        return {**plan, "weekly_plans": weekly_plans}
+
+    async def get_plan(self, user_id: str, plan_id: str) -> Optional[Dict[str, Any]]:
+        """The full nested plan, or None"""
+        plan = await db_service.get_user_doc(user_id, PLANS_COLLECTION, plan_id)
+        if not plan:
+            return None
+        if plan.get("layout") != PLAN_LAYOUT:
+            await self._upgrade(user_id, plan)
+            return plan
+        return await self.assemble_plan(user_id, plan)
+
+    async def delete_plan(self, user_id: str, plan_id: str) -> None:
+        async with unit_of_work():
+            await db_service.delete_user_docs_range(user_id, PLAN_DAYS_COLLECTION, *_plan_day_range(plan_id))
+            await db_service.delete_user_doc(user_id, PLANS_COLLECTION, plan_id)
+
+
+# Global instance
+plan_service = PlanService()
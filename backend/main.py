@@ -2,18 +2,22 @@
 Main FastAPI application for Blinderfit Backend
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import init_database
+from app.core.cache import init_cache, close_cache
+from app.core.database import init_database, close_database, request_unit_of_work, NEXT_CURSOR_HEADER
+from app.core.metrics import mark_worker_stopped, metrics_response
+from app.services.integrations_service import feed_service
 from app.middleware import (
     SecurityHeadersMiddleware,
     RequestLoggingMiddleware,
     IPFilterMiddleware,
+    QueryStatsMiddleware,
     rate_limit_middleware
 )
 from app.routes import (
@@ -42,17 +46,25 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Blinderfit Backend...")
     await init_database()
     logger.info("PostgreSQL database initialized successfully")
+    await init_cache()
 
     # Start rate limiting cleanup task
     await rate_limit_middleware.start_cleanup_task()
     logger.info("Rate limiting initialized")
 
+    # Keep the shared health news and research feeds current (integrations_service registers them)
+    await feed_service.start_refresh_task()
+
     yield
 
     # Shutdown
     logger.info("Shutting down Blinderfit Backend...")
+    await feed_service.stop_refresh_task()
     await rate_limit_middleware.stop_cleanup_task()
     logger.info("Rate limiting cleanup completed")
+    await close_cache()
+    await close_database()
+    mark_worker_stopped()
 
 # Create FastAPI app
 app = FastAPI(
@@ -69,6 +81,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Add security middleware
@@ -77,6 +90,7 @@ app.add_middleware(
     allowed_origins=settings.ALLOWED_ORIGINS
 )
 app.add_middleware(RequestLoggingMiddleware)
+app.add_middleware(QueryStatsMiddleware)
 # app.add_middleware(IPFilterMiddleware, allowed_ips=["127.0.0.1", "localhost"])  # Uncomment to enable IP filtering
 
 # Add rate limiting
@@ -102,6 +116,12 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "version": "1.0.0"}
 
+# Prometheus metrics (connection pools)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return metrics_response()
+
 # API info endpoint
 @app.get("/")
 async def root():
@@ -114,15 +134,19 @@ async def root():
     }
 
 # Include routers
-app.include_router(auth, prefix="/auth", tags=["Authentication"])
-app.include_router(onboarding, prefix="/onboarding", tags=["Onboarding"])
+# Each request shares one database session and commits once. Gemini calls commit the work so
+# far and release the connection first (release_unit_of_work), so no transaction stays open
+# across a model round trip. AI chat keeps per-call sessions.
+unit_of_work = [Depends(request_unit_of_work)]
+app.include_router(auth, prefix="/auth", tags=["Authentication"], dependencies=unit_of_work)
+app.include_router(onboarding, prefix="/onboarding", tags=["Onboarding"], dependencies=unit_of_work)
 app.include_router(ai_chat, prefix="/ai", tags=["AI Chat"])
-app.include_router(plans, prefix="/plans", tags=["Plans"])
-app.include_router(tracking, prefix="/tracking", tags=["Tracking"])
-app.include_router(dashboard, prefix="/dashboard", tags=["Dashboard"])
-app.include_router(ml_predictions, prefix="/ml", tags=["ML Predictions"])
-app.include_router(notifications, prefix="/notifications", tags=["Notifications"])
-app.include_router(integrations, prefix="/integrations", tags=["Integrations"])
+app.include_router(plans, prefix="/plans", tags=["Plans"], dependencies=unit_of_work)
+app.include_router(tracking, prefix="/tracking", tags=["Tracking"], dependencies=unit_of_work)
+app.include_router(dashboard, prefix="/dashboard", tags=["Dashboard"], dependencies=unit_of_work)
+app.include_router(ml_predictions, prefix="/ml", tags=["ML Predictions"], dependencies=unit_of_work)
+app.include_router(notifications, prefix="/notifications", tags=["Notifications"], dependencies=unit_of_work)
+app.include_router(integrations, prefix="/integrations", tags=["Integrations"], dependencies=unit_of_work)
 
 if __name__ == "__main__":
     import uvicorn
@@ -18,6 +18,7 @@ os.environ.setdefault("ENVIRONMENT", "test")
 os.environ.setdefault("PORT", "8000")
 
 from main import app
+from app.core.cache import MemoryBackend, use_backend
 
 
 @pytest.fixture(scope="session")
@@ -28,6 +29,12 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    """Give every test an empty in-memory cache backend."""
+    use_backend(MemoryBackend())
+
+
 @pytest.fixture(scope="session")
 def test_app():
     """Create a test instance of the FastAPI app."""
@@ -212,14 +219,25 @@ def mock_integrations_service():
 def mock_db_service():
     """Mock database service for testing."""
     service = Mock()
-    service.get_user = Mock(return_value={"uid": "user_test123", "email": "test@example.com"})
-    service.set_user = Mock(return_value=None)
-    service.update_user = Mock(return_value=None)
-    service.delete_user = Mock(return_value=None)
-    service.get_user_doc = Mock(return_value=None)
-    service.set_user_doc = Mock(return_value="doc-id")
-    service.query_user_docs = Mock(return_value=[])
-    service.add_user_doc = Mock(return_value="new-doc-id")
+    service.get_user = AsyncMock(return_value={"uid": "user_test123", "email": "test@example.com"})
+    service.set_user = AsyncMock(return_value=None)
+    service.update_user = AsyncMock(return_value=True)
+    service.delete_user = AsyncMock(return_value=None)
+    service.get_user_doc = AsyncMock(return_value=None)
+    service.set_user_doc = AsyncMock(return_value="doc-id")
+    service.update_user_doc = AsyncMock(return_value=True)
+    service.query_user_docs = AsyncMock(return_value=[])
+    service.query_user_docs_page = AsyncMock(return_value=([], None))
+
+    async def stream_query_results(*args, **kwargs):
+        # Streams whatever query_user_docs is set to return, like the real method
+        for doc in service.query_user_docs.return_value:
+            yield doc
+
+    service.stream_user_docs = Mock(side_effect=stream_query_results)
+    service.add_user_doc = AsyncMock(return_value="new-doc-id")
+    service.set_user_docs_many = AsyncMock(return_value=0)
+    service.update_user_docs_where = AsyncMock(return_value=0)
     return service
 
 
@@ -77,6 +77,47 @@ def test_security_headers(client):
     assert response.headers["x-xss-protection"] == "1; mode=block"
 
 
+def test_query_stats_header(client):
+    """Every response reports its SQL statement count and database time."""
+    response = client.get("/health")
+
+    assert response.headers["server-timing"] == 'db;desc="0 queries";dur=0.0'
+    assert "x-db-repeated-statements" not in response.headers
+
+
+def test_query_stats_flag_repeated_statements():
+    """Statements are counted through engine events and repeated shapes are reported."""
+    from sqlalchemy import create_engine, text
+    from app.middleware import track_queries
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn, track_queries() as stats:
+        for i in range(3):
+            conn.execute(text("SELECT :i"), {"i": i})
+        conn.execute(text("SELECT 1"))
+
+    assert stats.count == 4
+    assert stats.most_repeated() == ("SELECT ?", 3)
+
+
+def test_metrics_endpoint_reports_pool_usage(client):
+    """Pool checkouts and checkout latency are exposed to Prometheus."""
+    from sqlalchemy import create_engine, text
+    from app.core.metrics import MeasuredNullPool, instrument_pool
+
+    engine = create_engine("sqlite://", poolclass=MeasuredNullPool, pool_logging_name="test_pool")
+    instrument_pool(engine, "test_pool")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'db_pool_checkouts_total{pool="test_pool"} 1.0' in response.text
+    assert 'db_pool_checkout_seconds_count{pool="test_pool"} 1.0' in response.text
+    assert 'db_pool_checked_out{pool="test_pool"} 0.0' in response.text
+
+
 @pytest.mark.asyncio
 async def test_onboarding_flow(client, mock_user, auth_headers, mock_health_data):
     """Test onboarding endpoints with mocked Clerk auth."""
@@ -187,6 +228,24 @@ async def test_integration_endpoints(client, mock_user, auth_headers):
         assert response.status_code in [200, 404, 500]
 
 
+@pytest.mark.asyncio
+async def test_history_endpoints_return_lists_with_cursor_header(client, mock_user, auth_headers, mock_db_service):
+    """List-shaped history endpoints stay lists; the next page's cursor travels in a header."""
+    mock_db_service.query_user_docs_page = AsyncMock(side_effect=[([{"id": "n1"}], "next-page"), ([{"id": "i1"}], None)])
+    with patch("app.routes.auth.verify_clerk_token", new_callable=AsyncMock) as mock_verify, \
+         patch("app.routes.notifications.db_service", mock_db_service), \
+         patch("app.services.integrations_service.db_service", mock_db_service):
+        mock_verify.return_value = mock_user["uid"]
+
+        response = client.get("/notifications/history?limit=1", headers=auth_headers)
+        assert response.json() == [{"id": "n1"}]
+        assert response.headers["X-Next-Cursor"] == "next-page"
+
+        response = client.get("/integrations/integration-history?cursor=next-page", headers=auth_headers)
+        assert response.json() == [{"id": "i1"}]
+        assert "X-Next-Cursor" not in response.headers
+
+
 def test_error_handling(client):
     """Test error handling for malformed requests."""
     response = client.post(
@@ -0,0 +1,103 @@
+"""
+Unit tests for the two-tier cache
+The shared tier is the in-memory stand-in; no Redis server is needed.
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.core import cache as cache_module
+from app.core.cache import Cache, LocalLRU, MemoryBackend, create_backend, use_backend
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_loads_once_then_serves_both_tiers():
+    """A miss runs the loader; later reads come from the local tier, then the shared one once local is gone."""
+    cache = Cache("test_ns", ttl=60)
+    loader = AsyncMock(return_value={"kcal": 52})
+
+    assert await cache.get_or_set("apple", loader) == {"kcal": 52}
+    assert await cache.get_or_set("apple", loader) == {"kcal": 52}
+    cache.local.clear()
+    assert await cache.get("apple") == {"kcal": 52}
+    assert len(cache.local) == 1
+    loader.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_values_are_copies_and_expire():
+    """Callers may mutate what they read; entries vanish after their TTL."""
+    cache = Cache("test_ns", ttl=0.05)
+    await cache.set("apple", {"kcal": 52})
+
+    (await cache.get("apple"))["kcal"] = 0
+    assert await cache.get("apple") == {"kcal": 52}
+    await asyncio.sleep(0.06)
+    assert await cache.get("apple", "gone") == "gone"
+
+
+@pytest.mark.asyncio
+async def test_backend_failures_fall_back_to_the_loader():
+    """An unreachable shared tier behaves as a miss instead of failing the request."""
+    backend = MemoryBackend()
+    backend.get = AsyncMock(side_effect=ConnectionError("redis down"))
+    backend.set = AsyncMock(side_effect=ConnectionError("redis down"))
+    use_backend(backend)
+    cache = Cache("test_ns", ttl=60)
+
+    assert await cache.get_or_set("apple", AsyncMock(return_value={"kcal": 52})) == {"kcal": 52}
+
+
+@pytest.mark.asyncio
+async def test_delete_during_load_keeps_the_stale_value_out():
+    """A value loaded while the key was deleted is returned but not stored."""
+    cache = Cache("test_ns", ttl=60)
+
+    async def load_then_delete():
+        await cache.delete("apple")
+        return {"kcal": 52}
+
+    await cache.get_or_set("apple", load_then_delete, cache_if=bool)
+    assert await cache.get("apple") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_broadcasts_deletes_and_caps_local_ttl():
+    """With a shared tier, deletes are published to other workers and local copies are short-lived."""
+    backend = MemoryBackend()
+    backend.shared = True
+    backend.publish_invalidation = AsyncMock()
+    use_backend(backend)
+    cache = Cache("test_ns", ttl=3600)
+
+    with patch.object(cache_module.settings, "CACHE_LOCAL_TTL_SECONDS", 0.05):
+        await cache.set("apple", {"kcal": 52})
+        await asyncio.sleep(0.06)
+        assert cache.local.get(cache.key("apple")) is None
+        assert await cache.get("apple") == {"kcal": 52}
+
+    await cache.delete("apple")
+    backend.publish_invalidation.assert_awaited_once_with(["blinderfit:test_ns:apple"])
+
+    # Another worker's broadcast drops this worker's local copy
+    await cache.set("pear", {"kcal": 57})
+    cache_module._drop_local([cache.key("pear")])
+    assert cache.local.get(cache.key("pear")) is None
+
+
+def test_local_lru_evicts_least_recently_used():
+    lru = LocalLRU(max_entries=2)
+    lru.set("a", b"1", 60)
+    lru.set("b", b"2", 60)
+    lru.get("a")
+    lru.set("c", b"3", 60)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1"
+
+
+def test_create_backend_rejects_unknown_schemes():
+    assert isinstance(create_backend("memory://"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached://localhost")
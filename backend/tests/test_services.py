@@ -3,6 +3,7 @@ Unit tests for service classes
 Matches the actual Clerk/Neon/PostgreSQL service implementations.
 """
 
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, AsyncMock, MagicMock
 from datetime import datetime, timedelta
@@ -10,6 +11,11 @@ from datetime import datetime, timedelta
 from app.services.gemini_service import gemini_service
 from app.services.notification_service import notification_service
 from app.services.integrations_service import integrations_service
+from app.services.plan_service import plan_service
+from app.services.chat_context_service import chat_context_service, UserContextCache
+from app.services.gemini_service import ERROR_RESPONSE_MESSAGE
+from app.services.knowledge_service import KnowledgeService, normalize_key
+from app.services.feed_service import FeedService
 
 
 # ── Gemini Service ────────────────────────────────────────────────────────
@@ -41,6 +47,40 @@ async def test_gemini_service_generate_response():
         mock_chat.send_message_async.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_gemini_service_caches_opted_in_responses():
+    """Identical cache=True requests reach the API once; any change to the request is a new key."""
+    mock_chat = MagicMock()
+    mock_response = Mock()
+    mock_response.text = "Weight trending down 0.4 kg/week"
+    mock_chat.send_message_async = AsyncMock(return_value=mock_response)
+
+    with patch.object(gemini_service.model, 'start_chat', return_value=mock_chat):
+        for _ in range(3):
+            result = await gemini_service.generate_response("Analyze trends", system_prompt="Analyst", temperature=0.1, cache=True)
+        await gemini_service.generate_response("Analyze trends", system_prompt="Analyst", temperature=0.2, cache=True)
+        await gemini_service.generate_response("Analyze trends", system_prompt="Analyst", temperature=0.1)
+
+        assert result == "Weight trending down 0.4 kg/week"
+        assert mock_chat.send_message_async.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_gemini_service_does_not_cache_fallback_messages():
+    """A failed call returns the apology text but leaves nothing in the cache."""
+    mock_chat = MagicMock()
+    mock_response = Mock()
+    mock_response.text = "Recovered answer"
+    mock_chat.send_message_async = AsyncMock(side_effect=[RuntimeError("quota exceeded"), mock_response])
+
+    with patch.object(gemini_service.model, 'start_chat', return_value=mock_chat):
+        first = await gemini_service.generate_response("Analyze trends", cache=True)
+        second = await gemini_service.generate_response("Analyze trends", cache=True)
+
+        assert "technical difficulties" in first
+        assert second == "Recovered answer"
+
+
 @pytest.mark.asyncio
 async def test_gemini_service_analyze_health_data():
     """Test Gemini service health data analysis."""
@@ -129,12 +169,38 @@ async def test_notification_service_mark_read(mock_user, mock_db_service):
         mock_db_service.update_user_doc.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_notification_service_mark_read_missing(mock_user, mock_db_service):
+    """Test marking a notification that does not exist."""
+    mock_db_service.update_user_doc.return_value = False
+    with patch('app.services.notification_service.db_service', mock_db_service):
+        result = await notification_service.mark_notification_read(
+            mock_user["uid"], "missing_notification"
+        )
+
+        assert result is False
+        assert mock_db_service.update_user_doc.call_args.kwargs["upsert"] is False
+
+
+@pytest.mark.asyncio
+async def test_notification_service_bulk_is_batched(mock_db_service):
+    """Test bulk notifications are written in one batched call."""
+    mock_db_service.set_user_docs_many.return_value = 3
+    with patch('app.services.notification_service.db_service', mock_db_service):
+        result = await notification_service.send_bulk_notifications(
+            ["user_1", "user_2", "user_3"], "Update", "New features available"
+        )
+
+        assert result == {"successful": 3, "failed": 0}
+        mock_db_service.set_user_docs_many.assert_awaited_once()
+        mock_db_service.set_user_doc.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_notification_service_get_unread(mock_user, mock_db_service):
     """Test getting unread notifications."""
     mock_db_service.query_user_docs.return_value = [
         {"id": "notif_1", "title": "Test", "read_at": None},
-        {"id": "notif_2", "title": "Read", "read_at": "2024-01-15T10:00:00Z"},
     ]
 
     with patch('app.services.notification_service.db_service', mock_db_service):
@@ -142,6 +208,8 @@ async def test_notification_service_get_unread(mock_user, mock_db_service):
 
         assert len(result) == 1
         assert result[0]["id"] == "notif_1"
+        # Read notifications are filtered out by the query, not after loading them
+        assert mock_db_service.stream_user_docs.call_args.kwargs["filters"] == {"read_at": None}
 
 
 @pytest.mark.asyncio
@@ -162,6 +230,167 @@ async def test_notification_service_schedule_daily(mock_user, mock_db_service):
         assert isinstance(result, list)
 
 
+# ── Plan Service ──────────────────────────────────────────────────────────
+
+NESTED_PLAN = {
+    "plan_name": "Cut",
+    "is_active": True,
+    "weekly_plans": [
+        {"week_number": 1, "week_start": "2024-01-15", "daily_plans": [
+            {"date": "2024-01-15", "meals": [{"type": "breakfast"}]},
+            {"date": "2024-01-16", "meals": []},
+        ]},
+    ],
+}
+
+
+@pytest.mark.asyncio
+async def test_plan_service_saves_header_and_days(mock_db_service):
+    """A new plan is written as a small header plus one document per day in one call."""
+    with patch('app.services.plan_service.db_service', mock_db_service):
+        header = await plan_service.save_plan("user_test123", "plan_1", NESTED_PLAN)
+
+        docs = mock_db_service.set_user_docs_many.await_args.args[0]
+        assert docs[0] == ("user_test123", "plans", "plan_1", header)
+        assert header["weekly_plans"] == [{"week_number": 1, "week_start": "2024-01-15"}]
+        assert [(collection, doc_id) for _, collection, doc_id, _ in docs[1:]] == [
+            ("plan_days", "plan_1:2024-01-15"), ("plan_days", "plan_1:2024-01-16"),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_plan_service_reads_one_day_by_point_lookup(mock_db_service):
+    """The daily plan comes from the (plan_id, date) document, not from the whole plan."""
+    header, days = plan_service.split_plan("plan_1", NESTED_PLAN)
+    mock_db_service.query_user_docs.return_value = [{**header, "_id": "plan_1"}]
+    mock_db_service.get_user_doc.return_value = {**days[0][1], "_id": days[0][0]}
+
+    with patch('app.services.plan_service.db_service', mock_db_service):
+        plan, daily_plan = await plan_service.get_active_plan_day("user_test123", datetime(2024, 1, 15).date())
+
+        assert plan["_id"] == "plan_1"
+        assert daily_plan == {"date": "2024-01-15", "meals": [{"type": "breakfast"}]}
+        mock_db_service.get_user_doc.assert_awaited_once_with("user_test123", "plan_days", "plan_1:2024-01-15")
+
+
+@pytest.mark.asyncio
+async def test_plan_service_splits_legacy_plan_on_read(mock_db_service):
+    """Plans stored with embedded daily_plans are rewritten in the per-day layout."""
+    mock_db_service.query_user_docs.return_value = [{**NESTED_PLAN, "_id": "plan_1"}]
+
+    with patch('app.services.plan_service.db_service', mock_db_service):
+        plan = await plan_service.get_active_plan("user_test123")
+
+        assert plan["layout"] == "plan_days"
+        assert "daily_plans" not in plan["weekly_plans"][0]
+        assert len(mock_db_service.set_user_docs_many.await_args.args[0]) == 3
+
+
+def test_plan_service_dates_legacy_days_from_their_week():
+    """Legacy days without a date take their week's start plus their position; undatable days are skipped."""
+    plan = {"weekly_plans": [
+        {"week_number": 1, "week_start": "2024-01-15", "daily_plans": [{"meals": []}, {"date": None, "meals": []}]},
+        {"week_number": 2, "daily_plans": [{"meals": []}, {"date": "2024-01-23", "meals": []}]},
+    ]}
+
+    _, days = plan_service.split_plan("plan_1", plan)
+
+    assert [doc_id for doc_id, _ in days] == ["plan_1:2024-01-15", "plan_1:2024-01-16", "plan_1:2024-01-23"]
+    assert days[1][1]["date"] == "2024-01-16"
+
+
+@pytest.mark.asyncio
+async def test_plan_service_assembles_full_plan(mock_db_service):
+    """The full plan is rebuilt from the header and one range read of its days."""
+    header, days = plan_service.split_plan("plan_1", NESTED_PLAN)
+    mock_db_service.get_user_docs_range = AsyncMock(return_value=[{**doc, "_id": doc_id} for doc_id, doc in days])
+
+    with patch('app.services.plan_service.db_service', mock_db_service):
+        plan = await plan_service.assemble_plan("user_test123", {**header, "_id": "plan_1"})
+
+        assert plan["weekly_plans"][0]["daily_plans"] == NESTED_PLAN["weekly_plans"][0]["daily_plans"]
+        mock_db_service.get_user_docs_range.assert_awaited_once_with("user_test123", "plan_days", "plan_1:", "plan_1;")
+
+
+# ── Chat Context Service ──────────────────────────────────────────────────
+
+@pytest.mark.asyncio
+async def test_chat_context_snapshots_are_content_addressed(mock_db_service):
+    """Contexts differing only in their timestamp share one snapshot."""
+    mock_db_service.create_user_doc = AsyncMock(return_value=True)
+    context = {"user_profile": {"age": 30}, "recent_tracking": [], "context_timestamp": "2024-01-15T10:00:00"}
+
+    with patch('app.services.chat_context_service.db_service', mock_db_service):
+        first = await chat_context_service.save("user_test123", context)
+        second = await chat_context_service.save(
+            "user_test123", {"recent_tracking": [], "user_profile": {"age": 30}, "context_timestamp": "2024-01-15T11:00:00"}
+        )
+
+        assert first["context_id"] == second["context_id"]
+        assert second["context_timestamp"] == "2024-01-15T11:00:00"
+        stored = mock_db_service.create_user_doc.await_args.args
+        assert stored[1:3] == ("chat_contexts", first["context_id"])
+        assert "context_timestamp" not in stored[3]["context"]
+
+
+@pytest.mark.asyncio
+async def test_chat_context_large_snapshots_round_trip_compressed(mock_db_service):
+    """Snapshots over the size threshold are stored zstd-compressed and restored on load."""
+    pytest.importorskip("zstandard")
+    mock_db_service.create_user_doc = AsyncMock(return_value=True)
+    context = {"recent_tracking": [{"date": f"2024-01-{day:02d}", "notes": "x" * 500} for day in range(1, 8)]}
+
+    with patch('app.services.chat_context_service.db_service', mock_db_service), \
+            patch('app.services.chat_context_service.settings.CHAT_CONTEXT_COMPRESS_MIN_BYTES', 1024):
+        ref = await chat_context_service.save("user_test123", context)
+        snapshot = mock_db_service.create_user_doc.await_args.args[3]
+        mock_db_service.get_user_doc.return_value = snapshot
+
+        assert snapshot["encoding"] == "zstd"
+        assert len(snapshot["blob"]) < snapshot["size"]
+        assert await chat_context_service.load("user_test123", ref) == context
+
+
+@pytest.mark.asyncio
+async def test_chat_context_load_keeps_embedded_context(mock_db_service):
+    """Chat rows written before snapshots still carry their context inline."""
+    with patch('app.services.chat_context_service.db_service', mock_db_service):
+        assert await chat_context_service.load("user_test123", {"context": {"a": 1}}) == {"a": 1}
+        mock_db_service.get_user_doc.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_user_context_cache_serves_until_a_source_is_written():
+    """Repeat messages reuse the context; writes to its sources evict it, other collections do not."""
+    cache = UserContextCache()
+    build = AsyncMock(side_effect=lambda: {"user_profile": {"age": build.await_count}})
+
+    first = await cache.get_or_build("user_test123", build)
+    assert await cache.get_or_build("user_test123", build) == first
+    await cache.invalidate("user_test123", "chats")
+    assert await cache.get_or_build("user_test123", build) == first
+    assert build.await_count == 1
+
+    await cache.invalidate("user_test123", "tracking")
+    assert await cache.get_or_build("user_test123", build) == {"user_profile": {"age": 2}}
+
+
+@pytest.mark.asyncio
+async def test_user_context_cache_drops_contexts_built_across_a_write():
+    """A context read before a concurrent write is returned but not cached."""
+    cache = UserContextCache()
+
+    async def build_then_write():
+        context = {"recent_tracking": []}
+        await cache.invalidate("user_test123", "tracking")
+        return context
+
+    await cache.get_or_build("user_test123", build_then_write)
+    build = AsyncMock(return_value={"recent_tracking": [{"date": "2024-01-15"}]})
+    assert await cache.get_or_build("user_test123", build) == {"recent_tracking": [{"date": "2024-01-15"}]}
+    build.assert_awaited_once()
+
+
 # ── Integrations Service ──────────────────────────────────────────────────
 
 @pytest.mark.asyncio
@@ -206,6 +435,93 @@ async def test_integrations_service_exercise_info():
         assert "information" in result
 
 
+def test_knowledge_keys_are_normalized():
+    assert normalize_key("  Bananas! ") == "banana"
+    assert normalize_key("Greek   Yogurt") == "greek yogurt"
+    assert normalize_key("berries") == "berry"
+    assert normalize_key("Hummus") == "hummus"
+    assert normalize_key("Bench Press") == "bench press"
+
+
+@pytest.mark.asyncio
+async def test_knowledge_fetch_gets_the_name_as_asked(mock_db_service):
+    """The normalized key only stores and dedups; the fetch, and so the model prompt, gets the caller's wording."""
+    mock_db_service.get_global_doc = AsyncMock(return_value=None)
+    mock_db_service.set_global_doc = AsyncMock(return_value="cooky")
+    fetch = AsyncMock(return_value={"calories": 502})
+
+    with patch('app.services.knowledge_service.db_service', mock_db_service):
+        entry = await KnowledgeService().lookup("nutrition_knowledge", "Cookies", fetch)
+
+    fetch.assert_awaited_once_with("Cookies")
+    assert mock_db_service.set_global_doc.call_args.args[1] == entry["key"] == "cooky"
+
+
+@pytest.mark.asyncio
+async def test_integrations_service_nutrition_info_served_from_knowledge_store(mock_db_service):
+    """A stored, fresh item is answered from global_documents without calling Gemini."""
+    mock_db_service.get_global_doc = AsyncMock(return_value={
+        "key": "apple", "result": {"calories": 52}, "fetched_at": datetime.utcnow().isoformat(),
+    })
+    with patch('app.services.knowledge_service.db_service', mock_db_service), \
+         patch('app.services.integrations_service.knowledge_service', KnowledgeService()), \
+         patch.object(gemini_service, 'generate_content', new_callable=AsyncMock) as mock_gen:
+        result = await integrations_service.get_nutrition_info("Apples")
+
+    assert result["food_item"] == "Apples"
+    assert result["nutrition"] == {"calories": 52}
+    mock_db_service.get_global_doc.assert_awaited_once_with("nutrition_knowledge", "apple")
+    mock_gen.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_integrations_service_nutrition_info_misses_fetch_once_and_persist(mock_db_service):
+    """Concurrent misses for one item share one search and extraction, stored under the normalized key."""
+    mock_db_service.get_global_doc = AsyncMock(return_value=None)
+    mock_db_service.set_global_doc = AsyncMock(return_value="apple")
+
+    async def slow_generate(prompt, **kwargs):
+        await asyncio.sleep(0.01)
+        return '```json\n{"calories": 52}\n```'
+
+    with patch('app.services.knowledge_service.db_service', mock_db_service), \
+         patch('app.services.integrations_service.knowledge_service', KnowledgeService()), \
+         patch.object(integrations_service, 'search_web', new_callable=AsyncMock, return_value=[]) as mock_search, \
+         patch.object(gemini_service, 'generate_content', side_effect=slow_generate) as mock_gen:
+        results = await asyncio.gather(*(integrations_service.get_nutrition_info(name) for name in ("apple", "Apples", "apple")))
+
+    assert [r["nutrition"] for r in results] == [{"calories": 52}] * 3
+    assert mock_search.await_count == 1
+    assert mock_gen.call_count == 1
+    collection, key, entry = mock_db_service.set_global_doc.call_args.args
+    assert (collection, key, entry["result"]) == ("nutrition_knowledge", "apple", {"calories": 52})
+
+
+@pytest.mark.asyncio
+async def test_integrations_service_exercise_info_refreshes_stale_and_skips_failures(mock_db_service):
+    """A stale entry is served while it is refreshed; a failed refresh leaves the stored entry alone."""
+    stale = {"key": "squat", "result": "Old notes", "fetched_at": (datetime.utcnow() - timedelta(days=365)).isoformat()}
+    mock_db_service.get_global_doc = AsyncMock(return_value=stale)
+    mock_db_service.set_global_doc = AsyncMock(return_value="squat")
+    knowledge = KnowledgeService()
+
+    with patch('app.services.knowledge_service.db_service', mock_db_service), \
+         patch('app.services.integrations_service.knowledge_service', knowledge), \
+         patch.object(integrations_service, 'search_web', new_callable=AsyncMock, return_value=[]), \
+         patch.object(gemini_service, 'generate_content', new_callable=AsyncMock) as mock_gen:
+        mock_gen.return_value = ERROR_RESPONSE_MESSAGE
+        result = await integrations_service.get_exercise_info("Squats")
+        assert result["information"] == "Old notes"
+        await knowledge._inflight[("exercise_knowledge", "squat")]
+        mock_db_service.set_global_doc.assert_not_called()
+
+        mock_gen.return_value = "Squats target quads and glutes."
+        await integrations_service.get_exercise_info("squat")
+        await knowledge._inflight[("exercise_knowledge", "squat")]
+
+    assert mock_db_service.set_global_doc.call_args.args[2]["result"] == "Squats target quads and glutes."
+
+
 @pytest.mark.asyncio
 async def test_integrations_service_fitbit_sync(mock_user):
     """Test Fitbit data synchronization."""
@@ -235,7 +551,7 @@ async def test_integrations_service_fitbit_sync(mock_user):
     mock_client.__aenter__.return_value.get = mock_get
 
     with patch('app.services.integrations_service.httpx.AsyncClient', return_value=mock_client), \
-         patch('app.services.integrations_service.db_service') as mock_db:
+         patch('app.services.integrations_service.db_service', new_callable=AsyncMock) as mock_db:
         result = await integrations_service.sync_fitbit_data(
             user_id=mock_user["uid"],
             access_token="mock_access_token"
@@ -286,7 +602,7 @@ async def test_integrations_service_health_news():
 @pytest.mark.asyncio
 async def test_integrations_service_analyze_trends(mock_user):
     """Test health trend analysis."""
-    with patch('app.services.integrations_service.db_service') as mock_db, \
+    with patch('app.services.integrations_service.db_service', new_callable=AsyncMock) as mock_db, \
          patch.object(gemini_service, 'generate_content', new_callable=AsyncMock) as mock_gen:
         mock_db.query_user_docs.return_value = [
             {"date": f"2024-01-{15-i}", "weight": 75 - i * 0.2} for i in range(7)
@@ -314,4 +630,124 @@ async def test_integrations_service_research_papers():
 
         assert len(papers) == 1
         assert papers[0]["title"] == "HIIT Cardio Study"
-        assert "topic" in papers[0]
\ No newline at end of file
+        assert "topic" in papers[0]
+
+@pytest.mark.asyncio
+async def test_integrations_service_health_news_served_from_feed(mock_db_service):
+    """Requests read the feed without searching; a failed refresh keeps the previous items."""
+    mock_db_service.get_global_doc = AsyncMock(return_value=None)
+    mock_db_service.set_global_doc = AsyncMock(return_value="health_news")
+    feeds = FeedService()
+    feeds.register("health_news", integrations_service._fetch_health_news)
+
+    with patch('app.services.feed_service.db_service', mock_db_service), \
+         patch('app.services.integrations_service.feed_service', feeds), \
+         patch.object(integrations_service, 'search_web', new_callable=AsyncMock) as mock_search:
+        mock_search.return_value = [{"title": f"Story {i}", "url": f"https://example.com/{i}"} for i in range(3)]
+        await feeds.refresh_all()
+        assert mock_search.call_args.kwargs["cache"] is False
+
+        news = await integrations_service.get_health_news(2)
+        assert [n["title"] for n in news] == ["Story 0", "Story 1"]
+        assert mock_search.await_count == 1
+
+        mock_search.side_effect = RuntimeError("search down")
+        await feeds.refresh_all()
+        news = await integrations_service.get_health_news(5)
+
+    assert len(news) == 3
+    mock_db_service.set_global_doc.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_feed_refresh_adopts_other_workers_items_and_drops_idle_topics(mock_db_service):
+    """A feed another worker refreshed recently is read, not searched again; unrequested topics stop refreshing."""
+    fresh = {"items": [{"title": "From another worker"}], "refreshed_at": datetime.utcnow().isoformat()}
+    mock_db_service.get_global_doc = AsyncMock(return_value=fresh)
+    feeds = FeedService()
+    fetch = AsyncMock(return_value=[{"title": "Searched"}])
+
+    with patch('app.services.feed_service.db_service', mock_db_service):
+        entry = await feeds.get("research:hiit", fetch)
+        assert entry["items"] == [{"title": "From another worker"}]
+
+        await feeds.refresh_all()
+        fetch.assert_not_called()
+
+        with patch('app.services.feed_service.IDLE_FEED_SECONDS', -1):
+            await feeds.refresh_all()
+
+    assert "research:hiit" not in feeds._topics
+    fetch.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_research_feeds_are_keyed_by_topic_and_capped(mock_db_service):
+    """Spellings of a topic share one feed searched by its normalized form; only recent topics refresh in the background."""
+    mock_db_service.get_global_doc = AsyncMock(return_value=None)
+    mock_db_service.set_global_doc = AsyncMock(return_value="feed")
+    feeds = FeedService()
+
+    with patch('app.services.feed_service.db_service', mock_db_service), \
+         patch('app.services.integrations_service.feed_service', feeds), \
+         patch('app.services.feed_service.settings.FEED_MAX_TOPICS', 1), \
+         patch.object(integrations_service, 'search_web', new_callable=AsyncMock) as mock_search:
+        mock_search.return_value = [{"title": "Study"}]
+        await integrations_service.get_research_papers("HIIT!")
+        await integrations_service.get_research_papers(" hiit ")
+        assert mock_search.await_count == 1
+        assert mock_search.call_args.args[0] == "scientific research papers on hiit health"
+
+        await integrations_service.get_research_papers("Sleep")
+        assert list(feeds._topics) == ["research:sleep"]
+
+        mock_search.reset_mock()
+        await feeds.refresh_all()
+
+    assert [c.args[0] for c in mock_search.await_args_list] == ["scientific research papers on sleep health"]
+
+
+@pytest.mark.asyncio
+async def test_feed_serves_stale_entry_while_refreshing(mock_db_service):
+    """A stale stored feed is returned at once; the search runs in the background and replaces it."""
+    stale = {"items": [{"title": "Old"}], "refreshed_at": (datetime.utcnow() - timedelta(days=1)).isoformat()}
+    mock_db_service.get_global_doc = AsyncMock(return_value=stale)
+    mock_db_service.set_global_doc = AsyncMock(return_value="feed")
+    searched = asyncio.Event()
+
+    async def fetch():
+        await searched.wait()
+        return [{"title": "New"}]
+
+    feeds = FeedService()
+    with patch('app.services.feed_service.db_service', mock_db_service):
+        entry = await asyncio.wait_for(feeds.get("research:sleep", fetch), timeout=1)
+        assert entry["items"] == [{"title": "Old"}]
+
+        searched.set()
+        await feeds._refreshing["research:sleep"]
+        entry = await feeds.get("research:sleep", fetch)
+
+    assert entry["items"] == [{"title": "New"}]
+
+
+@pytest.mark.asyncio
+async def test_feed_refresh_jitters_only_the_first_run():
+    """After one jittered start, refreshes run a fixed interval apart, never late enough to skip a period."""
+    feeds = FeedService()
+    feeds.refresh_all = AsyncMock()
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise asyncio.CancelledError
+
+    with patch('app.services.feed_service.asyncio.sleep', fake_sleep), \
+         patch('app.services.feed_service.random.uniform', return_value=0.05), \
+         patch('app.services.feed_service.settings.FEED_REFRESH_INTERVAL_SECONDS', 1000.0):
+        with pytest.raises(asyncio.CancelledError):
+            await feeds._periodic_refresh()
+
+    assert sleeps == [50.0, 1000.0, 1000.0]
+    assert feeds.refresh_all.await_count == 2
\ No newline at end of file